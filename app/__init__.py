@@ -48,14 +48,29 @@ def create_app(config_name='development'):
     app.register_blueprint(auth.bp, url_prefix='/conta')
     app.register_blueprint(webhook.bp, url_prefix='/webhook')
 
-    from app.admin import produtos, pedidos
+    from app.admin import produtos, pedidos, gateways
     app.register_blueprint(produtos.bp, url_prefix='/admin')
     app.register_blueprint(pedidos.bp, url_prefix='/admin')
+    app.register_blueprint(gateways.bp, url_prefix='/admin')
 
     # Registrar webhook do Mercado Pago (legado)
     from app.services.mercadopago import webhook
     app.route('/webhook/mercadopago', methods=['POST'])(webhook)
 
+    # Agendador interno (sem worker): começa no primeiro request de cada processo,
+    # assim comandos do CLI e o processo mestre do gunicorn não o iniciam
+    if app.config.get('AGENDADOR_INTERNO'):
+        from app.services.fila import iniciar_agendador
+
+        @app.before_request
+        def _iniciar_agendador():
+            iniciar_agendador(app)
+
+    # Aviso de N+1: consultas SQL por request (CONSULTAS_LIMITE_POR_REQUEST)
+    from app.utils.consultas import monitorar_consultas
+    with app.app_context():
+        monitorar_consultas(app, db.engine)
+
     # Rodar migrations automaticamente em produção (apenas na primeira execução)
     with app.app_context():
         db.create_all()
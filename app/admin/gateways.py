@@ -0,0 +1,30 @@
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_login import login_required
+from datetime import datetime
+from app import db
+from app.services.disjuntor import listar_disjuntores, fechar_disjuntor
+from app.utils.decorators import admin_required
+
+bp = Blueprint('admin_gateways', __name__)
+
+
+@bp.route('/gateways')
+@login_required
+@admin_required
+def index():
+    """Estado dos disjuntores dos gateways de pagamento"""
+    disjuntores = listar_disjuntores()
+    return render_template('admin/gateways.html', disjuntores=disjuntores, agora=datetime.utcnow())
+
+
+@bp.route('/gateways/<path:nome>/fechar', methods=['POST'])
+@login_required
+@admin_required
+def fechar(nome):
+    """Fecha o disjuntor manualmente (ex.: gateway voltou antes da chamada de teste)"""
+    if fechar_disjuntor(nome):
+        db.session.commit()
+        flash(f'Disjuntor {nome} fechado.', 'success')
+    else:
+        flash('Disjuntor não encontrado.', 'warning')
+    return redirect(url_for('admin_gateways.index'))
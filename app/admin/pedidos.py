@@ -1,11 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, flash, Response
 from flask_login import login_required, current_user
 from app import db
 from app.models import Pedido, ItemPedido
+from app.services.estoque import cancelar_pedidos
+from app.services.exportacao import FORMATOS, consulta_exportacao, exportar_pedidos
+from app.services.metricas import invalidar_metricas
+from app.services.vendas import registrar_vendas
+from app.services.cache_paginas import invalidar_produtos
+from app.services.catalogo import marcar_catalogo_desatualizado
 from app.utils.decorators import admin_required
 
 bp = Blueprint('admin_pedidos', __name__)
 
+STATUS_PEDIDO = ['pendente', 'pago', 'enviando', 'entregue', 'cancelado']
+
 
 @bp.route('/pedidos')
 @login_required
@@ -15,7 +24,8 @@ def listar():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status')
 
-    query = Pedido.query
+    # Cliente e itens vêm do resumo gravado no pedido: uma linha estreita por pedido
+    query = Pedido.query.options(Pedido.colunas_listagem())
 
     if status_filter:
         query = query.filter_by(status=status_filter)
@@ -25,12 +35,45 @@ def listar():
     return render_template('admin/pedidos/listar.html', pedidos=pedidos, status_filter=status_filter)
 
 
+@bp.route('/pedidos/exportar')
+@login_required
+@admin_required
+def exportar():
+    """Exporta pedidos e itens em CSV ou JSON Lines (filtros: de, ate, status)"""
+    formato = request.args.get('formato', 'csv')
+    status = [s for s in request.args.getlist('status') if s]
+    try:
+        de, ate = (datetime.strptime(request.args[campo], '%Y-%m-%d').date() if request.args.get(campo) else None
+                   for campo in ('de', 'ate'))
+    except ValueError:
+        flash('Data inválida (use AAAA-MM-DD).', 'danger')
+        return redirect(url_for('admin_pedidos.listar'))
+    if formato not in FORMATOS or any(s not in STATUS_PEDIDO for s in status):
+        flash('Formato ou status inválido.', 'danger')
+        return redirect(url_for('admin_pedidos.listar'))
+
+    consulta = consulta_exportacao(de, ate, status)
+    engine = db.engine
+    # A leitura usa conexão própria: libera a da sessão durante o streaming
+    db.session.close()
+
+    nome = f"pedidos-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{formato}"
+    return Response(exportar_pedidos(engine, consulta, formato), mimetype=FORMATOS[formato], headers={
+        'Content-Disposition': f'attachment; filename={nome}',
+        'X-Accel-Buffering': 'no',
+    })
+
+
 @bp.route('/pedidos/<int:id>')
 @login_required
 @admin_required
 def detalhar(id):
     """Detalhes de um pedido para o admin"""
-    pedido = Pedido.query.get_or_404(id)
+    pedido = Pedido.query.options(
+        db.joinedload(Pedido.cliente),
+        db.joinedload(Pedido.endereco_entrega),
+        db.selectinload(Pedido.itens),
+    ).get_or_404(id)
     return render_template('admin/pedidos/detalhar.html', pedido=pedido)
 
 
@@ -42,14 +85,18 @@ def atualizar_status(id):
     pedido = Pedido.query.get_or_404(id)
     novo_status = request.form.get('status')
 
-    status_validos = ['pendente', 'pago', 'enviando', 'entregue', 'cancelado']
-
-    if novo_status not in status_validos:
+    if novo_status not in STATUS_PEDIDO:
         flash('Status inválido.', 'danger')
         return redirect(url_for('admin_pedidos.detalhar', id=id))
 
+    if novo_status == 'cancelado':
+        # Mesmo caminho do botão Cancelar: devolve o estoque uma única vez
+        return cancelar(id)
+
     pedido.status = novo_status
+    registrar_vendas([pedido.id])
     db.session.commit()
+    invalidar_metricas()
 
     flash(f'Status do pedido atualizado para {novo_status}.', 'success')
     return redirect(url_for('admin_pedidos.detalhar', id=id))
@@ -68,6 +115,7 @@ def marcar_enviado(id):
 
     pedido.status = 'enviando'
     db.session.commit()
+    invalidar_metricas()
 
     flash('Pedido marcado como enviado!', 'success')
     return redirect(url_for('admin_pedidos.detalhar', id=id))
@@ -84,13 +132,17 @@ def cancelar(id):
         flash('Não é possível cancelar pedidos enviados ou entregues.', 'warning')
         return redirect(url_for('admin_pedidos.detalhar', id=id))
 
-    # Devolve estoque
-    for item in pedido.itens:
-        if item.produto:
-            item.produto.estoque += item.quantidade
+    if pedido.status == 'cancelado':
+        flash('O pedido já está cancelado.', 'info')
+        return redirect(url_for('admin_pedidos.detalhar', id=id))
 
-    pedido.status = 'cancelado'
+    # Cancela e devolve o estoque com UPDATEs em conjunto (sem carregar item a item)
+    cancelados = cancelar_pedidos([pedido.id], ('pendente', 'pago'))
     db.session.commit()
+    if cancelados:
+        invalidar_metricas()
+        marcar_catalogo_desatualizado()
+        invalidar_produtos(item.produto_id for item in pedido.itens if item.produto_id)
 
     flash('Pedido cancelado e estoque devolvido.', 'success')
     return redirect(url_for('admin_pedidos.detalhar', id=id))
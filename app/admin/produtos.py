@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+import io
 import os
 from datetime import datetime
 from app import db
 from app.models import Produto, Categoria
+from app.services.cache_paginas import invalidar_paginas, estatisticas_cache
+from app.services.catalogo import atualizar_catalogo
+from app.services.importacao import COLUNAS, ArquivoInvalido, importar_produtos
+from app.services.metricas import obter_metricas, invalidar_metricas
 from app.utils.decorators import admin_required
 
 bp = Blueprint('admin_produtos', __name__)
@@ -16,13 +21,29 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 
+def _catalogo_alterado(*tags):
+    """Depois do commit: atualiza o snapshot do catálogo e invalida as páginas e indicadores em cache"""
+    atualizar_catalogo()
+    invalidar_paginas(*tags)
+    invalidar_metricas()
+
+
+def _tags_produto(produto):
+    """Tags das páginas da vitrine que exibem o produto"""
+    tags = ['home', f'produto:{produto.id}']
+    if produto.categoria:
+        tags.append(f'categoria:{produto.categoria.slug}')
+    return tags
+
+
 @bp.route('/')
 @login_required
 @admin_required
 def index():
-    """Dashboard admin - lista de produtos"""
-    produtos = Produto.query.order_by(Produto.criado_em.desc()).all()
-    return render_template('admin/dashboard.html', produtos=produtos)
+    """Dashboard admin - indicadores e produtos recentes"""
+    recentes = Produto.query.order_by(Produto.criado_em.desc()).limit(10).all()
+    return render_template('admin/dashboard.html', metricas=obter_metricas(), produtos=recentes,
+                           cache=estatisticas_cache())
 
 
 # ==================== PRODUTOS ====================
@@ -75,6 +96,7 @@ def criar():
 
         db.session.add(produto)
         db.session.commit()
+        _catalogo_alterado(*_tags_produto(produto))
 
         flash('Produto criado com sucesso!', 'success')
         return redirect(url_for('admin_produtos.listar'))
@@ -83,6 +105,32 @@ def criar():
     return render_template('admin/produtos/criar.html', categorias=categorias)
 
 
+@bp.route('/produtos/importar', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def importar():
+    """Importa produtos de um CSV (upsert pelo slug)"""
+    relatorio = None
+    if request.method == 'POST':
+        arquivo = request.files.get('arquivo')
+        if not arquivo or not arquivo.filename:
+            flash('Selecione um arquivo CSV.', 'warning')
+            return redirect(url_for('admin_produtos.importar'))
+
+        # Lido em streaming do upload, sem carregar o arquivo inteiro
+        try:
+            relatorio = importar_produtos(io.TextIOWrapper(arquivo.stream, encoding='utf-8-sig', newline=''))
+        except ArquivoInvalido as e:
+            flash(f'Arquivo inválido: {e}', 'danger')
+            return redirect(url_for('admin_produtos.importar'))
+
+        flash(f'Importação concluída: {relatorio.novos} novo(s), {relatorio.atualizados} atualizado(s), '
+              f'{relatorio.com_erro} linha(s) com erro.',
+              'success' if not (relatorio.com_erro or relatorio.interrompido) else 'warning')
+
+    return render_template('admin/produtos/importar.html', relatorio=relatorio, colunas=COLUNAS)
+
+
 @bp.route('/produtos/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -91,6 +139,8 @@ def editar(id):
     produto = Produto.query.get_or_404(id)
 
     if request.method == 'POST':
+        tags_anteriores = _tags_produto(produto)
+
         # Processa upload da imagem se houver
         if 'imagem' in request.files:
             file = request.files['imagem']
@@ -121,6 +171,7 @@ def editar(id):
         produto.ativo = request.form.get('ativo') == 'on'
 
         db.session.commit()
+        _catalogo_alterado(*tags_anteriores, *_tags_produto(produto))
 
         flash('Produto atualizado com sucesso!', 'success')
         return redirect(url_for('admin_produtos.listar'))
@@ -142,8 +193,10 @@ def deletar(id):
         if os.path.exists(imagem_path):
             os.remove(imagem_path)
 
+    tags = _tags_produto(produto)
     db.session.delete(produto)
     db.session.commit()
+    _catalogo_alterado(*tags)
 
     flash('Produto deletado com sucesso!', 'success')
     return redirect(url_for('admin_produtos.listar'))
@@ -183,6 +236,7 @@ def criar_categoria():
 
         db.session.add(categoria)
         db.session.commit()
+        _catalogo_alterado('categorias')
 
         flash('Categoria criada com sucesso!', 'success')
         return redirect(url_for('admin_produtos.categorias'))
@@ -208,11 +262,13 @@ def editar_categoria(id):
             flash('Este slug já está em uso.', 'warning')
             return render_template('admin/categorias/editar.html', categoria=categoria)
 
+        slug_anterior = categoria.slug
         categoria.nome = nome
         categoria.slug = slug
         categoria.descricao = descricao
 
         db.session.commit()
+        _catalogo_alterado('categorias', f'categoria:{slug_anterior}', f'categoria:{slug}')
 
         flash('Categoria atualizada com sucesso!', 'success')
         return redirect(url_for('admin_produtos.categorias'))
@@ -232,8 +288,10 @@ def deletar_categoria(id):
         flash('Não é possível deletar uma categoria que possui produtos.', 'danger')
         return redirect(url_for('admin_produtos.categorias'))
 
+    slug = categoria.slug
     db.session.delete(categoria)
     db.session.commit()
+    _catalogo_alterado('categorias', f'categoria:{slug}')
 
     flash('Categoria deletada com sucesso!', 'success')
     return redirect(url_for('admin_produtos.categorias'))
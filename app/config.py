@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +17,88 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'gif'}
 
+    # Carrinho no servidor: 'db' (tabela carrinho_itens), 'redis' ou 'memoria'
+    CARRINHO_BACKEND = os.getenv('CARRINHO_BACKEND', 'db')
+    CARRINHO_COOKIE = 'carrinho_id'
+    CARRINHO_TTL_DIAS = int(os.getenv('CARRINHO_TTL_DIAS', '30'))
+    REDIS_URL = os.getenv('REDIS_URL', '')
+
+    # Cache de páginas da vitrine para visitantes anônimos: 'memoria', 'redis' ou 'desligado'
+    CACHE_PAGINAS_BACKEND = os.getenv('CACHE_PAGINAS_BACKEND', 'memoria')
+    CACHE_PAGINAS_TTL = int(os.getenv('CACHE_PAGINAS_TTL', '60'))  # Segundos
+    CACHE_PAGINAS_MAXIMO = 2000  # Páginas por processo (backend 'memoria')
+
+    # Snapshot do catálogo compartilhado entre os workers (arquivo mapeado em memória)
+    CATALOGO_SNAPSHOT = os.getenv('CATALOGO_SNAPSHOT', 'True').lower() == 'true'
+    CATALOGO_DIR = os.getenv('CATALOGO_DIR', os.path.join(tempfile.gettempdir(), 'techzone-catalogo'))
+    CATALOGO_MAX_IDADE_SEGUNDOS = int(os.getenv('CATALOGO_MAX_IDADE_SEGUNDOS', '60'))  # Reconstrução completa em segundo plano
+    CATALOGO_FOLGA_SEGUNDOS = 5  # Janela extra para commits atrasados na reconstrução incremental
+
+    # Consultas SQL por request acima disso geram aviso no log (0 = sem contagem)
+    CONSULTAS_LIMITE_POR_REQUEST = int(os.getenv('CONSULTAS_LIMITE_POR_REQUEST', '0'))
+    CONSULTAS_LIMITE_ESTRITO = os.getenv('CONSULTAS_LIMITE_ESTRITO', 'False').lower() == 'true'  # Erro em vez de aviso
+
+    # Painel admin
+    METRICAS_TTL_SEGUNDOS = int(os.getenv('METRICAS_TTL_SEGUNDOS', '30'))  # Indicadores em cache
+    ESTOQUE_BAIXO_LIMITE = int(os.getenv('ESTOQUE_BAIXO_LIMITE', '5'))  # Unidades disponíveis
+
+    # Importação de produtos por CSV (admin e flask importar-produtos)
+    IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', '1000'))  # Linhas por INSERT ... ON CONFLICT e commit
+    IMPORTACAO_MAX_ERROS = 100  # Erros de linha guardados no relatório (o total é sempre contado)
+
+    # Produtos relacionados por compras em comum (flask calcular-relacionados, diário no worker)
+    RELACIONADOS_K = 10  # Vizinhos guardados por produto
+    RELACIONADOS_DIAS = int(os.getenv('RELACIONADOS_DIAS', '365'))  # Pedidos considerados
+    RELACIONADOS_MAX_ITENS = 50  # Pedidos com mais produtos distintos ficam de fora
+    RELACIONADOS_MIN_COOCORRENCIAS = int(os.getenv('RELACIONADOS_MIN_COOCORRENCIAS', '1'))
+
+    # Reservas de estoque e prazo de pagamento
+    RESERVA_CARRINHO_MINUTOS = int(os.getenv('RESERVA_CARRINHO_MINUTOS', '30'))
+    PAGAMENTO_EXPIRACAO_HORAS = int(os.getenv('PAGAMENTO_EXPIRACAO_HORAS', '2'))
+    PAGAMENTO_EXPIRACAO_MARGEM_MINUTOS = 15  # Tolerância para webhooks atrasados
+    EXPIRACAO_LOTE = 500  # Pedidos cancelados por commit
+
+    # Fila de tarefas (flask worker)
+    PAGAMENTO_ASSINCRONO = os.getenv('PAGAMENTO_ASSINCRONO', 'True').lower() == 'true'
+    FILA_CONCORRENCIA = int(os.getenv('FILA_CONCORRENCIA', '4'))  # Threads por worker
+    FILA_MAX_EXECUTANDO = int(os.getenv('FILA_MAX_EXECUTANDO', '8'))  # Limite global entre workers
+    FILA_TIMEOUT_SEGUNDOS = 300  # Tarefa 'executando' há mais tempo volta para a fila
+    FILA_BACKOFF_SEGUNDOS = 5  # Espera base entre tentativas (dobra a cada falha)
+    # Sem worker: roda as rotinas periódicas (expiração, webhooks, reconciliação) no processo web
+    AGENDADOR_INTERNO = os.getenv('AGENDADOR_INTERNO', 'False').lower() == 'true'
+
+    # Reconciliação de pedidos pendentes com o PagBank (flask reconciliar-pedidos)
+    RECONCILIACAO_IDADE_MINUTOS = int(os.getenv('RECONCILIACAO_IDADE_MINUTOS', '30'))  # Sem atualização há pelo menos
+    RECONCILIACAO_LOTE = 200
+    RECONCILIACAO_CONCORRENCIA = int(os.getenv('RECONCILIACAO_CONCORRENCIA', '4'))
+    RECONCILIACAO_MAX_POR_SEGUNDO = float(os.getenv('RECONCILIACAO_MAX_POR_SEGUNDO', '10'))
+    RECONCILIACAO_LIMITE_POR_EXECUCAO = 2000  # Pedidos por execução no worker (a cada 15 min)
+
+    # Status de pedidos em tempo real (server-sent events)
+    EVENTOS_INTERVALO_SEGUNDOS = 1  # Consulta do monitor de pedidos (só com alguém esperando)
+    EVENTOS_FOLGA_SEGUNDOS = 5  # Janela extra para commits atrasados
+    EVENTOS_HEARTBEAT_SEGUNDOS = 20
+    EVENTOS_DURACAO_SEGUNDOS = 300  # Depois disso o navegador reconecta
+    # Streams abertos por processo (cada um prende uma thread); os demais consultam o status
+    EVENTOS_MAX_CONEXOES = int(os.getenv('EVENTOS_MAX_CONEXOES', '8'))
+
+    # Caixa de entrada de webhooks (processada pelo worker)
+    WEBHOOK_LOTE = 100
+    WEBHOOK_MAX_TENTATIVAS = 5
+
+    # Cliente HTTP dos gateways (sessão com pool por processo)
+    HTTP_TIMEOUT_CONEXAO = float(os.getenv('HTTP_TIMEOUT_CONEXAO', '3.05'))
+    HTTP_TIMEOUT_LEITURA = float(os.getenv('HTTP_TIMEOUT_LEITURA', '30'))
+    HTTP_POOL_HOSTS = 4  # Hosts distintos com pool próprio
+    HTTP_POOL_MAXIMO = int(os.getenv('HTTP_POOL_MAXIMO', '10'))  # Conexões mantidas por host
+    HTTP_TENTATIVAS = 2
+
+    # Disjuntor e limite de chamadas simultâneas por gateway
+    DISJUNTOR_LIMITE_FALHAS = int(os.getenv('DISJUNTOR_LIMITE_FALHAS', '5'))  # Falhas seguidas para abrir
+    DISJUNTOR_ABERTO_SEGUNDOS = int(os.getenv('DISJUNTOR_ABERTO_SEGUNDOS', '30'))  # Espera até a chamada de teste
+    GATEWAY_MAX_SIMULTANEAS = int(os.getenv('GATEWAY_MAX_SIMULTANEAS', '4'))  # Por processo
+    GATEWAY_ESPERA_VAGA_SEGUNDOS = 1
+
     # PagSeguro
     PAGSEGURO_EMAIL = os.getenv('PAGSEGURO_EMAIL')
     PAGSEGURO_TOKEN = os.getenv('PAGSEGURO_TOKEN')
@@ -34,6 +117,18 @@ class Config:
 class DevelopmentConfig(Config):
     """Configurações de desenvolvimento"""
     DEBUG = True
+    CONSULTAS_LIMITE_POR_REQUEST = int(os.getenv('CONSULTAS_LIMITE_POR_REQUEST', '20'))
+
+
+class TestingConfig(Config):
+    """Configurações dos testes (pytest); TEST_DATABASE_URL roda a suíte no Postgres"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'techzone-testes.db'))
+    CATALOGO_SNAPSHOT = False
+    CACHE_PAGINAS_BACKEND = 'desligado'
+    CARRINHO_BACKEND = 'db'
+    AGENDADOR_INTERNO = False
+    CONSULTAS_LIMITE_POR_REQUEST = 1000  # Liga o cabeçalho X-Consultas-SQL, conferido nos testes
 
 
 class ProductionConfig(Config):
@@ -44,5 +139,6 @@ class ProductionConfig(Config):
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
@@ -1,7 +1,9 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event, DDL
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.texto import normalizar_texto
 
 db = SQLAlchemy()
 
@@ -40,7 +42,7 @@ class Endereco(db.Model):
     __tablename__ = 'enderecos'
 
     id = db.Column(db.Integer, primary_key=True)
-    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     cep = db.Column(db.String(9))
     rua = db.Column(db.String(100))
     numero = db.Column(db.String(10))
@@ -73,9 +75,31 @@ class Categoria(db.Model):
         return f'<Categoria {self.nome}>'
 
 
+def calcular_desconto(preco, preco_antigo):
+    """Percentual de desconto (inteiro) do preço antigo para o atual"""
+    if preco_antigo and preco is not None and preco_antigo > preco:
+        return int(((preco_antigo - preco) / preco_antigo) * 100)
+    return 0
+
+
 class Produto(db.Model):
     """Modelo de produto"""
     __tablename__ = 'produtos'
+    __table_args__ = (
+        # Ordenações "maior desconto" e "mais vendidos" (paginação por cursor com o id)
+        db.Index('ix_produtos_desconto_percentual_id', 'desconto_percentual', 'id'),
+        db.Index('ix_produtos_vendas_30d_id', 'vendas_30d', 'id'),
+        # Listagens da loja sem snapshot (só produtos ativos, mais novos primeiro)
+        db.Index('ix_produtos_ativos_criado_em_id', 'criado_em', 'id',
+                 postgresql_where=db.text('ativo'), sqlite_where=db.text('ativo = 1')),
+        db.Index('ix_produtos_ativos_categoria_criado_em_id', 'categoria_id', 'criado_em', 'id',
+                 postgresql_where=db.text('ativo'), sqlite_where=db.text('ativo = 1')),
+        # Ordenações por preço (lida de trás para frente no preço decrescente) e por nome
+        db.Index('ix_produtos_ativos_preco_id', 'preco', 'id',
+                 postgresql_where=db.text('ativo'), sqlite_where=db.text('ativo = 1')),
+        db.Index('ix_produtos_ativos_nome_id', 'nome', 'id',
+                 postgresql_where=db.text('ativo'), sqlite_where=db.text('ativo = 1')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -84,29 +108,133 @@ class Produto(db.Model):
     preco = db.Column(db.Float, nullable=False)
     preco_antigo = db.Column(db.Float)  # Para mostrar desconto
     estoque = db.Column(db.Integer, default=0)
+    estoque_reservado = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # Soma das reservas ativas
     imagem = db.Column(db.String(255))
     ativo = db.Column(db.Boolean, default=True)
     categoria_id = db.Column(db.Integer, db.ForeignKey('categorias.id'))
     criado_em = db.Column(db.DateTime, default=datetime.utcnow)
     atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    busca_texto = db.Column(db.Text)  # Nome + descrição normalizados (ver app/services/busca.py)
+    desconto_percentual = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # Mantido ao salvar
+    vendas_30d = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # Ver app/services/vendas.py
 
     # Relacionamentos
     itens_pedido = db.relationship('ItemPedido', backref='produto', lazy='dynamic')
 
     @property
-    def desconto_percentual(self):
-        """Calcula o percentual de desconto"""
-        if self.preco_antigo and self.preco_antigo > self.preco:
-            return int(((self.preco_antigo - self.preco) / self.preco_antigo) * 100)
-        return 0
+    def disponivel(self):
+        """Unidades disponíveis para venda (estoque menos reservas ativas)"""
+        return max((self.estoque or 0) - (self.estoque_reservado or 0), 0)
 
     def __repr__(self):
         return f'<Produto {self.nome} - R${self.preco}>'
 
 
+@event.listens_for(Produto, 'before_insert')
+@event.listens_for(Produto, 'before_update')
+def _atualizar_colunas_derivadas(mapper, connection, produto):
+    """Mantém o texto de busca e o desconto sincronizados com nome, descrição e preços"""
+    produto.busca_texto = normalizar_texto(produto.nome, produto.descricao)
+    produto.desconto_percentual = calcular_desconto(produto.preco, produto.preco_antigo)
+
+
+# Índices de busca textual criados junto com a tabela produtos.
+# Postgres: coluna tsvector gerada a partir de busca_texto + índice GIN.
+# SQLite: tabela virtual FTS5 (external content) mantida por triggers.
+BUSCA_DDL = {
+    'postgresql': [
+        """ALTER TABLE produtos ADD COLUMN busca_vetor tsvector
+           GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, coalesce(busca_texto, ''))) STORED""",
+        'CREATE INDEX ix_produtos_busca_vetor ON produtos USING gin (busca_vetor)',
+    ],
+    'sqlite': [
+        """CREATE VIRTUAL TABLE produtos_fts USING fts5(
+               busca_texto, content='produtos', content_rowid='id',
+               tokenize='unicode61 remove_diacritics 2')""",
+        """CREATE TRIGGER produtos_fts_ai AFTER INSERT ON produtos BEGIN
+               INSERT INTO produtos_fts(rowid, busca_texto) VALUES (new.id, new.busca_texto);
+           END""",
+        """CREATE TRIGGER produtos_fts_ad AFTER DELETE ON produtos BEGIN
+               INSERT INTO produtos_fts(produtos_fts, rowid, busca_texto) VALUES ('delete', old.id, old.busca_texto);
+           END""",
+        """CREATE TRIGGER produtos_fts_au AFTER UPDATE OF busca_texto ON produtos BEGIN
+               INSERT INTO produtos_fts(produtos_fts, rowid, busca_texto) VALUES ('delete', old.id, old.busca_texto);
+               INSERT INTO produtos_fts(rowid, busca_texto) VALUES (new.id, new.busca_texto);
+           END""",
+    ],
+}
+
+# Removidos antes da tabela produtos (drop_all): a tabela FTS5 não é
+# apagada junto e impediria o create_all seguinte. No Postgres a coluna e
+# o índice saem com a tabela.
+BUSCA_DROP_DDL = {
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS produtos_fts_ai',
+        'DROP TRIGGER IF EXISTS produtos_fts_ad',
+        'DROP TRIGGER IF EXISTS produtos_fts_au',
+        'DROP TABLE IF EXISTS produtos_fts',
+    ],
+}
+
+for _dialeto, _comandos in BUSCA_DDL.items():
+    for _comando in _comandos:
+        event.listen(Produto.__table__, 'after_create', DDL(_comando).execute_if(dialect=_dialeto))
+for _dialeto, _comandos in BUSCA_DROP_DDL.items():
+    for _comando in _comandos:
+        event.listen(Produto.__table__, 'before_drop', DDL(_comando).execute_if(dialect=_dialeto))
+
+
+class ProdutoRelacionado(db.Model):
+    """Vizinho pré-calculado de um produto por compras em comum (ver app/services/relacionados.py)"""
+    __tablename__ = 'produtos_relacionados'
+
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id', ondelete='CASCADE'), primary_key=True)
+    posicao = db.Column(db.Integer, primary_key=True)  # 1 = vizinho mais forte
+    relacionado_id = db.Column(db.Integer, db.ForeignKey('produtos.id', ondelete='CASCADE'), nullable=False)
+    pontuacao = db.Column(db.Float, nullable=False)
+    coocorrencias = db.Column(db.Integer, nullable=False)  # Pedidos com os dois produtos
+
+    def __repr__(self):
+        return f'<ProdutoRelacionado {self.produto_id} #{self.posicao} -> {self.relacionado_id}>'
+
+
+class CarrinhoItem(db.Model):
+    """Linha de carrinho persistida no servidor (backend 'db' do CarrinhoStore)"""
+    __tablename__ = 'carrinho_itens'
+
+    carrinho_id = db.Column(db.String(64), primary_key=True)  # 'u:<user_id>' ou 'a:<token do cookie>'
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id', ondelete='CASCADE'), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=1)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<CarrinhoItem {self.carrinho_id} produto={self.produto_id} x{self.quantidade}>'
+
+
+class ReservaEstoque(db.Model):
+    """Reserva temporária de estoque para um carrinho"""
+    __tablename__ = 'reservas_estoque'
+
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id', ondelete='CASCADE'), nullable=False)
+    carrinho_id = db.Column(db.String(64), nullable=False, index=True)
+    quantidade = db.Column(db.Integer, nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ReservaEstoque {self.carrinho_id} produto={self.produto_id} x{self.quantidade}>'
+
+
 class Pedido(db.Model):
     """Modelo de pedido"""
     __tablename__ = 'pedidos'
+    __table_args__ = (
+        db.Index('ix_pedidos_status_atualizado_em', 'status', 'atualizado_em'),
+        db.Index('ix_pedidos_status_expira_em', 'status', 'expira_em'),
+        db.Index('ix_pedidos_usuario_id_criado_em', 'usuario_id', 'criado_em'),  # Meus pedidos
+        db.Index('ix_pedidos_status_criado_em', 'status', 'criado_em'),  # Admin filtrado por status
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -128,12 +256,51 @@ class Pedido(db.Model):
     pix_copy_paste = db.Column(db.String(500))  # Código Pix copia e cola
 
     endereco_id = db.Column(db.Integer, db.ForeignKey('enderecos.id'))
-    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
-    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expira_em = db.Column(db.DateTime)  # Fim do prazo de pagamento (mesmo do checkout PagBank)
+    pagamento_atualizado_em = db.Column(db.DateTime)  # Momento do último evento de gateway aplicado
+    vendas_registradas = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())  # Itens já somados em produtos.vendas_30d
+
+    # Resumo para as listagens, gravado no checkout (sem ler itens nem o cliente)
+    total_itens = db.Column(db.Integer, default=0, nullable=False, server_default='0')  # Produtos distintos
+    total_unidades = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    primeiro_item = db.Column(db.String(100))  # Nome do primeiro produto
+    cliente_nome = db.Column(db.String(100))  # Como estava na hora da compra
+    cliente_email = db.Column(db.String(120))
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Listagem do admin
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Monitor de status (eventos.py)
 
     # Relacionamentos
-    itens = db.relationship('ItemPedido', backref='pedido', lazy='dynamic',
-                           cascade='all, delete-orphan')
+    # Lista (não 'dynamic') para poder ser carregada junto com o pedido (selectinload)
+    itens = db.relationship('ItemPedido', backref='pedido', cascade='all, delete-orphan')
+
+    @classmethod
+    def colunas_listagem(cls):
+        """Opção de carga com só as colunas usadas nas listagens (sem QR code, links etc.)"""
+        return db.load_only(
+            cls.id, cls.usuario_id, cls.status, cls.total, cls.forma_pagamento, cls.criado_em,
+            cls.total_itens, cls.total_unidades, cls.primeiro_item, cls.cliente_nome, cls.cliente_email,
+        )
+
+    def definir_resumo(self, itens, cliente):
+        """Preenche o resumo a partir de [(nome do produto, quantidade)] e do cliente"""
+        self.total_itens = len(itens)
+        self.total_unidades = sum(quantidade for _, quantidade in itens)
+        self.primeiro_item = itens[0][0] if itens else None
+        self.cliente_nome = cliente.nome
+        self.cliente_email = cliente.email
+
+    @property
+    def resumo_itens(self):
+        """Ex.: '3 itens – Cabo USB-C e mais 2'"""
+        if not self.total_itens:
+            return ''
+        texto = f"{self.total_itens} {'item' if self.total_itens == 1 else 'itens'}"
+        if not self.primeiro_item:
+            return texto
+        texto += f' – {self.primeiro_item}'
+        if self.total_itens > 1:
+            texto += f' e mais {self.total_itens - 1}'
+        return texto
 
     @property
     def status_display(self):
@@ -156,7 +323,7 @@ class ItemPedido(db.Model):
     __tablename__ = 'itens_pedido'
 
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.id'), nullable=False, index=True)
     produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'))
     nome_produto = db.Column(db.String(100))  # Salva o nome na hora da compra
     preco = db.Column(db.Float, nullable=False)  # Salva o preço na hora da compra
@@ -169,3 +336,79 @@ class ItemPedido(db.Model):
 
     def __repr__(self):
         return f'<ItemPedido {self.nome_produto} x{self.quantidade}>'
+
+
+class Tarefa(db.Model):
+    """Tarefa da fila assíncrona (executada pelo worker: flask worker)"""
+    __tablename__ = 'tarefas'
+    __table_args__ = (
+        db.Index('ix_tarefas_status_executar_em', 'status', 'executar_em'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    chave = db.Column(db.String(100), unique=True)  # Evita tarefas duplicadas (ex.: pagamento:42)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluida, falhou
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Tarefa #{self.id} {self.tipo} - {self.status}>'
+
+
+class RotinaPeriodica(db.Model):
+    """Última execução de cada rotina periódica (@periodica), compartilhada entre processos"""
+    __tablename__ = 'rotinas_periodicas'
+
+    nome = db.Column(db.String(100), primary_key=True)  # Nome da função (ex.: expirar_pendentes)
+    ultima_execucao = db.Column(db.DateTime, nullable=False)  # UTC, hora do relógio
+    executando_ate = db.Column(db.DateTime)  # Prazo de quem está rodando; vencido, outro processo assume
+
+    def __repr__(self):
+        return f'<RotinaPeriodica {self.nome} - {self.ultima_execucao}>'
+
+
+class Disjuntor(db.Model):
+    """Estado do disjuntor (circuit breaker) de um endpoint de gateway, compartilhado entre processos"""
+    __tablename__ = 'disjuntores'
+
+    nome = db.Column(db.String(100), primary_key=True)  # gateway:endpoint (ex.: pagbank:checkouts)
+    estado = db.Column(db.String(20), nullable=False, default='fechado')  # fechado, aberto, semiaberto
+    falhas = db.Column(db.Integer, nullable=False, default=0)  # Falhas seguidas
+    aberto_ate = db.Column(db.DateTime)  # Aberto: fim da espera; semiaberto: prazo da chamada de teste
+    ultimo_erro = db.Column(db.String(500))
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Disjuntor {self.nome} - {self.estado}>'
+
+
+class EventoWebhook(db.Model):
+    """Notificação recebida de um gateway, gravada como chegou e processada depois"""
+    __tablename__ = 'eventos_webhook'
+    __table_args__ = (
+        db.UniqueConstraint('gateway', 'evento_id', name='uq_eventos_webhook_gateway_evento'),
+        db.Index('ix_eventos_webhook_situacao_id', 'situacao', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    gateway = db.Column(db.String(20), nullable=False)  # pagbank, mercadopago, pagseguro
+    evento_id = db.Column(db.String(100), nullable=False)  # Id da notificação (ou hash do corpo)
+    referencia = db.Column(db.String(100))  # Id do pedido, quando vem no corpo
+    status_gateway = db.Column(db.String(50))  # Status bruto informado pelo gateway
+    ocorrido_em = db.Column(db.DateTime)  # Momento do evento segundo o gateway
+    payload = db.Column(db.Text, nullable=False)  # Corpo original
+    situacao = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, processado, ignorado, revisao, erro
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.Text)
+    recebido_em = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EventoWebhook #{self.id} {self.gateway} {self.evento_id} - {self.situacao}>'
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models import User
+from app.services.carrinho import mesclar_carrinho_anonimo
 import re
 
 bp = Blueprint('auth', __name__)
@@ -25,6 +26,7 @@ def login():
 
         if user and user.check_senha(senha):
             login_user(user)
+            mesclar_carrinho_anonimo(user)
             flash(f'Bem-vindo de volta, {user.nome}!', 'success')
 
             next_page = request.args.get('next')
@@ -106,7 +108,8 @@ def logout():
 def perfil():
     """Página de perfil do usuário"""
     from app.models import Pedido
-    return render_template('conta/perfil.html', Pedido=Pedido)
+    recentes = current_user.pedidos.options(Pedido.colunas_listagem()).order_by(Pedido.criado_em.desc()).limit(5).all()
+    return render_template('conta/perfil.html', pedidos=recentes)
 
 
 @bp.route('/pedidos')
@@ -115,7 +118,9 @@ def pedidos():
     """Lista de pedidos do usuário"""
     from app.models import Pedido
     page = request.args.get('page', 1, type=int)
-    pedidos = current_user.pedidos.order_by(Pedido.criado_em.desc()).paginate(page=page, per_page=10)
+    pedidos = current_user.pedidos.options(Pedido.colunas_listagem()).order_by(Pedido.criado_em.desc()).paginate(
+        page=page, per_page=10
+    )
     return render_template('conta/pedidos.html', pedidos=pedidos)
 
 
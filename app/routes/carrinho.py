@@ -1,62 +1,50 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import current_user
 from app import db
 from app.models import Produto
+from app.services.carrinho import (
+    resolver_carrinho, obter_carrinho, get_carrinho_store, carrinho_id_atual, gravar_cookie_carrinho
+)
+from app.services.estoque import reservar, reajustar_reserva, liberar_reservas_carrinho
 
 bp = Blueprint('carrinho', __name__)
 
 
-def _get_carrinho():
-    """Retorna o carrinho da sessão"""
-    return session.get('carrinho', {})
-
-
-def _save_carrinho(carrinho):
-    """Salva o carrinho na sessão"""
-    session['carrinho'] = carrinho
-    session.modified = True
+@bp.after_app_request
+def _cookie_carrinho(response):
+    """Grava o cookie do carrinho anônimo quando um novo é criado"""
+    return gravar_cookie_carrinho(response)
 
 
 @bp.route('/')
 def index():
     """Página do carrinho"""
-    carrinho = _get_carrinho()
-    itens = []
-    total = 0
-
-    for produto_id, item in carrinho.items():
-        produto = Produto.query.get(int(produto_id))
-        if produto:
-            subtotal = produto.preco * item['quantidade']
-            total += subtotal
-            itens.append({
-                'produto': produto,
-                'quantidade': item['quantidade'],
-                'subtotal': subtotal
-            })
-
-    return render_template('carrinho/index.html', itens=itens, total=total)
+    resolvido = resolver_carrinho(obter_carrinho(), carrinho_id=carrinho_id_atual())
+    return render_template('carrinho/index.html', itens=resolvido.itens, total=resolvido.total)
 
 
 @bp.route('/adicionar/<int:produto_id>', methods=['POST'])
 def adicionar(produto_id):
     """Adiciona um produto ao carrinho"""
-    data = request.get_json() or {}
-    quantidade = data.get('quantity', 1)
+    data = request.get_json(silent=True) or {}
+    try:
+        quantidade = int(data.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantidade = 0
 
-    produto = Produto.query.get_or_404(produto_id)
-
-    if produto.estoque < quantidade:
-        return jsonify({'success': False, 'message': 'Estoque insuficiente'}), 400
+    if quantidade < 1:
+        return jsonify({'success': False, 'message': 'Quantidade inválida'}), 400
 
-    carrinho = _get_carrinho()
+    Produto.query.get_or_404(produto_id)
+    carrinho_id = carrinho_id_atual(criar=True)
 
-    if str(produto_id) in carrinho:
-        carrinho[str(produto_id)]['quantidade'] += quantidade
-    else:
-        carrinho[str(produto_id)] = {'quantidade': quantidade}
+    # Reserva as unidades enquanto estiverem no carrinho
+    if not reservar(carrinho_id, produto_id, quantidade):
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Estoque insuficiente'}), 400
 
-    _save_carrinho(carrinho)
+    get_carrinho_store().adicionar(carrinho_id, produto_id, quantidade)
+    db.session.commit()
 
     return jsonify({'success': True, 'count': _get_carrinho_count()})
 
@@ -64,11 +52,11 @@ def adicionar(produto_id):
 @bp.route('/remover/<int:produto_id>', methods=['POST'])
 def remover(produto_id):
     """Remove um produto do carrinho"""
-    carrinho = _get_carrinho()
-
-    if str(produto_id) in carrinho:
-        del carrinho[str(produto_id)]
-        _save_carrinho(carrinho)
+    carrinho_id = carrinho_id_atual()
+    if carrinho_id:
+        liberar_reservas_carrinho(carrinho_id, produto_id)
+        get_carrinho_store().remover(carrinho_id, produto_id)
+        db.session.commit()
 
     if request.headers.get('Content-Type') == 'application/json':
         return jsonify({'success': True, 'count': _get_carrinho_count()})
@@ -84,16 +72,16 @@ def atualizar():
     if quantidade < 1:
         return jsonify({'success': False, 'message': 'Quantidade inválida'}), 400
 
-    produto = Produto.query.get_or_404(produto_id)
-
-    if produto.estoque < quantidade:
-        return jsonify({'success': False, 'message': 'Estoque insuficiente'}), 400
-
-    carrinho = _get_carrinho()
+    Produto.query.get_or_404(produto_id)
 
-    if str(produto_id) in carrinho:
-        carrinho[str(produto_id)]['quantidade'] = quantidade
-        _save_carrinho(carrinho)
+    store = get_carrinho_store()
+    carrinho_id = carrinho_id_atual()
+    if carrinho_id and str(produto_id) in store.obter(carrinho_id):
+        if not reajustar_reserva(carrinho_id, produto_id, quantidade):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'Estoque insuficiente'}), 400
+        store.atualizar(carrinho_id, produto_id, quantidade)
+        db.session.commit()
 
     return jsonify({'success': True, 'count': _get_carrinho_count()})
 
@@ -101,7 +89,11 @@ def atualizar():
 @bp.route('/limpar', methods=['POST'])
 def limpar():
     """Limpa o carrinho"""
-    session.pop('carrinho', None)
+    carrinho_id = carrinho_id_atual()
+    if carrinho_id:
+        liberar_reservas_carrinho(carrinho_id)
+        get_carrinho_store().limpar(carrinho_id)
+        db.session.commit()
     flash('Carrinho limpo com sucesso.', 'info')
     return redirect(url_for('carrinho.index'))
 
@@ -114,5 +106,5 @@ def count():
 
 def _get_carrinho_count():
     """Retorna o total de itens no carrinho"""
-    carrinho = _get_carrinho()
-    return sum(item['quantidade'] for item in carrinho.values())
+    carrinho_id = carrinho_id_atual()
+    return get_carrinho_store().contar(carrinho_id) if carrinho_id else 0
@@ -1,87 +1,83 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify
+import json
+import time
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, Response
 from flask_login import login_required, current_user
 from app import db
-from app.models import Produto, Pedido, ItemPedido, Endereco
+from app.models import Produto, Pedido, ItemPedido, Endereco, Tarefa
+from app.services.carrinho import resolver_carrinho, obter_carrinho, get_carrinho_store, carrinho_id_atual
+from app.services.estoque import baixar_estoque, liberar_reservas_carrinho, prazo_pagamento
+from app.services.fila import enfileirar
+from app.services.disjuntor import GatewayIndisponivel, gateway_disponivel
+from app.services.cache_paginas import invalidar_produtos
+from app.services.catalogo import marcar_catalogo_desatualizado
+from app.services.metricas import invalidar_metricas
 
 bp = Blueprint('checkout', __name__)
 
 
-def _get_carrinho():
-    """Retorna o carrinho da sessão"""
-    return session.get('carrinho', {})
+def _enfileirar_pagamento(pedido):
+    """Enfileira a criação do checkout PagBank do pedido (executada pelo worker)"""
+    return enfileirar(
+        'criar_pagamento',
+        {'pedido_id': pedido.id, 'base_url': request.url_root},
+        chave=f'pagamento:{pedido.id}'
+    )
 
 
-def _clear_carrinho():
-    """Limpa o carrinho da sessão"""
-    session.pop('carrinho', None)
-    session.modified = True
+def _pagbank_fora():
+    """PagBank com o disjuntor de criação de checkout aberto: usar o Pix direto"""
+    return not gateway_disponivel('pagbank', 'checkouts')
 
 
 @bp.route('/')
 @login_required
 def index():
     """Página de checkout"""
-    carrinho = _get_carrinho()
+    carrinho = obter_carrinho()
 
     if not carrinho:
         flash('Seu carrinho está vazio.', 'warning')
         return redirect(url_for('loja.produtos'))
 
-    # Busca produtos e calcula total
-    itens = []
-    total = 0
-
-    for produto_id, item in carrinho.items():
-        produto = Produto.query.get(int(produto_id))
-        if produto and produto.ativo and produto.estoque >= item['quantidade']:
-            subtotal = produto.preco * item['quantidade']
-            total += subtotal
-            itens.append({
-                'produto': produto,
-                'quantidade': item['quantidade'],
-                'subtotal': subtotal
-            })
-
-    if not itens:
+    # Busca produtos disponíveis (uma consulta) e calcula total
+    resolvido = resolver_carrinho(carrinho, somente_disponiveis=True, carrinho_id=carrinho_id_atual())
+
+    if not resolvido:
         flash('Nenhum produto disponível no carrinho.', 'warning')
         return redirect(url_for('loja.produtos'))
 
     # Busca endereços do usuário
     enderecos = Endereco.query.filter_by(usuario_id=current_user.id).all()
 
-    return render_template('checkout/index.html', itens=itens, total=total, enderecos=enderecos)
+    return render_template('checkout/index.html', itens=resolvido.itens, total=resolvido.total, enderecos=enderecos)
 
 
 @bp.route('/pagar', methods=['POST'])
 @login_required
 def pagar():
     """Inicia o processo de pagamento"""
-    carrinho = _get_carrinho()
+    carrinho = obter_carrinho()
 
     if not carrinho:
         flash('Seu carrinho está vazio.', 'warning')
         return redirect(url_for('loja.produtos'))
 
-    # Busca produtos e valida estoque
-    itens = []
-    total = 0
-
-    for produto_id, item in carrinho.items():
-        produto = Produto.query.get(int(produto_id))
-        if not produto or not produto.ativo:
-            flash(f'O produto {produto.nome if produto else produto_id} não está mais disponível.', 'danger')
-            return redirect(url_for('carrinho.index'))
-        if produto.estoque < item['quantidade']:
-            flash(f'Estoque insuficiente para {produto.nome}.', 'danger')
-            return redirect(url_for('carrinho.index'))
-
-        subtotal = produto.preco * item['quantidade']
-        total += subtotal
-        itens.append({
-            'produto': produto,
-            'quantidade': item['quantidade'],
-            'subtotal': subtotal
-        })
+    # Busca produtos (uma consulta) e valida estoque
+    resolvido = resolver_carrinho(carrinho, do_banco=True, carrinho_id=carrinho_id_atual())
+
+    if resolvido.ausentes:
+        flash(f'O produto {resolvido.ausentes[0]} não está mais disponível.', 'danger')
+        return redirect(url_for('carrinho.index'))
+
+    for item in resolvido.indisponiveis:
+        if not item.produto.ativo:
+            flash(f'O produto {item.produto.nome} não está mais disponível.', 'danger')
+        else:
+            flash(f'Estoque insuficiente para {item.produto.nome}.', 'danger')
+        return redirect(url_for('carrinho.index'))
+
+    itens = resolvido.itens
+    total = resolvido.total
 
     # Obtém ou cria endereço
     endereco_id = request.form.get('endereco_id')
@@ -117,6 +113,18 @@ def pagar():
         db.session.add(endereco)
         db.session.flush()  # Para obter o ID
 
+    # Baixa o estoque de todas as linhas de forma atômica (sem oversell).
+    # As reservas do próprio carrinho são liberadas na mesma transação.
+    carrinho_id = carrinho_id_atual()
+    liberar_reservas_carrinho(carrinho_id)
+    baixa = baixar_estoque((item.produto.id, item.quantidade) for item in itens)
+    if not baixa.ok:
+        sem_estoque = [item.produto.nome for item in itens if item.produto.id in baixa.produtos_com_falha]
+        db.session.rollback()
+        for nome in sem_estoque:
+            flash(f'Estoque insuficiente para {nome}.', 'danger')
+        return redirect(url_for('carrinho.index'))
+
     # Cria o pedido
     forma_pagamento = request.form.get('forma_pagamento')
 
@@ -125,8 +133,10 @@ def pagar():
         endereco_id=endereco.id,
         total=total,
         forma_pagamento=forma_pagamento,
-        status='pendente'
+        status='pendente',
+        expira_em=prazo_pagamento()
     )
+    pedido.definir_resumo([(item.produto.nome, item.quantidade) for item in itens], current_user)
 
     db.session.add(pedido)
     db.session.flush()  # Para obter o ID do pedido
@@ -135,22 +145,31 @@ def pagar():
     for item in itens:
         item_pedido = ItemPedido(
             pedido_id=pedido.id,
-            produto_id=item['produto'].id,
-            nome_produto=item['produto'].nome,
-            preco=item['produto'].preco,
-            quantidade=item['quantidade']
+            produto_id=item.produto.id,
+            nome_produto=item.produto.nome,
+            preco=item.produto.preco,
+            quantidade=item.quantidade
         )
         db.session.add(item_pedido)
 
-        # Atualiza estoque
-        item['produto'].estoque -= item['quantidade']
+    # Link de pagamento é criado pelo worker, fora do request
+    assincrono = current_app.config.get('PAGAMENTO_ASSINCRONO', True)
+    if assincrono:
+        _enfileirar_pagamento(pedido)
 
+    # Depois do commit os produtos expiram e item.produto.id iria ao banco um a um
+    produto_ids = [item.produto.id for item in itens]
     db.session.commit()
 
     # Limpa carrinho
-    _clear_carrinho()
+    get_carrinho_store().limpar(carrinho_id)
+    marcar_catalogo_desatualizado()
+    invalidar_produtos(produto_ids)
+    invalidar_metricas()
 
     # Redireciona para o pagamento correto
+    if assincrono:
+        return redirect(url_for('checkout.preparando', pedido_id=pedido.id))
     if forma_pagamento == 'pix':
         return redirect(url_for('checkout.pix', pedido_id=pedido.id))
     else:  # checkout_pro
@@ -170,10 +189,19 @@ def pix(pedido_id):
 
     # Se ainda não tem código de pagamento, cria
     if not pedido.pg_payment_code or not pedido.pg_payment_link:
+        if _pagbank_fora():
+            return redirect(url_for('checkout.pix_direto', pedido_id=pedido.id))
+        if current_app.config.get('PAGAMENTO_ASSINCRONO', True):
+            _enfileirar_pagamento(pedido)
+            db.session.commit()
+            return redirect(url_for('checkout.preparando', pedido_id=pedido.id))
         try:
             from app.services.pagseguro import criar_pagamento_pix
             criar_pagamento_pix(pedido)
             db.session.commit()
+        except GatewayIndisponivel:
+            db.session.rollback()
+            return redirect(url_for('checkout.pix_direto', pedido_id=pedido.id))
         except Exception as e:
             current_app.logger.error(f'Erro ao criar pagamento PIX: {str(e)}')
             flash(f'Erro ao criar pagamento: {str(e)}', 'danger')
@@ -200,12 +228,23 @@ def checkout_pro(pedido_id):
 
     # Se ainda não tem código de pagamento, cria
     if not pedido.pg_payment_code or not pedido.pg_payment_link:
+        if _pagbank_fora():
+            flash('O pagamento com cartão está indisponível no momento. Você pode pagar via Pix.', 'warning')
+            return redirect(url_for('checkout.pix_direto', pedido_id=pedido.id))
+        if current_app.config.get('PAGAMENTO_ASSINCRONO', True):
+            _enfileirar_pagamento(pedido)
+            db.session.commit()
+            return redirect(url_for('checkout.preparando', pedido_id=pedido.id))
         try:
             from app.services.pagseguro import criar_checkout_pro
             itens = ItemPedido.query.filter_by(pedido_id=pedido.id).all()
             checkout_url = criar_checkout_pro(pedido, itens)
             db.session.commit()
             return redirect(checkout_url)
+        except GatewayIndisponivel:
+            db.session.rollback()
+            flash('O pagamento com cartão está indisponível no momento. Você pode pagar via Pix.', 'warning')
+            return redirect(url_for('checkout.pix_direto', pedido_id=pedido.id))
         except Exception as e:
             flash(f'Erro ao criar pagamento: {str(e)}', 'danger')
             return redirect(url_for('checkout.index'))
@@ -218,6 +257,71 @@ def checkout_pro(pedido_id):
         return redirect(url_for('checkout.detalhes_pedido', pedido_id=pedido_id))
 
 
+@bp.route('/pix-direto/<int:pedido_id>')
+@login_required
+def pix_direto(pedido_id):
+    """Pix direto para a chave da loja, usado enquanto o PagBank está indisponível"""
+    pedido = Pedido.query.get_or_404(pedido_id)
+
+    if pedido.usuario_id != current_user.id and not current_user.is_admin:
+        flash('Acesso negado.', 'danger')
+        return redirect(url_for('loja.index'))
+
+    if pedido.pg_payment_link:
+        return redirect(pedido.pg_payment_link)
+    if pedido.status != 'pendente':
+        return redirect(url_for('checkout.detalhes_pedido', pedido_id=pedido.id))
+
+    if not pedido.qr_code_pix and current_app.config.get('PIX_CHAVE'):
+        try:
+            from app.services.pix_estatico import criar_qr_code_pix  # qrcode é dependência opcional
+            criar_qr_code_pix(pedido)
+            db.session.commit()
+        except Exception as e:
+            # Sem QR Code a página mostra a chave Pix da loja
+            db.session.rollback()
+            current_app.logger.warning(f'QR Code Pix não gerado para o pedido #{pedido.id}: {str(e)}')
+
+    return render_template('checkout/pix.html', pedido=pedido)
+
+
+@bp.route('/preparando/<int:pedido_id>')
+@login_required
+def preparando(pedido_id):
+    """Aguarda o worker criar o link de pagamento"""
+    pedido = Pedido.query.get_or_404(pedido_id)
+
+    if pedido.usuario_id != current_user.id and not current_user.is_admin:
+        flash('Acesso negado.', 'danger')
+        return redirect(url_for('loja.index'))
+
+    if pedido.pg_payment_link:
+        return redirect(pedido.pg_payment_link)
+
+    return render_template('checkout/preparando.html', pedido=pedido)
+
+
+@bp.route('/api/pedido/<int:pedido_id>/pagamento')
+@login_required
+def api_pagamento(pedido_id):
+    """API para verificar se o link de pagamento já foi criado"""
+    pedido = Pedido.query.get_or_404(pedido_id)
+
+    if pedido.usuario_id != current_user.id and not current_user.is_admin:
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    tarefa = Tarefa.query.filter_by(chave=f'pagamento:{pedido.id}').first()
+    alternativa = None
+    if not pedido.pg_payment_link and _pagbank_fora():
+        alternativa = url_for('checkout.pix_direto', pedido_id=pedido.id)
+    return jsonify({
+        'link': pedido.pg_payment_link,
+        'status': tarefa.status if tarefa else None,
+        'falhou': bool(tarefa and tarefa.status == 'falhou'),
+        'alternativa': alternativa
+    })
+
+
 @bp.route('/sucesso/<int:pedido_id>')
 @login_required
 def sucesso(pedido_id):
@@ -261,7 +365,10 @@ def falha(pedido_id):
 @login_required
 def detalhes_pedido(pedido_id):
     """Detalhes do pedido"""
-    pedido = Pedido.query.get_or_404(pedido_id)
+    pedido = Pedido.query.options(
+        db.joinedload(Pedido.endereco_entrega),
+        db.selectinload(Pedido.itens),
+    ).get_or_404(pedido_id)
 
     if pedido.usuario_id != current_user.id and not current_user.is_admin:
         flash('Acesso negado.', 'danger')
@@ -283,3 +390,61 @@ def api_pedido_status(pedido_id):
         'status': pedido.status,
         'mp_status': pedido.mp_payment_status
     })
+
+
+@bp.route('/api/pedido/<int:pedido_id>/eventos')
+@login_required
+def eventos_pedido(pedido_id):
+    """
+    Server-sent events com o status do pedido: envia o status atual e cada
+    mudança até o pedido sair de 'pendente'. A espera não usa o banco, mas
+    prende uma thread: com EVENTOS_MAX_CONEXOES streams abertos no processo
+    a resposta é 204 e o navegador passa a consultar api_pedido_status
+    (ver app/services/eventos.py).
+    """
+    from app.services.eventos import central, reservar_conexao, liberar_conexao
+
+    if not reservar_conexao():
+        return '', 204
+
+    # Assina antes de ler o status para não perder uma mudança no meio
+    assinatura = central.assinar(pedido_id)
+    pedido = db.session.get(Pedido, pedido_id)
+
+    if not pedido or (pedido.usuario_id != current_user.id and not current_user.is_admin):
+        assinatura.cancelar()
+        liberar_conexao()
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    status = pedido.status
+    duracao = current_app.config.get('EVENTOS_DURACAO_SEGUNDOS', 300)
+    heartbeat = current_app.config.get('EVENTOS_HEARTBEAT_SEGUNDOS', 20)
+    # Libera a conexão com o banco durante o streaming
+    db.session.close()
+
+    def evento(status_):
+        return f'event: status\ndata: {json.dumps({"status": status_})}\n\n'
+
+    def transmitir():
+        nonlocal status
+        try:
+            # Depois do tempo máximo o navegador reconecta sozinho (retry)
+            yield 'retry: 3000\n' + evento(status)
+            fim = time.monotonic() + duracao
+            while status == 'pendente' and time.monotonic() < fim:
+                novo = assinatura.aguardar(timeout=heartbeat)
+                if novo is None:
+                    yield ': ping\n\n'
+                elif novo != status:
+                    status = novo
+                    yield evento(status)
+        finally:
+            assinatura.cancelar()
+
+    resposta = Response(transmitir(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Também quando o cliente desconecta antes do primeiro evento
+    resposta.call_on_close(liberar_conexao)
+    return resposta
@@ -1,14 +1,44 @@
-from flask import Blueprint, render_template, request, redirect, url_for
-from app.models import Produto, Categoria
+from flask import Blueprint, render_template, request, abort
+from app.models import Produto
+from app.services.busca import aplicar_busca
+from app.services.cache_paginas import pagina_em_cache, marcar_pagina
+from app.services.catalogo import (
+    listar_categorias, buscar_categoria, buscar_produto, produtos_relacionados, paginar_produtos, contar_facetas,
+    unidades_disponiveis
+)
+from app.services.facetas import FiltrosProdutos, FAIXAS_PRECO
+from app.utils.paginacao import paginar_por_cursor
 
 bp = Blueprint('loja', __name__)
 
 
+@bp.app_context_processor
+def _menu_categorias():
+    """Categorias do menu do cabeçalho (registro em cache, sem consulta por página)"""
+    # Toda página com o menu muda junto com as categorias
+    marcar_pagina('categorias')
+    return {'categorias_menu': listar_categorias()}
+
+
+# Chaves de ordenação das listagens; o id desempata e torna a ordem total
+ORDENACOES = {
+    'novos': [(Produto.criado_em, 'desc'), (Produto.id, 'desc')],
+    'preco-asc': [(Produto.preco, 'asc'), (Produto.id, 'asc')],
+    'preco-desc': [(Produto.preco, 'desc'), (Produto.id, 'desc')],
+    'nome': [(Produto.nome, 'asc'), (Produto.id, 'asc')],
+    # Colunas pré-calculadas e indexadas (desconto ao salvar, vendas em app/services/vendas.py)
+    'desconto': [(Produto.desconto_percentual, 'desc'), (Produto.id, 'desc')],
+    'mais-vendidos': [(Produto.vendas_30d, 'desc'), (Produto.id, 'desc')],
+}
+
+
 @bp.route('/')
+@pagina_em_cache
 def index():
     """Página inicial - produtos em destaque"""
-    produtos_destaque = Produto.query.filter_by(ativo=True).order_by(Produto.criado_em.desc()).limit(8).all()
-    categorias = Categoria.query.all()
+    produtos_destaque = paginar_produtos(ORDENACOES['novos'], per_page=8).items
+    categorias = listar_categorias()
+    marcar_pagina('home', 'categorias', *(f'produto:{p.id}' for p in produtos_destaque))
     return render_template('loja/index.html', produtos=produtos_destaque, categorias=categorias)
 
 
@@ -18,35 +48,29 @@ def produtos():
     # Filtros
     categoria_slug = request.args.get('categoria')
     busca = request.args.get('q', '')
-    ordenar = request.args.get('ordem', 'novos')
-
-    # Query base
-    query = Produto.query.filter_by(ativo=True)
+    ordenar = request.args.get('ordem', 'relevancia' if busca else 'novos')
 
-    # Filtro por categoria
-    if categoria_slug:
-        categoria = Categoria.query.filter_by(slug=categoria_slug).first()
-        if categoria:
-            query = query.filter_by(categoria_id=categoria.id)
+    # Filtros facetados: categoria, faixa de preço, em estoque, em promoção
+    categoria = buscar_categoria(categoria_slug) if categoria_slug else None
+    filtros = FiltrosProdutos.da_url(request.args, categoria.id if categoria else None)
+    facetas = None
 
-    # Busca por nome
     if busca:
-        query = query.filter(Produto.nome.ilike(f'%{busca}%'))
-
-    # Ordenação
-    if ordenar == 'preco-asc':
-        query = query.order_by(Produto.preco.asc())
-    elif ordenar == 'preco-desc':
-        query = query.order_by(Produto.preco.desc())
-    elif ordenar == 'nome':
-        query = query.order_by(Produto.nome.asc())
-    else:  # novos
-        query = query.order_by(Produto.criado_em.desc())
-
-    # Paginação
-    page = request.args.get('page', 1, type=int)
-    produtos = query.paginate(page=page, per_page=12)
-    categorias = Categoria.query.all()
+        # Busca textual (nome + descrição, sem acentos, ranqueada) no banco
+        query = filtros.aplicar(Produto.query.filter_by(ativo=True))
+        query, relevancia = aplicar_busca(query, busca)
+
+        if ordenar == 'relevancia' and relevancia is not None:
+            ordenacao = [relevancia, (Produto.id, 'desc')]
+        else:
+            ordenacao = ORDENACOES.get(ordenar, ORDENACOES['novos'])
+        produtos = paginar_por_cursor(query, ordenacao, request.args.get('cursor'), per_page=12)
+    else:
+        # Navegação sem busca: snapshot do catálogo, com contagens por faceta
+        ordenacao = ORDENACOES.get(ordenar, ORDENACOES['novos'])
+        produtos = paginar_produtos(ordenacao, filtros, request.args.get('cursor'), per_page=12)
+        facetas = contar_facetas(filtros)
+    categorias = listar_categorias()
 
     return render_template(
         'loja/produtos.html',
@@ -54,32 +78,41 @@ def produtos():
         categorias=categorias,
         categoria_atual=categoria_slug,
         busca=busca,
-        ordenar=ordenar
+        ordenar=ordenar,
+        filtros=filtros,
+        facetas=facetas,
+        faixas_preco=FAIXAS_PRECO
     )
 
 
 @bp.route('/produto/<slug>')
+@pagina_em_cache
 def produto(slug):
     """Página de detalhes do produto"""
-    produto = Produto.query.filter_by(slug=slug, ativo=True).first_or_404()
-    # Produtos relacionados da mesma categoria
-    relacionados = Produto.query.filter(
-        Produto.categoria_id == produto.categoria_id,
-        Produto.id != produto.id,
-        Produto.ativo == True
-    ).limit(4).all()
+    produto = buscar_produto(slug)
+    if produto is None:
+        abort(404)
+    # Quem comprou também comprou, completado com a mesma categoria
+    relacionados = produtos_relacionados(produto, limite=4)
+    marcar_pagina(f'produto:{produto.id}', *(f'produto:{p.id}' for p in relacionados))
+    if produto.categoria:
+        marcar_pagina(f'categoria:{produto.categoria.slug}')
 
-    return render_template('loja/produto.html', produto=produto, relacionados=relacionados)
+    # Botão de compra com o estoque de agora, não o do snapshot
+    disponivel = unidades_disponiveis(produto.id)
+    return render_template('loja/produto.html', produto=produto, relacionados=relacionados, disponivel=disponivel)
 
 
 @bp.route('/categoria/<slug>')
+@pagina_em_cache
 def categoria(slug):
     """Listagem de produtos por categoria"""
-    categoria = Categoria.query.filter_by(slug=slug).first_or_404()
-    page = request.args.get('page', 1, type=int)
-    produtos = Produto.query.filter_by(
-        categoria_id=categoria.id,
-        ativo=True
-    ).order_by(Produto.criado_em.desc()).paginate(page=page, per_page=12)
+    categoria = buscar_categoria(slug)
+    if categoria is None:
+        abort(404)
+    produtos = paginar_produtos(
+        ORDENACOES['novos'], FiltrosProdutos(categoria_id=categoria.id), request.args.get('cursor'), per_page=12
+    )
+    marcar_pagina(f'categoria:{categoria.slug}', *(f'produto:{p.id}' for p in produtos.items))
 
     return render_template('loja/categoria.html', categoria=categoria, produtos=produtos)
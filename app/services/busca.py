@@ -0,0 +1,71 @@
+"""
+Busca textual de produtos
+Postgres: tsvector (coluna busca_vetor) + índice GIN, ranqueado com ts_rank
+SQLite: tabela virtual FTS5 (produtos_fts), ranqueada com bm25
+"""
+from sqlalchemy import func, literal_column, text
+from app.models import db, Produto
+from app.utils.texto import normalizar_texto, tokenizar
+
+
+def _dialeto():
+    """Retorna o nome do dialeto do banco em uso"""
+    return db.session.get_bind().dialect.name
+
+
+def aplicar_busca(query, termo):
+    """
+    Filtra uma query de Produto pelo termo de busca.
+    Retorna (query, relevancia), onde relevancia é a chave de ordenação
+    (expressao, direcao) com os melhores resultados primeiro, ou None se o
+    banco não suportar ranking.
+    """
+    termos = tokenizar(termo)
+    if not termos:
+        return query, None
+
+    dialeto = _dialeto()
+
+    if dialeto == 'postgresql':
+        # Cada termo vira prefixo: "cabo usb-c" -> cabo:* & usb:* & c:*
+        consulta = func.to_tsquery('simple', ' & '.join(f'{t}:*' for t in termos))
+        vetor = literal_column('produtos.busca_vetor')
+        query = query.filter(vetor.op('@@')(consulta))
+        # Cast para double: o valor volta idêntico no cursor de paginação
+        return query, (func.ts_rank(vetor, consulta).cast(db.Float), 'desc')
+
+    if dialeto == 'sqlite':
+        consulta = ' '.join(f'"{t}"*' for t in termos)
+        resultados = text(
+            'SELECT rowid AS produto_id, bm25(produtos_fts) AS relevancia '
+            'FROM produtos_fts WHERE produtos_fts MATCH :consulta'
+        ).bindparams(consulta=consulta).columns(
+            produto_id=db.Integer, relevancia=db.Float
+        ).subquery('busca')
+        query = query.join(resultados, resultados.c.produto_id == Produto.id)
+        # bm25 retorna valores negativos: quanto menor, mais relevante
+        return query, (resultados.c.relevancia, 'asc')
+
+    # Outros bancos: filtro simples sobre o texto normalizado, sem ranking
+    for t in termos:
+        query = query.filter(Produto.busca_texto.like(f'%{t}%'))
+    return query, None
+
+
+def reindexar():
+    """Recalcula o texto de busca de todos os produtos e reconstrói o índice"""
+    produtos = db.session.execute(
+        db.select(Produto.id, Produto.nome, Produto.descricao)
+    ).all()
+
+    if produtos:
+        db.session.execute(
+            db.update(Produto).execution_options(synchronize_session=False),
+            [{'id': p.id, 'busca_texto': normalizar_texto(p.nome, p.descricao)} for p in produtos]
+        )
+
+    if _dialeto() == 'sqlite':
+        db.session.execute(text("INSERT INTO produtos_fts(produtos_fts) VALUES ('rebuild')"))
+
+    db.session.commit()
+    return len(produtos)
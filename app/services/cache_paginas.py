@@ -0,0 +1,250 @@
+"""
+Cache de páginas da vitrine
+Visitantes anônimos recebem o mesmo HTML em index, categoria e produto;
+a página pronta fica guardada por CACHE_PAGINAS_TTL segundos, com chave
+no caminho + query string.
+- Cada página é marcada com tags ('home', 'categorias', 'categoria:cabos',
+  'produto:42'); o admin e o checkout invalidam as tags do que mudaram.
+- Usuários logados e requests com mensagens flash pendentes não passam
+  pelo cache. O contador do carrinho é preenchido por JavaScript, então
+  a página em si não depende do carrinho.
+- Só o corpo é guardado: cookies e cabeçalhos são sempre do request atual.
+Backends (CACHE_PAGINAS_BACKEND): 'memoria' (por processo; invalidações
+feitas em outro processo só valem depois do TTL), 'redis' (compartilhado
+entre os workers) ou 'desligado'.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, g, make_response
+from flask_login import current_user
+
+
+class CachePaginasMemoria:
+    """Páginas em um dict LRU dentro do processo"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._paginas = OrderedDict()  # chave -> (expira_em, corpo, tags)
+        self._tags = {}  # tag -> {chaves}
+        self._contadores = {'hits': 0, 'misses': 0, 'ignoradas': 0}
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            pagina = self._paginas.get(chave)
+            if pagina is None:
+                return None
+            if pagina[0] <= time.monotonic():
+                self._remover(chave)
+                return None
+            self._paginas.move_to_end(chave)
+            return pagina[1]
+
+    def gravar(self, chave, corpo, tags, ttl):
+        with self._lock:
+            if chave in self._paginas:
+                self._remover(chave)
+            self._paginas[chave] = (time.monotonic() + ttl, corpo, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(chave)
+            while len(self._paginas) > self.maximo:
+                self._remover(next(iter(self._paginas)))
+
+    def _remover(self, chave):
+        _, _, tags = self._paginas.pop(chave)
+        for tag in tags:
+            chaves = self._tags.get(tag)
+            if chaves:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._tags[tag]
+
+    def invalidar(self, tags):
+        with self._lock:
+            chaves = set()
+            for tag in tags:
+                chaves.update(self._tags.get(tag, ()))
+            for chave in chaves:
+                self._remover(chave)
+            return len(chaves)
+
+    def limpar(self):
+        with self._lock:
+            self._paginas.clear()
+            self._tags.clear()
+
+    def contar(self, contador):
+        with self._lock:
+            self._contadores[contador] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._contadores, paginas=len(self._paginas))
+
+
+class CachePaginasRedis:
+    """
+    Páginas em chaves Redis com expiração; cada tag é um set com as chaves
+    marcadas por ela. Contadores num hash, somados entre os processos.
+    """
+
+    PREFIXO = 'pagina:'
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def obter(self, chave):
+        return self.cliente.get(self.PREFIXO + chave)
+
+    def gravar(self, chave, corpo, tags, ttl):
+        chave = self.PREFIXO + chave
+        pipe = self.cliente.pipeline()
+        pipe.set(chave, corpo, ex=ttl)
+        for tag in tags:
+            pipe.sadd(f'{self.PREFIXO}tag:{tag}', chave)
+            pipe.expire(f'{self.PREFIXO}tag:{tag}', ttl * 2)
+        pipe.execute()
+
+    def invalidar(self, tags):
+        chaves_tags = [f'{self.PREFIXO}tag:{tag}' for tag in tags]
+        chaves = set()
+        for chave_tag in chaves_tags:
+            chaves.update(self.cliente.smembers(chave_tag))
+        self.cliente.delete(*chaves, *chaves_tags)
+        return len(chaves)
+
+    def limpar(self):
+        chaves = [c for c in self.cliente.scan_iter(f'{self.PREFIXO}*') if not c.endswith(b'contadores')]
+        if chaves:
+            self.cliente.delete(*chaves)
+
+    def contar(self, contador):
+        self.cliente.hincrby(f'{self.PREFIXO}contadores', contador, 1)
+
+    def estatisticas(self):
+        dados = self.cliente.hgetall(f'{self.PREFIXO}contadores')
+        contadores = {'hits': 0, 'misses': 0, 'ignoradas': 0}
+        contadores.update({k.decode(): int(v) for k, v in dados.items()})
+        return contadores
+
+
+def get_cache_paginas():
+    """Retorna o cache de páginas configurado (um por processo) ou None se desligado"""
+    extensoes = current_app.extensions
+    if 'cache_paginas' not in extensoes:
+        backend = current_app.config.get('CACHE_PAGINAS_BACKEND', 'memoria')
+        if backend == 'redis':
+            import redis  # dependência opcional
+            cache = CachePaginasRedis(redis.Redis.from_url(current_app.config['REDIS_URL']))
+        elif backend == 'memoria':
+            cache = CachePaginasMemoria(current_app.config.get('CACHE_PAGINAS_MAXIMO', 2000))
+        else:
+            cache = None
+        extensoes['cache_paginas'] = cache
+    return extensoes['cache_paginas']
+
+
+def _pode_usar_cache():
+    return (
+        request.method == 'GET'
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+    )
+
+
+def marcar_pagina(*tags):
+    """Acrescenta tags à página em renderização (usado pelas views em cache)"""
+    g.setdefault('tags_pagina', set()).update(tags)
+
+
+def pagina_em_cache(view):
+    """
+    Serve a view do cache para visitantes anônimos. A view chama
+    marcar_pagina() com as tags do que exibiu; só respostas 200 são guardadas.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_cache_paginas()
+        if cache is None:
+            return view(*args, **kwargs)
+        if not _pode_usar_cache():
+            _contar(cache, 'ignoradas')
+            return view(*args, **kwargs)
+
+        chave = request.full_path
+        try:
+            corpo = cache.obter(chave)
+        except Exception as e:
+            current_app.logger.warning(f'Cache de páginas indisponível: {str(e)}')
+            return view(*args, **kwargs)
+
+        if corpo is not None:
+            _contar(cache, 'hits')
+            resposta = make_response(corpo)
+            resposta.headers['X-Cache'] = 'HIT'
+            return resposta
+
+        _contar(cache, 'misses')
+        resposta = make_response(view(*args, **kwargs))
+        # A view pode ter gerado um flash (ex.: aviso) durante a renderização
+        if resposta.status_code == 200 and '_flashes' not in session:
+            try:
+                cache.gravar(chave, resposta.get_data(), g.get('tags_pagina', set()),
+                             current_app.config.get('CACHE_PAGINAS_TTL', 60))
+            except Exception as e:
+                current_app.logger.warning(f'Falha ao gravar página no cache: {str(e)}')
+        resposta.headers['X-Cache'] = 'MISS'
+        return resposta
+
+    return wrapper
+
+
+def _contar(cache, contador):
+    try:
+        cache.contar(contador)
+    except Exception:
+        pass
+
+
+def invalidar_paginas(*tags):
+    """Remove do cache as páginas marcadas com qualquer uma das tags (chame depois do commit)"""
+    cache = get_cache_paginas()
+    if cache is None or not tags:
+        return 0
+    try:
+        return cache.invalidar(tags)
+    except Exception as e:
+        current_app.logger.warning(f'Falha ao invalidar páginas {tags}: {str(e)}')
+        return 0
+
+
+def invalidar_produtos(produto_ids):
+    """Invalida as páginas que exibem os produtos (mudança de estoque ou preço)"""
+    return invalidar_paginas(*(f'produto:{produto_id}' for produto_id in produto_ids))
+
+
+def limpar_paginas():
+    """Esvazia o cache de páginas (mudanças em massa, como a importação de produtos)"""
+    cache = get_cache_paginas()
+    if cache is None:
+        return
+    try:
+        cache.limpar()
+    except Exception as e:
+        current_app.logger.warning(f'Falha ao limpar o cache de páginas: {str(e)}')
+
+
+def estatisticas_cache():
+    """Contadores de hits/misses/ignoradas e taxa de acerto (painel admin)"""
+    cache = get_cache_paginas()
+    if cache is None:
+        return None
+    try:
+        dados = cache.estatisticas()
+    except Exception:
+        return None
+    consultas = dados['hits'] + dados['misses']
+    dados['taxa_acerto'] = round(100 * dados['hits'] / consultas, 1) if consultas else 0
+    return dados
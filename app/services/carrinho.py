@@ -0,0 +1,428 @@
+"""
+Carrinho de compras
+- CarrinhoStore: armazenamento do carrinho no servidor (tabela ou Redis),
+  identificado por um cookie pequeno com o id do carrinho
+- resolver_carrinho: carrega os produtos do carrinho em uma única
+  consulta (IN) e calcula subtotais e total em um só lugar
+- limpar_carrinhos_abandonados: apaga do banco os carrinhos sem alteração
+  há CARRINHO_TTL_DIAS (no Redis o TTL da chave faz o mesmo)
+"""
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from flask import current_app, request, g
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app.models import db, Produto, CarrinhoItem, ReservaEstoque
+from app.services.catalogo import produtos_por_id
+
+
+# ==================== ARMAZENAMENTO ====================
+
+class CarrinhoStore(ABC):
+    """
+    Interface de armazenamento do carrinho.
+    O carrinho é devolvido no formato {produto_id (str): {'quantidade': n}}.
+    Adicionar e atualizar alteram só a linha do produto, de forma atômica,
+    sem ler e regravar o carrinho inteiro.
+    """
+
+    @abstractmethod
+    def obter(self, carrinho_id):
+        ...
+
+    @abstractmethod
+    def adicionar(self, carrinho_id, produto_id, quantidade):
+        """Soma quantidade à linha do produto (cria se não existir)"""
+
+    @abstractmethod
+    def atualizar(self, carrinho_id, produto_id, quantidade):
+        """Define a quantidade de uma linha existente; retorna False se não existir"""
+
+    @abstractmethod
+    def remover(self, carrinho_id, produto_id):
+        ...
+
+    @abstractmethod
+    def limpar(self, carrinho_id):
+        ...
+
+    def contar(self, carrinho_id):
+        """Total de unidades no carrinho"""
+        return sum(item['quantidade'] for item in self.obter(carrinho_id).values())
+
+    def mesclar(self, origem, destino):
+        """Soma as linhas do carrinho origem no destino e esvazia a origem"""
+        if origem == destino:
+            return
+        for produto_id, item in self.obter(origem).items():
+            self.adicionar(destino, int(produto_id), item['quantidade'])
+        self.limpar(origem)
+
+
+class CarrinhoStoreDB(CarrinhoStore):
+    """Carrinho na tabela carrinho_itens, uma linha por produto"""
+
+    def obter(self, carrinho_id):
+        linhas = db.session.execute(
+            db.select(CarrinhoItem.produto_id, CarrinhoItem.quantidade)
+            .filter_by(carrinho_id=carrinho_id)
+        ).all()
+        return {str(l.produto_id): {'quantidade': l.quantidade} for l in linhas}
+
+    def _update(self, carrinho_id, produto_id, valor):
+        return db.session.execute(
+            db.update(CarrinhoItem)
+            .where(CarrinhoItem.carrinho_id == carrinho_id, CarrinhoItem.produto_id == produto_id)
+            .values(quantidade=valor)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def adicionar(self, carrinho_id, produto_id, quantidade):
+        # UPDATE atômico; se a linha não existe, INSERT. Se outro request
+        # inserir a mesma linha ao mesmo tempo, a PK falha e o UPDATE é refeito.
+        if not self._update(carrinho_id, produto_id, CarrinhoItem.quantidade + quantidade):
+            try:
+                with db.session.begin_nested():
+                    db.session.add(CarrinhoItem(carrinho_id=carrinho_id, produto_id=produto_id, quantidade=quantidade))
+            except IntegrityError:
+                self._update(carrinho_id, produto_id, CarrinhoItem.quantidade + quantidade)
+        db.session.commit()
+
+    def atualizar(self, carrinho_id, produto_id, quantidade):
+        alterado = self._update(carrinho_id, produto_id, quantidade) > 0
+        db.session.commit()
+        return alterado
+
+    def remover(self, carrinho_id, produto_id):
+        db.session.execute(
+            db.delete(CarrinhoItem).filter_by(carrinho_id=carrinho_id, produto_id=produto_id)
+        )
+        db.session.commit()
+
+    def limpar(self, carrinho_id):
+        db.session.execute(db.delete(CarrinhoItem).filter_by(carrinho_id=carrinho_id))
+        db.session.commit()
+
+    def contar(self, carrinho_id):
+        return db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(CarrinhoItem.quantidade), 0))
+            .filter_by(carrinho_id=carrinho_id)
+        )
+
+
+class CarrinhoStoreRedis(CarrinhoStore):
+    """
+    Carrinho como hash Redis (campo = produto_id, valor = quantidade).
+    Aceita qualquer cliente com a interface do redis-py, inclusive o RedisLocal.
+    """
+
+    def __init__(self, cliente, ttl_segundos):
+        self.cliente = cliente
+        self.ttl = ttl_segundos
+
+    def _chave(self, carrinho_id):
+        return f'carrinho:{carrinho_id}'
+
+    def obter(self, carrinho_id):
+        dados = self.cliente.hgetall(self._chave(carrinho_id))
+        return {_texto(p): {'quantidade': int(q)} for p, q in dados.items() if int(q) > 0}
+
+    def adicionar(self, carrinho_id, produto_id, quantidade):
+        chave = self._chave(carrinho_id)
+        self.cliente.hincrby(chave, str(produto_id), quantidade)
+        self.cliente.expire(chave, self.ttl)
+
+    def atualizar(self, carrinho_id, produto_id, quantidade):
+        chave = self._chave(carrinho_id)
+        if not self.cliente.hexists(chave, str(produto_id)):
+            return False
+        self.cliente.hset(chave, str(produto_id), quantidade)
+        self.cliente.expire(chave, self.ttl)
+        return True
+
+    def remover(self, carrinho_id, produto_id):
+        self.cliente.hdel(self._chave(carrinho_id), str(produto_id))
+
+    def limpar(self, carrinho_id):
+        self.cliente.delete(self._chave(carrinho_id))
+
+
+class RedisLocal:
+    """
+    Substituto em memória para o cliente Redis (só os comandos de hash usados
+    pelo carrinho). Vale apenas dentro do processo: serve para testes e
+    desenvolvimento com um único worker. Como no Redis, a chave com expire
+    some depois do prazo, e as vencidas são varridas de tempos em tempos.
+    """
+
+    INTERVALO_VARREDURA = 60
+
+    def __init__(self):
+        self._dados = {}
+        self._expira_em = {}  # chave -> time.monotonic() do vencimento
+        self._proxima_varredura = time.monotonic() + self.INTERVALO_VARREDURA
+        self._lock = threading.Lock()
+
+    def _hash(self, chave, criar=False):
+        """Hash da chave, descartando a chave vencida. Chamar com o lock."""
+        agora = time.monotonic()
+        if agora >= self._proxima_varredura:
+            self._proxima_varredura = agora + self.INTERVALO_VARREDURA
+            for vencida in [c for c, expira_em in self._expira_em.items() if expira_em <= agora]:
+                self._apagar(vencida)
+        elif self._expira_em.get(chave, agora + 1) <= agora:
+            self._apagar(chave)
+        return self._dados.setdefault(chave, {}) if criar else self._dados.get(chave, {})
+
+    def _apagar(self, chave):
+        self._dados.pop(chave, None)
+        self._expira_em.pop(chave, None)
+
+    def hgetall(self, chave):
+        with self._lock:
+            return dict(self._hash(chave))
+
+    def hincrby(self, chave, campo, valor):
+        with self._lock:
+            hash_ = self._hash(chave, criar=True)
+            hash_[campo] = hash_.get(campo, 0) + valor
+            return hash_[campo]
+
+    def hexists(self, chave, campo):
+        with self._lock:
+            return campo in self._hash(chave)
+
+    def hset(self, chave, campo, valor):
+        with self._lock:
+            self._hash(chave, criar=True)[campo] = int(valor)
+
+    def hdel(self, chave, campo):
+        with self._lock:
+            hash_ = self._hash(chave)
+            hash_.pop(campo, None)
+            if not hash_:
+                self._apagar(chave)  # Hash vazio deixa de existir, como no Redis
+
+    def delete(self, chave):
+        with self._lock:
+            self._apagar(chave)
+
+    def expire(self, chave, segundos):
+        with self._lock:
+            self._hash(chave)
+            if chave not in self._dados:
+                return False
+            self._expira_em[chave] = time.monotonic() + segundos
+            return True
+
+
+def _texto(valor):
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def get_carrinho_store():
+    """Retorna o CarrinhoStore configurado (um por processo)"""
+    store = current_app.extensions.get('carrinho_store')
+    if store is None:
+        backend = current_app.config.get('CARRINHO_BACKEND', 'db')
+        ttl = current_app.config.get('CARRINHO_TTL_DIAS', 30) * 86400
+
+        if backend == 'redis':
+            import redis  # dependência opcional
+            store = CarrinhoStoreRedis(redis.Redis.from_url(current_app.config['REDIS_URL']), ttl)
+        elif backend == 'memoria':
+            store = CarrinhoStoreRedis(RedisLocal(), ttl)
+        else:
+            store = CarrinhoStoreDB()
+
+        current_app.extensions['carrinho_store'] = store
+    return store
+
+
+def limpar_carrinhos_abandonados(lote=1000):
+    """
+    Apaga da tabela carrinho_itens os carrinhos sem nenhuma linha alterada
+    há CARRINHO_TTL_DIAS (o cookie do anônimo já venceu) e libera as
+    reservas que ainda tiverem, em lotes com um commit cada (índice em
+    atualizado_em). Retorna o total de carrinhos apagados.
+    """
+    from app.services.estoque import liberar_reservas_carrinho
+
+    limite = datetime.utcnow() - timedelta(days=current_app.config.get('CARRINHO_TTL_DIAS', 30))
+    recente = aliased(CarrinhoItem)
+    total = 0
+
+    while True:
+        ids = db.session.scalars(
+            db.select(CarrinhoItem.carrinho_id).distinct()
+            .where(CarrinhoItem.atualizado_em < limite)
+            .where(~db.select(recente.carrinho_id)
+                   .where(recente.carrinho_id == CarrinhoItem.carrinho_id, recente.atualizado_em >= limite)
+                   .exists())
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        for carrinho_id in ids:
+            liberar_reservas_carrinho(carrinho_id)
+        # Linha alterada depois da consulta fica: o carrinho voltou a ser usado
+        db.session.execute(
+            db.delete(CarrinhoItem)
+            .where(CarrinhoItem.carrinho_id.in_(ids), CarrinhoItem.atualizado_em < limite)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        total += len(ids)
+
+        if len(ids) < lote:
+            break
+    return total
+
+
+# ==================== IDENTIFICAÇÃO ====================
+
+def _token_anonimo():
+    """Token do carrinho anônimo guardado no cookie"""
+    if 'carrinho_token' not in g:
+        token = request.cookies.get(current_app.config.get('CARRINHO_COOKIE', 'carrinho_id'), '')
+        g.carrinho_token = token if token.isascii() and 16 <= len(token) <= 48 else None
+    return g.carrinho_token
+
+
+def carrinho_id_atual(criar=False):
+    """
+    Id do carrinho do visitante: 'u:<id>' para usuários logados e
+    'a:<token>' para anônimos. Com criar=True gera um token novo, que é
+    gravado no cookie ao final do request.
+    """
+    if current_user.is_authenticated:
+        return f'u:{current_user.id}'
+
+    token = _token_anonimo()
+    if not token:
+        if not criar:
+            return None
+        token = g.carrinho_token = secrets.token_urlsafe(24)
+        g.carrinho_token_novo = True
+    return f'a:{token}'
+
+
+def gravar_cookie_carrinho(response):
+    """Grava o cookie com o id do carrinho anônimo, se um novo foi criado"""
+    if g.get('carrinho_token_novo'):
+        response.set_cookie(
+            current_app.config.get('CARRINHO_COOKIE', 'carrinho_id'),
+            g.carrinho_token,
+            max_age=current_app.config.get('CARRINHO_TTL_DIAS', 30) * 86400,
+            httponly=True,
+            samesite='Lax'
+        )
+    return response
+
+
+def obter_carrinho():
+    """Retorna o carrinho do visitante atual"""
+    carrinho_id = carrinho_id_atual()
+    return get_carrinho_store().obter(carrinho_id) if carrinho_id else {}
+
+
+def mesclar_carrinho_anonimo(user):
+    """Move o carrinho anônimo do cookie para o carrinho do usuário (login)"""
+    from app.services.estoque import transferir_reservas
+
+    token = _token_anonimo()
+    if token:
+        transferir_reservas(f'a:{token}', f'u:{user.id}')
+        get_carrinho_store().mesclar(f'a:{token}', f'u:{user.id}')
+        db.session.commit()
+
+
+# ==================== RESOLUÇÃO ====================
+
+
+@dataclass
+class ItemCarrinho:
+    """Linha do carrinho com o produto já carregado"""
+    produto: Produto
+    quantidade: int
+    reservado: int = 0  # Unidades reservadas por este carrinho (já contadas em estoque_reservado)
+
+    @property
+    def subtotal(self):
+        return self.produto.preco * self.quantidade
+
+    @property
+    def unidades_livres(self):
+        """Unidades que este carrinho pode comprar: livres de reservas mais as suas próprias"""
+        return max((self.produto.estoque or 0) - (self.produto.estoque_reservado or 0) + self.reservado, 0)
+
+    @property
+    def disponivel(self):
+        """Produto ativo e com estoque para a quantidade pedida (mesma conta da reserva e da baixa)"""
+        return bool(self.produto.ativo) and self.unidades_livres >= self.quantidade
+
+
+@dataclass
+class CarrinhoResolvido:
+    """Resultado da resolução do carrinho"""
+    itens: list = field(default_factory=list)
+    ausentes: list = field(default_factory=list)  # ids que não existem mais
+
+    @property
+    def total(self):
+        return sum(item.subtotal for item in self.itens)
+
+    @property
+    def indisponiveis(self):
+        return [item for item in self.itens if not item.disponivel]
+
+    def __bool__(self):
+        return bool(self.itens)
+
+
+def _reservado_pelo_carrinho(carrinho_id, ids):
+    """{produto_id: unidades} reservadas pelo carrinho, em uma consulta"""
+    if not carrinho_id or not ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(ReservaEstoque.produto_id, db.func.sum(ReservaEstoque.quantidade))
+        .where(ReservaEstoque.carrinho_id == carrinho_id, ReservaEstoque.produto_id.in_(ids))
+        .group_by(ReservaEstoque.produto_id)
+    ).all())
+
+
+def resolver_carrinho(carrinho, somente_disponiveis=False, do_banco=False, carrinho_id=None):
+    """
+    Resolve um carrinho no formato {produto_id: {'quantidade': n}}.
+    Com somente_disponiveis=True, descarta itens inativos ou sem estoque.
+    Os produtos vêm do snapshot do catálogo; do_banco=True lê preço e
+    estoque atuais do banco (fechamento do pedido).
+    carrinho_id: as reservas do próprio carrinho contam como disponíveis
+    para ele (como na baixa do checkout, que as libera antes).
+    """
+    ids = [int(produto_id) for produto_id in carrinho]
+    if do_banco:
+        produtos = {p.id: p for p in Produto.query.filter(Produto.id.in_(ids)).all()} if ids else {}
+    else:
+        produtos = produtos_por_id(ids)
+    reservado = _reservado_pelo_carrinho(carrinho_id, ids)
+
+    resolvido = CarrinhoResolvido()
+    for produto_id, item in carrinho.items():
+        produto = produtos.get(int(produto_id))
+        if not produto:
+            resolvido.ausentes.append(int(produto_id))
+            continue
+
+        linha = ItemCarrinho(produto=produto, quantidade=item['quantidade'], reservado=reservado.get(produto.id, 0))
+        if somente_disponiveis and not linha.disponivel:
+            continue
+        resolvido.itens.append(linha)
+
+    return resolvido
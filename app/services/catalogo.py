@@ -0,0 +1,678 @@
+"""
+Snapshot do catálogo em arquivo mapeado em memória (mmap)
+O catálogo muda poucas vezes ao dia, mas toda página da vitrine consultava
+produtos e categorias. O snapshot guarda o catálogo em colunas paralelas
+(id, preço, estoque, categoria...) num arquivo binário somente leitura que
+todos os workers do gunicorn mapeiam: as páginas do arquivo ficam uma vez
+só no cache do sistema operacional, e navegar não vai ao banco.
+- Índices no próprio arquivo: produtos por slug (ordenados) e por
+  categoria (faixas contínuas). Ordenações das listagens são montadas a
+  partir das colunas e guardadas por processo até o próximo snapshot.
+- O admin de produtos e a importação chamam atualizar_catalogo() depois
+  do commit. A reconstrução é incremental: parte do snapshot atual e
+  relê só os produtos com atualizado_em recente, mas ainda reescreve o
+  arquivo inteiro sob trava. No caminho das compras (checkout,
+  cancelamento de pedido) isso custaria caro a cada pedido, então esses
+  só chamam marcar_catalogo_desatualizado(), e a thread de renovação
+  reconstrói em segundo plano.
+  O novo arquivo substitui o antigo com os.replace, e cada processo nota
+  a troca pelo os.stat() do arquivo e remapeia.
+- A janela incremental (CATALOGO_FOLGA_SEGUNDOS) não garante pegar uma
+  transação longa que comitou depois, nem mudanças que não avisam
+  (reservas de carrinho, worker, SQL direto). Por isso uma thread por
+  processo refaz o snapshot do zero quando ele passa de
+  CATALOGO_MAX_IDADE_SEGUNDOS (um processo por host, pela trava de
+  arquivo). Os requests da vitrine nunca reconstroem: sem arquivo, ou
+  com arquivo ilegível, consultam o banco até a thread gravar um novo.
+- O estoque do snapshot pode ter até CATALOGO_MAX_IDADE_SEGUNDOS; o botão
+  de compra da página do produto lê o disponível no banco
+  (unidades_disponiveis).
+- Sem snapshot (desligado ou erro), as funções consultam o banco.
+O arquivo vale para os processos de um mesmo host (CATALOGO_DIR), por
+isso a thread roda nos processos web e não no worker.
+"""
+import bisect
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app.models import db, Produto, Categoria
+from app.services.facetas import indice_facetas
+from app.services.relacionados import ids_relacionados
+from app.utils.paginacao import (
+    PaginaCursor, codificar_cursor, converter_valores, decodificar_cursor, paginar_por_cursor
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+MAGICO = b'TZCATAL2'  # Muda junto com o layout das colunas
+CABECALHO = struct.Struct('<8sqII')  # mágico, gerado_em (µs desde 1970), produtos, categorias
+SECAO = struct.Struct('<24sc7xQ')  # nome, typecode do array, tamanho em bytes
+EPOCA = datetime(1970, 1, 1)
+
+# Colunas numéricas dos produtos (nome = atributo de Produto) e textos
+COLUNAS_PRODUTO = {
+    'id': 'q',
+    'preco': 'd',
+    'preco_antigo': 'd',  # NaN = sem preço antigo
+    'estoque': 'i',
+    'estoque_reservado': 'i',
+    'categoria_id': 'i',  # 0 = sem categoria
+    'ativo': 'B',
+    'criado_em': 'q',  # µs desde 1970
+    'desconto_percentual': 'i',
+    'vendas_30d': 'i',
+}
+TEXTOS_PRODUTO = ('nome', 'slug', 'descricao', 'imagem')
+TEXTOS_CATEGORIA = ('nome', 'slug', 'descricao')
+
+
+def _micro(data):
+    return (data - EPOCA) // timedelta(microseconds=1) if data else 0
+
+
+def _data(micro):
+    return EPOCA + timedelta(microseconds=micro)
+
+
+class CategoriaCatalogo:
+    """Categoria lida do snapshot (mesmos atributos usados pelos templates)"""
+    __slots__ = ('id', 'nome', 'slug', 'descricao', 'total_produtos')
+
+    def __init__(self, id, nome, slug, descricao, total_produtos=0):
+        self.id = id
+        self.nome = nome
+        self.slug = slug
+        self.descricao = descricao
+        self.total_produtos = total_produtos  # Produtos ativos
+
+
+class ProdutoCatalogo:
+    """Produto lido do snapshot, somente leitura"""
+    __slots__ = ('id', 'nome', 'slug', 'descricao', 'preco', 'preco_antigo', 'estoque',
+                 'estoque_reservado', 'imagem', 'ativo', 'categoria_id', 'criado_em',
+                 'desconto_percentual', 'vendas_30d', 'categoria')
+
+    disponivel = Produto.disponivel
+
+
+# ==================== LEITURA ====================
+
+class Catalogo:
+    """Snapshot mapeado em memória"""
+
+    def __init__(self, caminho):
+        with open(caminho, 'rb') as arquivo:
+            self.assinatura = _assinatura(os.fstat(arquivo.fileno()))
+            self._mmap = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magico, gerado_em, self.total, self.total_categorias = CABECALHO.unpack_from(self._mmap, 0)
+        if magico != MAGICO:
+            raise ValueError(f'Snapshot de catálogo inválido: {caminho}')
+        self.gerado_em = _data(gerado_em)
+
+        self._s = {}
+        visao = memoryview(self._mmap)
+        posicao = CABECALHO.size
+        while posicao < len(self._mmap):
+            nome, tipo, tamanho = SECAO.unpack_from(self._mmap, posicao)
+            posicao += SECAO.size
+            self._s[nome.rstrip(b'\0').decode()] = visao[posicao:posicao + tamanho].cast(tipo.decode())
+            posicao += tamanho + (-tamanho % 8)
+
+        self._lock = threading.Lock()
+        self._produtos = {}
+        self._ordens = {}
+        self._categorias = [
+            CategoriaCatalogo(self._s['cat.id'][i], *(self._texto('cat.' + t, i) for t in TEXTOS_CATEGORIA))
+            for i in range(self.total_categorias)
+        ]
+        self._categorias_por_id = {c.id: c for c in self._categorias}
+        ativo = self._s['ativo']
+        for categoria in self._categorias:
+            categoria.total_produtos = sum(ativo[i] for i in self.linhas_da_categoria(categoria.id))
+
+    def _texto(self, nome, i):
+        posicoes = self._s[nome + '.pos']
+        return bytes(self._s[nome][posicoes[i]:posicoes[i + 1]]).decode()
+
+    def _valor(self, atributo, i):
+        if atributo in TEXTOS_PRODUTO:
+            return self._texto(atributo, i)
+        return self._s[atributo][i]
+
+    def produto(self, i):
+        """Produto da linha i (montado uma vez por processo)"""
+        produto = self._produtos.get(i)
+        if produto is None:
+            produto = ProdutoCatalogo()
+            for atributo in COLUNAS_PRODUTO:
+                setattr(produto, atributo, self._s[atributo][i])
+            for atributo in TEXTOS_PRODUTO:
+                setattr(produto, atributo, self._texto(atributo, i) or None)
+            produto.nome = produto.nome or ''
+            produto.ativo = bool(produto.ativo)
+            produto.criado_em = _data(produto.criado_em)
+            produto.preco_antigo = None if math.isnan(produto.preco_antigo) else produto.preco_antigo
+            produto.categoria_id = produto.categoria_id or None
+            produto.categoria = self._categorias_por_id.get(produto.categoria_id)
+            self._produtos[i] = produto
+        return produto
+
+    def linha_por_id(self, produto_id):
+        ids = self._s['id']
+        i = bisect.bisect_left(ids, produto_id)
+        return i if i < self.total and ids[i] == produto_id else None
+
+    def linha_por_slug(self, slug):
+        """Busca binária no índice por slug"""
+        alvo = slug.encode()
+        indice = self._s['idx.slug']
+        inicio, fim = 0, self.total
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            linha = indice[meio]
+            atual = self._texto('slug', linha).encode()
+            if atual < alvo:
+                inicio = meio + 1
+            elif atual > alvo:
+                fim = meio
+            else:
+                return linha
+        return None
+
+    def linhas_da_categoria(self, categoria_id):
+        """Linhas da categoria, pela faixa contínua no índice por categoria"""
+        ids = self._s['idx.cat.id']
+        j = bisect.bisect_left(ids, categoria_id)
+        if j == len(ids) or ids[j] != categoria_id:
+            return []
+        return self._s['idx.cat'][self._s['idx.cat.inicio'][j]:self._s['idx.cat.fim'][j]]
+
+    def categorias(self):
+        return list(self._categorias)
+
+    def ordem(self, ordenacao, categoria_id=None):
+        """
+        Linhas ativas (da categoria, se dada) na ordenação [(atributo, 'asc'|'desc')],
+        com as chaves já no sentido da ordem para a busca do cursor.
+        Calculada uma vez por processo e snapshot.
+        """
+        chave_memo = (tuple(ordenacao), categoria_id)
+        ordem = self._ordens.get(chave_memo)
+        if ordem is None:
+            linhas = self.linhas_da_categoria(categoria_id) if categoria_id else range(self.total)
+            ativo = self._s['ativo']
+            chaves = [(self._chave(ordenacao, [self._valor(a, i) for a, _ in ordenacao]), i)
+                      for i in linhas if ativo[i]]
+            chaves.sort()
+            ordem = ([c for c, _ in chaves], [i for _, i in chaves])
+            with self._lock:
+                self._ordens[chave_memo] = ordem
+        return ordem
+
+    @staticmethod
+    def _chave(ordenacao, valores):
+        chave = []
+        for (atributo, direcao), valor in zip(ordenacao, valores):
+            if isinstance(valor, datetime):
+                valor = _micro(valor)
+            if direcao == 'desc':
+                if isinstance(valor, str):
+                    raise ValueError(f'Ordenação descendente por texto não suportada: {atributo}')
+                valor = -valor
+            chave.append(valor)
+        return tuple(chave)
+
+    def paginar(self, ordenacao, categoria_id=None, cursor=None, per_page=12, filtro=None):
+        """
+        Mesma paginação (e mesmo formato de cursor) de paginar_por_cursor.
+        filtro: bitmap (int) das linhas aceitas, vindo do índice de facetas.
+        """
+        chaves, linhas = self.ordem(ordenacao, categoria_id)
+        if filtro is None:
+            passa = None
+        else:
+            marcadas = filtro.to_bytes((self.total + 7) // 8, 'little')
+            passa = lambda i: marcadas[i >> 3] >> (i & 7) & 1
+
+        valores, sentido = None, 'p'
+        if cursor:
+            try:
+                valores, sentido = decodificar_cursor(cursor)
+                valores = converter_valores([getattr(Produto, a) for a, _ in ordenacao], valores)
+                referencia = self._chave(ordenacao, valores)
+            except (TypeError, ValueError):
+                referencia = None
+            if referencia is None:
+                valores, sentido = None, 'p'
+
+        def aceitas(posicoes, limite):
+            encontradas = []
+            for j in posicoes:
+                if passa is None or passa(linhas[j]):
+                    encontradas.append(j)
+                    if len(encontradas) == limite:
+                        break
+            return encontradas
+
+        if sentido == 'a':
+            # Voltando uma página: os itens antes do cursor, de trás para frente
+            fim = bisect.bisect_left(chaves, referencia)
+            posicoes = aceitas(range(fim - 1, -1, -1), per_page + 1)
+            tem_anterior, tem_proxima = len(posicoes) > per_page, True
+            posicoes = posicoes[:per_page][::-1]
+        else:
+            inicio = bisect.bisect_right(chaves, referencia) if valores is not None else 0
+            posicoes = aceitas(range(inicio, len(linhas)), per_page + 1)
+            tem_proxima = len(posicoes) > per_page
+            tem_anterior = bool(aceitas(range(inicio - 1, -1, -1), 1))
+            posicoes = posicoes[:per_page]
+
+        items = [self.produto(linhas[j]) for j in posicoes]
+        if not items:
+            return PaginaCursor(items)
+
+        def cursor_de(produto, direcao):
+            return codificar_cursor([getattr(produto, a) for a, _ in ordenacao], direcao)
+
+        return PaginaCursor(
+            items,
+            next_cursor=cursor_de(items[-1], 'p') if tem_proxima else None,
+            prev_cursor=cursor_de(items[0], 'a') if tem_anterior else None,
+        )
+
+    def colunas(self, *nomes):
+        """Colunas numéricas como listas (montagem de índices)"""
+        return [self._s[nome].tolist() for nome in nomes]
+
+    def linhas(self):
+        """Todas as linhas como tuplas (base da reconstrução incremental)"""
+        colunas = [self._s[c].tolist() for c in COLUNAS_PRODUTO]
+        for texto in TEXTOS_PRODUTO:
+            dados, posicoes = bytes(self._s[texto]), self._s[texto + '.pos'].tolist()
+            colunas.append([dados[posicoes[i]:posicoes[i + 1]].decode() for i in range(self.total)])
+        return zip(*colunas)
+
+
+def _assinatura(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+# ==================== ESCRITA ====================
+
+def _linha_do_banco(p):
+    return (
+        p.id, float(p.preco or 0), float('nan') if p.preco_antigo is None else float(p.preco_antigo),
+        p.estoque or 0, p.estoque_reservado or 0, p.categoria_id or 0, 1 if p.ativo else 0,
+        _micro(p.criado_em), p.desconto_percentual or 0, p.vendas_30d or 0,
+        p.nome or '', p.slug or '', p.descricao or '', p.imagem or '',
+    )
+
+
+def _consulta_produtos():
+    return db.select(
+        Produto.id, Produto.preco, Produto.preco_antigo, Produto.estoque, Produto.estoque_reservado,
+        Produto.categoria_id, Produto.ativo, Produto.criado_em,
+        Produto.desconto_percentual, Produto.vendas_30d,
+        Produto.nome, Produto.slug, Produto.descricao, Produto.imagem,
+    )
+
+
+def _gravar(caminho, gerado_em, linhas, categorias):
+    """Grava o snapshot num arquivo temporário e troca o atual (atômico)"""
+    linhas.sort(key=lambda linha: linha[0])
+    n_colunas = len(COLUNAS_PRODUTO)
+    secoes = []
+
+    def coluna(nome, tipo, valores):
+        secoes.append((nome, tipo, array(tipo, valores).tobytes()))
+
+    def texto(nome, valores):
+        codificados = [v.encode() for v in valores]
+        posicoes = [0]
+        for v in codificados:
+            posicoes.append(posicoes[-1] + len(v))
+        coluna(nome + '.pos', 'Q', posicoes)
+        secoes.append((nome, 'B', b''.join(codificados)))
+        return codificados
+
+    for j, (nome, tipo) in enumerate(COLUNAS_PRODUTO.items()):
+        coluna(nome, tipo, [linha[j] for linha in linhas])
+    slugs = None
+    for j, nome in enumerate(TEXTOS_PRODUTO):
+        codificados = texto(nome, [linha[n_colunas + j] for linha in linhas])
+        if nome == 'slug':
+            slugs = codificados
+
+    # Índice por slug e faixas por categoria (mais novos primeiro dentro da faixa)
+    coluna('idx.slug', 'i', sorted(range(len(linhas)), key=slugs.__getitem__))
+    por_categoria = sorted(range(len(linhas)), key=lambda i: (linhas[i][5], -linhas[i][7], -linhas[i][0]))
+    cat_ids, inicios, fins = [], [], []
+    for posicao, i in enumerate(por_categoria):
+        if not cat_ids or cat_ids[-1] != linhas[i][5]:
+            cat_ids.append(linhas[i][5])
+            inicios.append(posicao)
+            fins.append(posicao)
+        fins[-1] = posicao + 1
+    coluna('idx.cat', 'i', por_categoria)
+    coluna('idx.cat.id', 'i', cat_ids)
+    coluna('idx.cat.inicio', 'i', inicios)
+    coluna('idx.cat.fim', 'i', fins)
+
+    categorias = sorted(categorias, key=lambda c: c[0])
+    coluna('cat.id', 'i', [c[0] for c in categorias])
+    for j, nome in enumerate(TEXTOS_CATEGORIA):
+        texto('cat.' + nome, [c[1 + j] or '' for c in categorias])
+
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(CABECALHO.pack(MAGICO, _micro(gerado_em), len(linhas), len(categorias)))
+        for nome, tipo, dados in secoes:
+            arquivo.write(SECAO.pack(nome.encode(), tipo.encode(), len(dados)))
+            arquivo.write(dados)
+            arquivo.write(b'\0' * (-len(dados) % 8))
+    os.replace(temporario, caminho)
+
+
+def _reconstruir(caminho, completo):
+    """Monta o novo snapshot a partir do atual + produtos alterados (ou do zero)"""
+    try:
+        atual = None if completo else Catalogo(caminho)
+    except (OSError, ValueError):
+        atual = None
+
+    gerado_em = datetime.utcnow()
+    if atual is None:
+        linhas = [_linha_do_banco(p) for p in db.session.execute(_consulta_produtos())]
+    else:
+        # Folga para transações que gravaram atualizado_em antes do commit
+        desde = atual.gerado_em - timedelta(seconds=current_app.config.get('CATALOGO_FOLGA_SEGUNDOS', 5))
+        por_id = {linha[0]: linha for linha in atual.linhas()}
+        existentes = set(db.session.scalars(db.select(Produto.id)))
+        for produto_id in por_id.keys() - existentes:
+            del por_id[produto_id]
+        for p in db.session.execute(_consulta_produtos().where(Produto.atualizado_em >= desde)):
+            por_id[p.id] = _linha_do_banco(p)
+        novos = existentes - por_id.keys()  # Sem atualizado_em (ex.: inseridos por SQL)
+        if novos:
+            for p in db.session.execute(_consulta_produtos().where(Produto.id.in_(novos))):
+                por_id[p.id] = _linha_do_banco(p)
+        linhas = list(por_id.values())
+
+    categorias = db.session.execute(
+        db.select(Categoria.id, Categoria.nome, Categoria.slug, Categoria.descricao)
+    ).all()
+    _gravar(caminho, gerado_em, linhas, categorias)
+    if atual is None:
+        _tocar(caminho + '.completo')  # Idade medida a partir da última reconstrução do zero
+
+
+def _caminho():
+    config = current_app.config
+    # Um arquivo por banco: apps diferentes no mesmo host não se misturam
+    banco = hashlib.sha1(config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:12]
+    return os.path.join(config['CATALOGO_DIR'], f'catalogo-{banco}.bin')
+
+
+def atualizar_catalogo(completo=False, esperar=True):
+    """
+    Reconstrói o snapshot (chame depois do commit que alterou o catálogo).
+    Um processo por vez, com trava de arquivo; com esperar=False desiste se
+    outro já estiver reconstruindo. Retorna False se não atualizou.
+    """
+    _registro_banco.clear()
+    if not current_app.config.get('CATALOGO_SNAPSHOT', True):
+        return False
+    caminho = _caminho()
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho + '.lock', 'a') as trava:
+            if fcntl:
+                try:
+                    fcntl.flock(trava, fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    return False
+            _reconstruir(caminho, completo)
+        return True
+    except Exception as e:
+        current_app.logger.warning(f'Falha ao atualizar o snapshot do catálogo: {str(e)}')
+        return False
+
+
+_estado = {'catalogo': None}
+_estado_lock = threading.Lock()
+_registro_banco = {}  # Registro de categorias sem snapshot
+
+
+def _tocar(caminho):
+    with open(caminho, 'a'):
+        pass
+    os.utime(caminho, None)
+
+
+def marcar_catalogo_desatualizado():
+    """
+    Avisa a thread de renovação (de todos os processos do host) que o
+    catálogo mudou. Só toca um arquivo: pode ser chamada no request.
+    """
+    if not current_app.config.get('CATALOGO_SNAPSHOT', True):
+        return
+    caminho = _caminho()
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        _tocar(caminho + '.desatualizado')
+    except OSError as e:
+        current_app.logger.warning(f'Falha ao marcar o snapshot do catálogo: {str(e)}')
+
+
+def _gerado_em(caminho):
+    """Momento da leitura do banco que gerou o snapshot (cabeçalho do arquivo)"""
+    with open(caminho, 'rb') as arquivo:
+        return _data(CABECALHO.unpack(arquivo.read(CABECALHO.size))[1])
+
+
+def renovar_catalogo():
+    """
+    Reconstrói o snapshot, sem esperar a trava (outro processo do host já
+    pode estar reconstruindo):
+    - do zero, se ele não existe ou a última reconstrução do zero passou
+      de CATALOGO_MAX_IDADE_SEGUNDOS (as incrementais não contam: são elas
+      que podem perder linhas);
+    - só com as mudanças, se foi marcado como desatualizado depois de
+      gerado (marcar_catalogo_desatualizado).
+    Retorna True se reconstruiu.
+    """
+    caminho = _caminho()
+    try:
+        gerado_em = _gerado_em(caminho)
+        idade = time.time() - os.stat(caminho + '.completo').st_mtime
+    except (OSError, struct.error):
+        return atualizar_catalogo(completo=True, esperar=False)
+    if idade >= current_app.config.get('CATALOGO_MAX_IDADE_SEGUNDOS', 60):
+        return atualizar_catalogo(completo=True, esperar=False)
+
+    try:
+        marcado_em = datetime.fromtimestamp(os.stat(caminho + '.desatualizado').st_mtime, timezone.utc).replace(tzinfo=None)
+    except FileNotFoundError:
+        return False
+    # A marca vem depois do commit: se é posterior à leitura do snapshot, falta a mudança
+    if marcado_em >= gerado_em:
+        return atualizar_catalogo(esperar=False)
+    return False
+
+
+def _manter_catalogo(app):
+    """Thread do processo que chama renovar_catalogo() a cada segundo (só lê o cabeçalho e as datas)"""
+    while True:
+        with app.app_context():
+            try:
+                renovar_catalogo()
+            except Exception as e:
+                app.logger.warning(f'Falha ao renovar o snapshot do catálogo: {str(e)}')
+            finally:
+                db.session.remove()
+        time.sleep(1)
+
+
+def _garantir_renovacao():
+    # Uma thread por app e processo (após o fork do gunicorn a do pai não existe no filho)
+    app = current_app._get_current_object()
+    with _estado_lock:
+        thread = app.extensions.get('catalogo_renovacao')
+        if thread and thread.is_alive() and thread.pid == os.getpid():
+            return
+        thread = threading.Thread(target=_manter_catalogo, args=(app,), name='catalogo', daemon=True)
+        thread.pid = os.getpid()
+        app.extensions['catalogo_renovacao'] = thread
+        thread.start()
+
+
+def obter_catalogo():
+    """
+    Snapshot atual deste processo, remapeado se o arquivo foi trocado,
+    ou None se o snapshot estiver desligado ou indisponível. Não
+    reconstrói: isso fica com a thread de renovação (_manter_catalogo).
+    """
+    config = current_app.config
+    if not config.get('CATALOGO_SNAPSHOT', True):
+        return None
+    _garantir_renovacao()
+
+    caminho = _caminho()
+    catalogo = _estado['catalogo']
+    try:
+        stat = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+
+    if catalogo is None or catalogo.assinatura != _assinatura(stat):
+        with _estado_lock:
+            catalogo = _estado['catalogo']
+            if catalogo is None or catalogo.assinatura != _assinatura(stat):
+                try:
+                    catalogo = _estado['catalogo'] = Catalogo(caminho)
+                except (OSError, ValueError) as e:
+                    # Arquivo de outra versão do layout: a renovação o refaz do zero
+                    current_app.logger.warning(f'Snapshot do catálogo ilegível: {str(e)}')
+                    return None
+    return catalogo
+
+
+def unidades_disponiveis(produto_id):
+    """Estoque menos reservas lido agora do banco (o snapshot pode estar atrasado)"""
+    linha = db.session.execute(
+        db.select(Produto.estoque, Produto.estoque_reservado).where(Produto.id == produto_id)
+    ).first()
+    return max((linha.estoque or 0) - (linha.estoque_reservado or 0), 0) if linha else 0
+
+
+# ==================== CONSULTAS DA VITRINE ====================
+# Leem do snapshot; sem ele, fazem as consultas de antes no banco.
+
+def listar_categorias():
+    """
+    Registro de categorias (ordem de cadastro) com o total de produtos
+    ativos de cada uma. Vem pronto do snapshot; sem ele, é montado com uma
+    consulta e guardado por processo até a próxima atualização do catálogo
+    (ou CATALOGO_MAX_IDADE_SEGUNDOS, para mudanças feitas em outro processo).
+    """
+    catalogo = obter_catalogo()
+    if catalogo:
+        return catalogo.categorias()
+
+    registro = _registro_banco.get('categorias')
+    validade = current_app.config.get('CATALOGO_MAX_IDADE_SEGUNDOS', 60)
+    if registro is None or (datetime.utcnow() - registro[0]).total_seconds() > validade:
+        ativos = db.func.count(Produto.id)
+        linhas = db.session.execute(
+            db.select(Categoria.id, Categoria.nome, Categoria.slug, Categoria.descricao, ativos)
+            .outerjoin(Produto, db.and_(Produto.categoria_id == Categoria.id, Produto.ativo == True))
+            .group_by(Categoria.id)
+            .order_by(Categoria.id)
+        ).all()
+        registro = _registro_banco['categorias'] = (datetime.utcnow(), [CategoriaCatalogo(*linha) for linha in linhas])
+    return list(registro[1])
+
+
+def buscar_categoria(slug):
+    return next((c for c in listar_categorias() if c.slug == slug), None)
+
+
+def buscar_produto(slug):
+    """Produto ativo pelo slug ou None"""
+    catalogo = obter_catalogo()
+    if catalogo:
+        linha = catalogo.linha_por_slug(slug)
+        produto = catalogo.produto(linha) if linha is not None else None
+        return produto if produto and produto.ativo else None
+    return Produto.query.filter_by(slug=slug, ativo=True).first()
+
+
+def produtos_relacionados(produto, limite=4):
+    """
+    Produtos comprados junto com este (app/services/relacionados.py),
+    completados com outros produtos ativos da mesma categoria
+    """
+    # Alguns vizinhos a mais, para compensar os inativos
+    ids = ids_relacionados(produto.id, limite * 2)
+    vizinhos = produtos_por_id(ids)
+    relacionados = [vizinhos[i] for i in ids if i in vizinhos and vizinhos[i].ativo][:limite]
+    if len(relacionados) >= limite or not produto.categoria_id:
+        return relacionados
+
+    excluidos = {produto.id, *(p.id for p in relacionados)}
+    catalogo = obter_catalogo()
+    if catalogo:
+        _, linhas = catalogo.ordem((('criado_em', 'desc'), ('id', 'desc')), produto.categoria_id)
+        mesma_categoria = (catalogo.produto(i) for i in linhas)
+        return relacionados + [p for p in mesma_categoria if p.id not in excluidos][:limite - len(relacionados)]
+    return relacionados + Produto.query.filter(
+        Produto.categoria_id == produto.categoria_id,
+        Produto.id.notin_(excluidos),
+        Produto.ativo == True
+    ).limit(limite - len(relacionados)).all()
+
+
+def produtos_por_id(ids):
+    """{id: produto} dos ids dados (inclusive inativos), para o carrinho"""
+    catalogo = obter_catalogo()
+    if catalogo:
+        linhas = ((produto_id, catalogo.linha_por_id(produto_id)) for produto_id in ids)
+        return {produto_id: catalogo.produto(i) for produto_id, i in linhas if i is not None}
+    return {p.id: p for p in Produto.query.filter(Produto.id.in_(ids)).all()} if ids else {}
+
+
+def paginar_produtos(ordenacao, filtros=None, cursor=None, per_page=12):
+    """
+    Produtos ativos que passam nos filtros (FiltrosProdutos) paginados por cursor.
+    ordenacao: [(coluna de Produto, 'asc'|'desc')], como em paginar_por_cursor.
+    """
+    catalogo = obter_catalogo()
+    if catalogo:
+        atributos = [(coluna.key, direcao) for coluna, direcao in ordenacao]
+        categoria_id = filtros.categoria_id if filtros else None
+        filtro = None
+        if filtros and (filtros.faixa or filtros.em_estoque or filtros.promocao):
+            filtro = indice_facetas(catalogo).filtrar(filtros)
+        return catalogo.paginar(atributos, categoria_id, cursor, per_page, filtro)
+
+    query = Produto.query.filter_by(ativo=True)
+    if filtros:
+        query = filtros.aplicar(query)
+    return paginar_por_cursor(query, ordenacao, cursor, per_page=per_page)
+
+
+def contar_facetas(filtros):
+    """Contagens das facetas para os filtros, ou None sem snapshot"""
+    catalogo = obter_catalogo()
+    return indice_facetas(catalogo).contagens(filtros) if catalogo else None
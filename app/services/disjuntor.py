@@ -0,0 +1,183 @@
+"""
+Disjuntor (circuit breaker) e limite de chamadas simultâneas dos gateways
+- Disjuntor por gateway e endpoint, com estado na tabela disjuntores (o
+  web e o worker enxergam o mesmo estado). Depois de N falhas seguidas
+  ele abre e as chamadas falham na hora, sem esperar o timeout; passado
+  o tempo de espera, uma única chamada de teste (semiaberto) decide se
+  volta a fechar.
+- Bulkhead: no máximo GATEWAY_MAX_SIMULTANEAS chamadas ao mesmo gateway
+  por processo; as demais desistem em vez de prender mais threads.
+O estado é gravado em transações próprias (db.engine), para que um
+rollback de quem chamou não apague as falhas registradas.
+"""
+import threading
+from datetime import datetime, timedelta
+import requests
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Disjuntor
+
+FECHADO, ABERTO, SEMIABERTO = 'fechado', 'aberto', 'semiaberto'
+
+
+class GatewayIndisponivel(Exception):
+    """Chamada recusada sem chegar ao gateway"""
+
+
+class CircuitoAberto(GatewayIndisponivel):
+    pass
+
+
+class GatewayOcupado(GatewayIndisponivel):
+    pass
+
+
+_vagas = {}
+_vagas_lock = threading.Lock()
+
+
+def _semaforo(gateway):
+    with _vagas_lock:
+        semaforo = _vagas.get(gateway)
+        if semaforo is None:
+            semaforo = _vagas[gateway] = threading.BoundedSemaphore(
+                current_app.config.get('GATEWAY_MAX_SIMULTANEAS', 4)
+            )
+    return semaforo
+
+
+def _tabela():
+    return Disjuntor.__table__
+
+
+def _permitir(nome):
+    """
+    Retorna (estado, falhas) se a chamada pode seguir ou levanta CircuitoAberto.
+    Com o tempo de espera esgotado, só o processo que conseguir passar o
+    disjuntor para semiaberto faz a chamada de teste.
+    """
+    t = _tabela()
+    agora = datetime.utcnow()
+    with db.engine.begin() as conn:
+        linha = conn.execute(
+            db.select(t.c.estado, t.c.falhas, t.c.aberto_ate).where(t.c.nome == nome)
+        ).first()
+        if linha is None or linha.estado == FECHADO:
+            return (FECHADO, linha.falhas if linha else 0)
+
+        if linha.aberto_ate is None or linha.aberto_ate <= agora:
+            # O prazo da chamada de teste evita que um teste travado segure o disjuntor
+            prazo = agora + timedelta(seconds=current_app.config.get('DISJUNTOR_ABERTO_SEGUNDOS', 30))
+            mesmo_prazo = (t.c.aberto_ate.is_(None) if linha.aberto_ate is None
+                           else t.c.aberto_ate == linha.aberto_ate)
+            testando = conn.execute(
+                t.update()
+                .where(t.c.nome == nome, t.c.estado == linha.estado, mesmo_prazo)
+                .values(estado=SEMIABERTO, aberto_ate=prazo, atualizado_em=agora)
+            ).rowcount
+            if testando:
+                return (SEMIABERTO, linha.falhas)
+
+    raise CircuitoAberto(f'Gateway indisponível ({nome}), tente novamente em instantes')
+
+
+def _registrar_sucesso(nome):
+    t = _tabela()
+    with db.engine.begin() as conn:
+        conn.execute(
+            t.update().where(t.c.nome == nome)
+            .values(estado=FECHADO, falhas=0, aberto_ate=None, atualizado_em=datetime.utcnow())
+        )
+
+
+def _registrar_falha(nome, erro):
+    """Conta a falha; abre o disjuntor no limite de falhas ou se a chamada de teste falhou"""
+    t = _tabela()
+    config = current_app.config
+    limite = config.get('DISJUNTOR_LIMITE_FALHAS', 5)
+    agora = datetime.utcnow()
+    reabrir_em = agora + timedelta(seconds=config.get('DISJUNTOR_ABERTO_SEGUNDOS', 30))
+    erro = str(erro)[:500]
+
+    abrir = db.or_(t.c.estado == SEMIABERTO, t.c.falhas + 1 >= limite)
+    atualizar = (
+        t.update().where(t.c.nome == nome)
+        .values(
+            falhas=t.c.falhas + 1,
+            estado=db.case((abrir, ABERTO), else_=t.c.estado),
+            aberto_ate=db.case((abrir, reabrir_em), else_=t.c.aberto_ate),
+            ultimo_erro=erro,
+            atualizado_em=agora,
+        )
+    )
+
+    with db.engine.begin() as conn:
+        if conn.execute(atualizar).rowcount:
+            return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(t.insert().values(
+                nome=nome, falhas=1, ultimo_erro=erro, atualizado_em=agora,
+                estado=ABERTO if limite <= 1 else FECHADO,
+                aberto_ate=reabrir_em if limite <= 1 else None,
+            ))
+    except IntegrityError:
+        # Outro processo criou a linha ao mesmo tempo
+        with db.engine.begin() as conn:
+            conn.execute(atualizar)
+
+
+def chamar(gateway, endpoint, chamada):
+    """
+    Executa chamada() (que faz a requisição e devolve a resposta) protegida
+    pelo disjuntor gateway:endpoint e pelo limite de chamadas simultâneas.
+    Erros de conexão, timeouts, 5xx e 429 contam como falha; os demais
+    status são respostas válidas do gateway.
+    """
+    nome = f'{gateway}:{endpoint}'
+    semaforo = _semaforo(gateway)
+    if not semaforo.acquire(timeout=current_app.config.get('GATEWAY_ESPERA_VAGA_SEGUNDOS', 1)):
+        raise GatewayOcupado(f'Muitas chamadas simultâneas ao gateway {gateway}')
+
+    try:
+        estado, falhas = _permitir(nome)
+        try:
+            resposta = chamada()
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _registrar_falha(nome, e)
+            raise
+    finally:
+        semaforo.release()
+
+    if resposta.status_code >= 500 or resposta.status_code == 429:
+        _registrar_falha(nome, f'HTTP {resposta.status_code}')
+    elif estado != FECHADO or falhas:
+        _registrar_sucesso(nome)
+    return resposta
+
+
+def gateway_disponivel(gateway, endpoint):
+    """False enquanto o disjuntor estiver aberto ou fazendo a chamada de teste"""
+    t = _tabela()
+    linha = db.session.execute(
+        db.select(t.c.estado, t.c.aberto_ate).where(t.c.nome == f'{gateway}:{endpoint}')
+    ).first()
+    if linha is None or linha.estado == FECHADO:
+        return True
+    return linha.estado == ABERTO and linha.aberto_ate is not None and linha.aberto_ate <= datetime.utcnow()
+
+
+def listar_disjuntores():
+    """Estado de todos os disjuntores (painel admin)"""
+    return Disjuntor.query.order_by(Disjuntor.nome).all()
+
+
+def fechar_disjuntor(nome):
+    """Fecha o disjuntor manualmente (o commit fica com quem chamou)"""
+    disjuntor = db.session.get(Disjuntor, nome)
+    if disjuntor:
+        disjuntor.estado = FECHADO
+        disjuntor.falhas = 0
+        disjuntor.aberto_ate = None
+        disjuntor.atualizado_em = datetime.utcnow()
+    return disjuntor
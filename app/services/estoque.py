@@ -0,0 +1,294 @@
+"""
+Controle de estoque
+A baixa é feita com UPDATEs condicionais (estoque = estoque - q WHERE
+estoque >= q), sem ler o estoque em Python nem travar linhas com
+SELECT ... FOR UPDATE. Duas compras simultâneas não conseguem vender
+a mesma unidade: a segunda simplesmente não encontra a linha.
+
+Reservas: itens no carrinho seguram estoque por um tempo limitado.
+A soma das reservas ativas fica em produtos.estoque_reservado, então
+a disponibilidade (estoque - estoque_reservado) sai da própria linha
+do produto, sem agregação por request.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Produto, ReservaEstoque, Pedido, ItemPedido
+
+
+@dataclass
+class FalhaEstoque:
+    """Linha que não pôde ser baixada"""
+    produto_id: int
+    quantidade: int
+
+
+@dataclass
+class ResultadoBaixa:
+    """Resultado da baixa de estoque de um conjunto de linhas"""
+    falhas: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.falhas
+
+    @property
+    def produtos_com_falha(self):
+        return {f.produto_id for f in self.falhas}
+
+
+def _agrupar(linhas):
+    """Soma quantidades por produto e ordena por id (ordem fixa de travas evita deadlock)"""
+    quantidades = defaultdict(int)
+    for produto_id, quantidade in linhas:
+        quantidades[int(produto_id)] += int(quantidade)
+    return sorted(quantidades.items())
+
+
+def baixar_estoque(linhas):
+    """
+    Baixa o estoque de todas as linhas [(produto_id, quantidade), ...]
+    na transação corrente (o commit fica com quem chamou).
+    Só vende unidades livres de reservas: libere antes as reservas do
+    próprio comprador (liberar_reservas_carrinho).
+    É tudo ou nada: se alguma linha não tiver estoque, as baixas já feitas
+    são desfeitas e o resultado lista exatamente as linhas que falharam.
+    Linhas com quantidade menor que 1 falham sem tocar no banco.
+    """
+    linhas = [(int(produto_id), int(quantidade)) for produto_id, quantidade in linhas]
+    invalidas = [FalhaEstoque(produto_id, quantidade) for produto_id, quantidade in linhas if quantidade < 1]
+    if invalidas:
+        return ResultadoBaixa(invalidas)
+
+    resultado = ResultadoBaixa()
+    savepoint = db.session.begin_nested()
+
+    for produto_id, quantidade in _agrupar(linhas):
+        atualizadas = db.session.execute(
+            db.update(Produto)
+            .where(Produto.id == produto_id, Produto.estoque - Produto.estoque_reservado >= quantidade)
+            .values(estoque=Produto.estoque - quantidade)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not atualizadas:
+            resultado.falhas.append(FalhaEstoque(produto_id, quantidade))
+
+    if resultado.ok:
+        savepoint.commit()
+    else:
+        savepoint.rollback()
+
+    return resultado
+
+
+# ==================== RESERVAS ====================
+
+def _validade_reserva():
+    return datetime.utcnow() + timedelta(minutes=current_app.config.get('RESERVA_CARRINHO_MINUTOS', 30))
+
+
+def _devolver_reservado(liberadas):
+    """Desconta do contador estoque_reservado as linhas (produto_id, quantidade) liberadas"""
+    linhas = _agrupar(liberadas)
+    if linhas:
+        produtos = Produto.__table__
+        db.session.execute(
+            produtos.update()
+            .where(produtos.c.id == db.bindparam('pid'))
+            .values(estoque_reservado=produtos.c.estoque_reservado - db.bindparam('qtd')),
+            [{'pid': produto_id, 'qtd': quantidade} for produto_id, quantidade in linhas]
+        )
+
+
+def _apagar_reservas(*criterios):
+    """Apaga reservas e devolve as quantidades ao contador (só as que este processo apagou)"""
+    apagadas = db.session.execute(
+        db.delete(ReservaEstoque).where(*criterios)
+        .returning(ReservaEstoque.produto_id, ReservaEstoque.quantidade)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _devolver_reservado(apagadas)
+    return len(apagadas)
+
+
+def reservar(carrinho_id, produto_id, quantidade):
+    """
+    Reserva quantidade de um produto para o carrinho, se houver unidades
+    livres. Renova a validade das demais reservas do carrinho.
+    Retorna False se não houver estoque disponível ou se a quantidade for
+    menor que 1. Não faz commit.
+    """
+    if quantidade < 1:
+        return False
+
+    reservado = db.session.execute(
+        db.update(Produto)
+        .where(Produto.id == produto_id, Produto.estoque - Produto.estoque_reservado >= quantidade)
+        .values(estoque_reservado=Produto.estoque_reservado + quantidade)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not reservado:
+        return False
+
+    validade = _validade_reserva()
+    db.session.add(ReservaEstoque(
+        produto_id=produto_id, carrinho_id=carrinho_id, quantidade=quantidade, expira_em=validade
+    ))
+    db.session.execute(
+        db.update(ReservaEstoque)
+        .where(ReservaEstoque.carrinho_id == carrinho_id)
+        .values(expira_em=validade)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def reajustar_reserva(carrinho_id, produto_id, quantidade):
+    """Troca a reserva de um produto do carrinho pela nova quantidade (>= 1). Não faz commit."""
+    if quantidade < 1:
+        return False
+    liberar_reservas_carrinho(carrinho_id, produto_id)
+    return reservar(carrinho_id, produto_id, quantidade)
+
+
+def liberar_reservas_carrinho(carrinho_id, produto_id=None):
+    """Libera as reservas do carrinho (ou só as de um produto). Não faz commit."""
+    criterios = [ReservaEstoque.carrinho_id == carrinho_id]
+    if produto_id is not None:
+        criterios.append(ReservaEstoque.produto_id == produto_id)
+    return _apagar_reservas(*criterios)
+
+
+def transferir_reservas(origem, destino):
+    """Passa as reservas de um carrinho para outro (mescla no login). Não faz commit."""
+    db.session.execute(
+        db.update(ReservaEstoque)
+        .where(ReservaEstoque.carrinho_id == origem)
+        .values(carrinho_id=destino)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def liberar_reservas_expiradas(lote=1000):
+    """
+    Varre as reservas vencidas em lotes (índice em expira_em) e devolve
+    as quantidades ao estoque disponível. Retorna o total liberado.
+    """
+    total = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(ReservaEstoque.id)
+            .where(ReservaEstoque.expira_em <= datetime.utcnow())
+            .order_by(ReservaEstoque.expira_em)
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        total += _apagar_reservas(ReservaEstoque.id.in_(ids))
+        db.session.commit()
+
+        if len(ids) < lote:
+            break
+    return total
+
+
+# ==================== PEDIDOS PENDENTES ====================
+
+def prazo_pagamento():
+    """Data limite de pagamento de um pedido criado agora"""
+    return datetime.utcnow() + timedelta(hours=current_app.config.get('PAGAMENTO_EXPIRACAO_HORAS', 2))
+
+
+def expirar_pedidos_pendentes(lote=None):
+    """
+    Cancela pedidos pendentes cujo prazo de pagamento (com margem para
+    webhooks atrasados) já passou e devolve o estoque, em lotes com um
+    commit cada (índice em status, expira_em). Retorna o total de pedidos
+    cancelados.
+    """
+    lote = lote or current_app.config.get('EXPIRACAO_LOTE', 500)
+    margem = timedelta(minutes=current_app.config.get('PAGAMENTO_EXPIRACAO_MARGEM_MINUTOS', 15))
+    total = 0
+
+    while True:
+        ids = db.session.scalars(
+            db.select(Pedido.id)
+            .where(Pedido.status == 'pendente', Pedido.expira_em < datetime.utcnow() - margem)
+            .order_by(Pedido.expira_em)
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        cancelados = cancelar_pedidos_pendentes(ids)
+        db.session.commit()
+        total += len(cancelados)
+
+        if len(ids) < lote:
+            break
+    return total
+
+
+def cancelar_pedidos(ids, status_permitidos, criterios=(), **valores):
+    """
+    Cancela os pedidos da lista que estão em um dos status permitidos e
+    devolve o estoque só dos que esta chamada de fato cancelou (um webhook
+    pode ter mudado o pedido no meio tempo, e um pedido já cancelado não
+    devolve estoque duas vezes). `criterios` são condições extras do UPDATE.
+    Retorna os ids cancelados. Não faz commit.
+    """
+    cancelados = db.session.scalars(
+        db.update(Pedido)
+        .where(Pedido.id.in_(ids), Pedido.status.in_(status_permitidos), *criterios)
+        .values(status='cancelado', atualizado_em=datetime.utcnow(), **valores)
+        .returning(Pedido.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    if cancelados:
+        devolver_estoque_dos_pedidos(cancelados)
+    return cancelados
+
+
+def cancelar_pedidos_pendentes(ids, **valores):
+    """Cancela os pedidos da lista que ainda estão pendentes (ver cancelar_pedidos). Não faz commit."""
+    return cancelar_pedidos(ids, ('pendente',), **valores)
+
+
+def travar_produtos(produto_ids):
+    """
+    No Postgres, trava as linhas dos produtos (lista ou SELECT de ids) em
+    ordem de id, a mesma da baixa no checkout, antes de um UPDATE ... FROM
+    que as alteraria em ordem arbitrária: assim não há deadlock.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(
+            db.select(Produto.id)
+            .where(Produto.id.in_(produto_ids))
+            .order_by(Produto.id)
+            .with_for_update()
+        )
+
+
+def devolver_estoque_dos_pedidos(pedido_ids):
+    """
+    Devolve ao estoque os itens dos pedidos com um único
+    UPDATE produtos ... FROM (itens_pedido agregados por produto),
+    com as linhas travadas antes (travar_produtos). Não faz commit.
+    """
+    itens = (
+        db.select(ItemPedido.produto_id, db.func.sum(ItemPedido.quantidade).label('quantidade'))
+        .where(ItemPedido.pedido_id.in_(pedido_ids), ItemPedido.produto_id.isnot(None))
+        .group_by(ItemPedido.produto_id)
+        .subquery()
+    )
+
+    travar_produtos(db.select(itens.c.produto_id))
+    db.session.execute(
+        db.update(Produto)
+        .where(Produto.id == itens.c.produto_id)
+        .values(estoque=Produto.estoque + itens.c.quantidade)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,151 @@
+"""
+Status de pedidos em tempo real (server-sent events)
+- CentralPedidos: pub/sub em memória do processo; cada request esperando
+  um pedido é uma fila que recebe os novos status
+- Os status mudam em vários processos (webhooks e reconciliação no
+  worker, admin no web). Uma única thread por processo faz o papel de
+  broker: consulta os pedidos alterados desde a última leitura (índice em
+  pedidos.atualizado_em) e publica na central local. Sem ninguém
+  esperando, ela não consulta o banco.
+O broker custa uma consulta por segundo por processo e nenhum cliente
+segura conexão com o banco, mas cada stream ocupa uma thread do gunicorn
+(gthread) enquanto dura. Por isso cada processo aceita no máximo
+EVENTOS_MAX_CONEXOES streams; acima disso o navegador recebe 204 e passa
+a consultar /checkout/api/pedido/<id>/status de tempos em tempos, e as
+demais threads ficam livres para a loja.
+"""
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Pedido
+
+
+class Assinatura:
+    """Request esperando novos status de um pedido"""
+
+    def __init__(self, central, pedido_id):
+        self.central = central
+        self.pedido_id = pedido_id
+        self.fila = queue.SimpleQueue()
+
+    def aguardar(self, timeout):
+        """Próximo status publicado ou None se o tempo acabar"""
+        try:
+            return self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cancelar(self):
+        self.central._remover(self)
+
+
+class CentralPedidos:
+    """Pub/sub de status de pedidos dentro do processo"""
+
+    def __init__(self):
+        self._assinaturas = defaultdict(set)
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._pid = None
+
+    def assinar(self, pedido_id):
+        assinatura = Assinatura(self, pedido_id)
+        with self._lock:
+            self._assinaturas[pedido_id].add(assinatura)
+        self._garantir_monitor()
+        return assinatura
+
+    def _remover(self, assinatura):
+        with self._lock:
+            assinaturas = self._assinaturas.get(assinatura.pedido_id)
+            if assinaturas:
+                assinaturas.discard(assinatura)
+                if not assinaturas:
+                    del self._assinaturas[assinatura.pedido_id]
+
+    def pedidos_assinados(self):
+        with self._lock:
+            return set(self._assinaturas)
+
+    def publicar(self, pedido_id, status):
+        with self._lock:
+            assinaturas = list(self._assinaturas.get(pedido_id, ()))
+        for assinatura in assinaturas:
+            assinatura.fila.put(status)
+
+    def _garantir_monitor(self):
+        # Após o fork do gunicorn a thread do processo pai não existe no filho
+        with self._lock:
+            if self._monitor and self._monitor.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._monitor = threading.Thread(
+                target=_monitorar_pedidos,
+                args=(current_app._get_current_object(), self),
+                name='monitor-pedidos',
+                daemon=True
+            )
+            self._monitor.start()
+
+
+central = CentralPedidos()
+
+_conexoes = 0
+_conexoes_lock = threading.Lock()
+
+
+def reservar_conexao():
+    """Vaga para mais um stream neste processo (EVENTOS_MAX_CONEXOES). False se estiver lotado."""
+    global _conexoes
+    with _conexoes_lock:
+        if _conexoes >= current_app.config.get('EVENTOS_MAX_CONEXOES', 8):
+            return False
+        _conexoes += 1
+        return True
+
+
+def liberar_conexao():
+    global _conexoes
+    with _conexoes_lock:
+        _conexoes = max(_conexoes - 1, 0)
+
+
+def _monitorar_pedidos(app, central_):
+    """
+    Broker entre processos: publica os pedidos alterados no banco.
+    A janela volta alguns segundos para pegar transações que gravaram
+    atualizado_em antes do commit; status repetidos são descartados por
+    quem assina.
+    """
+    with app.app_context():
+        intervalo = app.config.get('EVENTOS_INTERVALO_SEGUNDOS', 1)
+        folga = timedelta(seconds=app.config.get('EVENTOS_FOLGA_SEGUNDOS', 5))
+        marca = datetime.utcnow()
+
+        while True:
+            time.sleep(intervalo)
+            assinados = central_.pedidos_assinados()
+            if not assinados:
+                marca = datetime.utcnow()
+                continue
+
+            try:
+                agora = datetime.utcnow()
+                alterados = db.session.execute(
+                    db.select(Pedido.id, Pedido.status)
+                    .where(Pedido.atualizado_em > marca - folga)
+                ).all()
+                db.session.rollback()
+                marca = agora
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f'Monitor de pedidos falhou: {str(e)}')
+                continue
+
+            for pedido_id, status in alterados:
+                if pedido_id in assinados:
+                    central_.publicar(pedido_id, status)
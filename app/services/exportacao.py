@@ -0,0 +1,88 @@
+"""
+Exportação de pedidos e itens (admin e flask exportar-pedidos)
+Uma linha por item de pedido, com os dados do pedido repetidos, em CSV
+ou JSON Lines. Para a memória não crescer com o tamanho da exportação:
+- a leitura usa cursor do lado do servidor (stream_results + yield_per),
+  em uma conexão própria, fora da sessão do request
+- a saída é um gerador de blocos de texto, enviado aos poucos na
+  resposta HTTP ou gravado no arquivo
+Pedidos sem itens saem numa linha com as colunas do item vazias.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from app.models import db, Pedido, ItemPedido
+
+FORMATOS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+LINHAS_POR_BLOCO = 1000
+
+COLUNAS = [
+    Pedido.id.label('pedido_id'),
+    Pedido.criado_em,
+    Pedido.status,
+    Pedido.forma_pagamento,
+    Pedido.total.label('total_pedido'),
+    Pedido.cliente_nome,
+    Pedido.cliente_email,
+    ItemPedido.id.label('item_id'),
+    ItemPedido.produto_id,
+    ItemPedido.nome_produto,
+    ItemPedido.quantidade,
+    ItemPedido.preco,
+]
+CABECALHO = [coluna.key for coluna in COLUNAS]
+
+
+def consulta_exportacao(de=None, ate=None, status=None):
+    """
+    SELECT de pedidos + itens em ordem de pedido. `de` e `ate` são datas
+    (ate inclusive, até o fim do dia); `status` é uma lista de status.
+    """
+    consulta = (
+        db.select(*COLUNAS)
+        .outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .order_by(Pedido.id, ItemPedido.id)
+    )
+    if de:
+        consulta = consulta.where(Pedido.criado_em >= datetime.combine(de, datetime.min.time()))
+    if ate:
+        consulta = consulta.where(Pedido.criado_em < datetime.combine(ate + timedelta(days=1), datetime.min.time()))
+    if status:
+        consulta = consulta.where(Pedido.status.in_(status))
+    return consulta
+
+
+def _linhas(engine, consulta):
+    """Linhas da consulta lidas em lotes por um cursor do servidor"""
+    with engine.connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=LINHAS_POR_BLOCO).execute(consulta)
+        for lote in resultado.partitions():
+            yield lote
+
+
+def _valor_json(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+
+def exportar_pedidos(engine, consulta, formato='csv'):
+    """Gerador de blocos de texto (um por lote de linhas) no formato pedido"""
+    if formato == 'csv':
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(CABECALHO)
+        for lote in _linhas(engine, consulta):
+            escritor.writerows(lote)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif formato == 'jsonl':
+        for lote in _linhas(engine, consulta):
+            yield ''.join(
+                json.dumps(dict(zip(CABECALHO, map(_valor_json, linha))), ensure_ascii=False) + '\n'
+                for linha in lote
+            )
+    else:
+        raise ValueError(f'Formato de exportação desconhecido: {formato}')
@@ -0,0 +1,135 @@
+"""
+Filtros facetados da listagem de produtos
+Sobre o snapshot do catálogo, cada valor de faceta (categoria, faixa de
+preço, em estoque, em promoção) vira um bitmap das linhas do snapshot,
+guardado num int do Python (bit i = linha i). Filtros combinados são um
+AND de bitmaps e cada contagem é um int.bit_count(): com dezenas de
+milhares de produtos, todas as contagens da página saem em microssegundos,
+sem GROUP BY. Os bitmaps são montados uma vez por processo e snapshot.
+
+As contagens são "disjuntivas": o total de cada valor considera os
+filtros das outras facetas, não o da própria (escolher uma faixa de preço
+não zera as demais faixas).
+"""
+import weakref
+from dataclasses import dataclass
+from app.models import Produto
+
+# (chave na URL, rótulo, mínimo inclusivo, máximo exclusivo)
+FAIXAS_PRECO = [
+    ('ate-50', 'Até R$ 50', None, 50),
+    ('50-100', 'R$ 50 a R$ 100', 50, 100),
+    ('100-200', 'R$ 100 a R$ 200', 100, 200),
+    ('acima-200', 'Acima de R$ 200', 200, None),
+]
+_FAIXAS = {chave: (minimo, maximo) for chave, _, minimo, maximo in FAIXAS_PRECO}
+
+
+@dataclass
+class FiltrosProdutos:
+    """Filtros escolhidos na listagem"""
+    categoria_id: int = None
+    faixa: str = None
+    em_estoque: bool = False
+    promocao: bool = False
+
+    @classmethod
+    def da_url(cls, args, categoria_id=None):
+        faixa = args.get('preco')
+        return cls(
+            categoria_id=categoria_id,
+            faixa=faixa if faixa in _FAIXAS else None,
+            em_estoque=args.get('estoque') == '1',
+            promocao=args.get('promocao') == '1',
+        )
+
+    def __bool__(self):
+        return bool(self.categoria_id or self.faixa or self.em_estoque or self.promocao)
+
+    def aplicar(self, query):
+        """Os mesmos filtros numa query de Produto (busca textual e fallback sem snapshot)"""
+        if self.categoria_id:
+            query = query.filter(Produto.categoria_id == self.categoria_id)
+        if self.faixa:
+            minimo, maximo = _FAIXAS[self.faixa]
+            if minimo is not None:
+                query = query.filter(Produto.preco >= minimo)
+            if maximo is not None:
+                query = query.filter(Produto.preco < maximo)
+        if self.em_estoque:
+            query = query.filter(Produto.estoque - Produto.estoque_reservado > 0)
+        if self.promocao:
+            query = query.filter(Produto.preco_antigo > Produto.preco)
+        return query
+
+
+def _bitmap(linhas, total):
+    """Int com os bits das linhas dadas ligados"""
+    bits = bytearray((total + 7) // 8)
+    for i in linhas:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class IndiceFacetas:
+    """Bitmaps por valor de faceta de um snapshot do catálogo"""
+
+    def __init__(self, catalogo):
+        n = catalogo.total
+        colunas = catalogo.colunas('ativo', 'preco', 'preco_antigo', 'estoque', 'estoque_reservado')
+        ativo, preco, preco_antigo, estoque, reservado = colunas
+        ativos = [i for i in range(n) if ativo[i]]
+
+        self.total = n
+        self.ativos = _bitmap(ativos, n)
+        self.categorias = {
+            c.id: _bitmap(catalogo.linhas_da_categoria(c.id), n) & self.ativos
+            for c in catalogo.categorias()
+        }
+        self.faixas = {
+            chave: _bitmap((i for i in ativos if (minimo is None or preco[i] >= minimo)
+                            and (maximo is None or preco[i] < maximo)), n)
+            for chave, (minimo, maximo) in _FAIXAS.items()
+        }
+        self.em_estoque = _bitmap((i for i in ativos if estoque[i] - reservado[i] > 0), n)
+        # NaN (sem preço antigo) nunca é maior que o preço
+        self.promocao = _bitmap((i for i in ativos if preco_antigo[i] > preco[i]), n)
+
+    def _bits(self, filtros, exceto=None):
+        bits = self.ativos
+        if filtros.categoria_id and exceto != 'categoria':
+            bits &= self.categorias.get(filtros.categoria_id, 0)
+        if filtros.faixa and exceto != 'faixa':
+            bits &= self.faixas[filtros.faixa]
+        if filtros.em_estoque and exceto != 'em_estoque':
+            bits &= self.em_estoque
+        if filtros.promocao and exceto != 'promocao':
+            bits &= self.promocao
+        return bits
+
+    def filtrar(self, filtros):
+        """Bitmap das linhas que passam em todos os filtros"""
+        return self._bits(filtros)
+
+    def contagens(self, filtros):
+        """Totais de cada valor de faceta, considerando os filtros das outras facetas"""
+        sem_categoria = self._bits(filtros, 'categoria')
+        sem_faixa = self._bits(filtros, 'faixa')
+        return {
+            'total': self._bits(filtros).bit_count(),
+            'categorias': {cid: (sem_categoria & bits).bit_count() for cid, bits in self.categorias.items()},
+            'faixas': {chave: (sem_faixa & bits).bit_count() for chave, bits in self.faixas.items()},
+            'em_estoque': (self._bits(filtros, 'em_estoque') & self.em_estoque).bit_count(),
+            'promocao': (self._bits(filtros, 'promocao') & self.promocao).bit_count(),
+        }
+
+
+_indices = weakref.WeakKeyDictionary()
+
+
+def indice_facetas(catalogo):
+    """Índice de facetas do snapshot (montado uma vez por processo e snapshot)"""
+    indice = _indices.get(catalogo)
+    if indice is None:
+        indice = _indices[catalogo] = IndiceFacetas(catalogo)
+    return indice
@@ -0,0 +1,313 @@
+"""
+Fila de tarefas assíncronas em tabela do banco
+As tarefas são gravadas na mesma transação de quem as cria e executadas
+pelo worker (flask worker), com novas tentativas e backoff exponencial.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Tarefa, RotinaPeriodica
+
+# Registro de tipos de tarefa -> função
+TAREFAS = {}
+
+# Chave da trava consultiva (Postgres) que serializa reivindicar entre os workers
+TRAVA_REIVINDICAR = 7_204_118
+
+# Rotinas que o worker executa de tempos em tempos: [(segundos, duração máxima, função)]
+PERIODICAS = []
+
+
+def tarefa(tipo):
+    """Decorator que registra uma função como executora de um tipo de tarefa"""
+    def registrar(f):
+        TAREFAS[tipo] = f
+        return f
+    return registrar
+
+
+def periodica(segundos, duracao_maxima=None):
+    """
+    Decorator que registra uma rotina para o worker executar a cada
+    `segundos`. duracao_maxima: segundos que uma execução pode levar antes
+    que outro processo a considere morta (padrão FILA_TIMEOUT_SEGUNDOS).
+    """
+    def registrar(f):
+        PERIODICAS.append((segundos, duracao_maxima, f))
+        return f
+    return registrar
+
+
+def enfileirar(tipo, payload, chave=None, max_tentativas=5):
+    """
+    Adiciona uma tarefa à fila (o commit fica com quem chamou).
+    Com chave, reaproveita a tarefa existente: se ainda está na fila nada
+    muda; se já terminou ou falhou, volta para a fila.
+    """
+    if chave:
+        existente = Tarefa.query.filter_by(chave=chave).first()
+        if existente:
+            if existente.status not in ('pendente', 'executando'):
+                existente.status = 'pendente'
+                existente.tentativas = 0
+                existente.erro = None
+                existente.payload = json.dumps(payload)
+                existente.executar_em = datetime.utcnow()
+            return existente
+
+    nova = Tarefa(tipo=tipo, chave=chave, payload=json.dumps(payload), max_tentativas=max_tentativas)
+    try:
+        with db.session.begin_nested():
+            db.session.add(nova)
+    except IntegrityError:
+        # Outro request criou a mesma chave ao mesmo tempo
+        return Tarefa.query.filter_by(chave=chave).first()
+    return nova
+
+
+def _backoff(tentativas):
+    """Espera antes da próxima tentativa: base * 2^n (máx. 1h) com jitter"""
+    base = current_app.config.get('FILA_BACKOFF_SEGUNDOS', 5)
+    espera = min(base * (2 ** (tentativas - 1)), 3600)
+    return timedelta(seconds=espera * random.uniform(0.8, 1.2))
+
+
+def recuperar_travadas():
+    """Devolve à fila tarefas 'executando' cujo worker morreu no meio"""
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config.get('FILA_TIMEOUT_SEGUNDOS', 300))
+    recuperadas = db.session.execute(
+        db.update(Tarefa)
+        .where(Tarefa.status == 'executando', Tarefa.iniciada_em < limite)
+        .values(status='pendente', executar_em=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return recuperadas
+
+
+def reivindicar(limite):
+    """
+    Marca até `limite` tarefas prontas como 'executando' e retorna seus ids.
+    Respeita FILA_MAX_EXECUTANDO (soma de todos os workers): a contagem
+    das que estão executando e a marcação são o mesmo UPDATE condicional,
+    que também garante que cada tarefa é pega por um único worker. No
+    SQLite há um escritor por vez; no Postgres, em READ COMMITTED, dois
+    UPDATEs simultâneos contariam as mesmas vagas, então a reivindicação
+    fica sob uma trava consultiva até o commit.
+    """
+    if limite <= 0:
+        return []
+    max_global = current_app.config.get('FILA_MAX_EXECUTANDO', 8)
+    postgres = db.session.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        db.session.execute(db.select(db.func.pg_advisory_xact_lock(TRAVA_REIVINDICAR)))
+
+    executando = (
+        db.select(db.func.count(Tarefa.id).label('total'))
+        .where(Tarefa.status == 'executando')
+        .subquery()
+    )
+    vagas = db.select(db.case(
+        (executando.c.total >= max_global, 0),
+        (executando.c.total > max_global - limite, max_global - executando.c.total),
+        else_=limite,
+    )).scalar_subquery()
+
+    agora = datetime.utcnow()
+    candidatas = (
+        db.select(Tarefa.id)
+        .where(Tarefa.status == 'pendente', Tarefa.executar_em <= agora)
+        .order_by(Tarefa.executar_em)
+        .limit(vagas)
+    )
+    if postgres:
+        candidatas = candidatas.with_for_update(skip_locked=True)
+
+    ids = db.session.scalars(
+        db.update(Tarefa)
+        .where(Tarefa.id.in_(candidatas), Tarefa.status == 'pendente')
+        .values(status='executando', iniciada_em=agora)
+        .returning(Tarefa.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return ids
+
+
+def executar(app, tarefa_id):
+    """Executa uma tarefa já reivindicada e registra sucesso ou nova tentativa"""
+    with app.app_context():
+        tarefa_ = db.session.get(Tarefa, tarefa_id)
+        payload = json.loads(tarefa_.payload or '{}')
+        executora = TAREFAS.get(tarefa_.tipo)
+
+        try:
+            if not executora:
+                raise Exception(f'Tipo de tarefa desconhecido: {tarefa_.tipo}')
+            # Tarefas criadas em um request guardam a URL base para montar links
+            with app.test_request_context(base_url=payload.get('base_url')):
+                executora(payload)
+            db.session.commit()
+            tarefa_ = db.session.get(Tarefa, tarefa_id)
+            tarefa_.status = 'concluida'
+            tarefa_.erro = None
+        except Exception as e:
+            db.session.rollback()
+            tarefa_ = db.session.get(Tarefa, tarefa_id)
+            tarefa_.tentativas += 1
+            tarefa_.erro = str(e)[:2000]
+            if tarefa_.tentativas < tarefa_.max_tentativas:
+                tarefa_.status = 'pendente'
+                tarefa_.executar_em = datetime.utcnow() + _backoff(tarefa_.tentativas)
+            else:
+                tarefa_.status = 'falhou'
+            current_app.logger.warning(f'Tarefa #{tarefa_id} ({tarefa_.tipo}) falhou: {tarefa_.erro}')
+        db.session.commit()
+
+
+def reivindicar_rotina(nome, segundos, duracao_maxima=None):
+    """
+    Elege o processo que roda a rotina agora, pela última execução gravada
+    no banco (hora do relógio, em UTC): um worker reiniciado não roda tudo
+    de novo, e entre vários processos (worker, agendador interno em cada
+    processo do gunicorn) o UPDATE só vale para quem leu a linha antes de
+    ela mudar. Enquanto uma execução não termina (executando_ate, com
+    prazo de duracao_maxima segundos, ou FILA_TIMEOUT_SEGUNDOS), ninguém
+    mais roda a mesma rotina.
+    Sem registro, a contagem começa agora. Transação própria (db.engine),
+    como no disjuntor. Retorna (rodar, próxima execução prevista).
+    """
+    t = RotinaPeriodica.__table__
+    agora = datetime.utcnow()
+    intervalo = timedelta(seconds=segundos)
+    with db.engine.begin() as conn:
+        linha = conn.execute(
+            db.select(t.c.ultima_execucao, t.c.executando_ate).where(t.c.nome == nome)
+        ).first()
+        if linha is not None:
+            if linha.ultima_execucao + intervalo > agora:
+                return False, linha.ultima_execucao + intervalo
+            if linha.executando_ate and linha.executando_ate > agora:
+                return False, agora + intervalo
+            duracao_maxima = duracao_maxima or current_app.config.get('FILA_TIMEOUT_SEGUNDOS', 300)
+            prazo = agora + timedelta(seconds=duracao_maxima)
+            rodar = conn.execute(
+                t.update()
+                .where(t.c.nome == nome, t.c.ultima_execucao == linha.ultima_execucao)
+                .values(ultima_execucao=agora, executando_ate=prazo)
+            ).rowcount > 0
+            return rodar, agora + intervalo
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(t.insert().values(nome=nome, ultima_execucao=agora))
+    except IntegrityError:
+        pass  # Outro processo registrou a rotina ao mesmo tempo
+    return False, agora + intervalo
+
+
+def liberar_rotina(nome):
+    """Marca o fim da execução da rotina (outro processo já pode rodá-la no próximo horário)"""
+    t = RotinaPeriodica.__table__
+    with db.engine.begin() as conn:
+        conn.execute(t.update().where(t.c.nome == nome).values(executando_ate=None))
+
+
+def executar_periodica(app, rotina):
+    """Executa uma rotina periódica já reivindicada no contexto da aplicação"""
+    with app.app_context():
+        try:
+            rotina()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Rotina {rotina.__name__} falhou: {str(e)}')
+        finally:
+            liberar_rotina(rotina.__name__)
+
+
+def executar_worker(concorrencia=None, intervalo=1.0, uma_vez=False):
+    """
+    Loop do worker: reivindica tarefas prontas e as executa em um pool de
+    threads com no máximo `concorrencia` tarefas simultâneas. As rotinas
+    periódicas ocupam uma vaga do pool enquanto rodam, uma de cada vez, e
+    o horário delas vem do banco (reivindicar_rotina).
+    """
+    # Importa as executoras para registrá-las
+    import app.services.tarefas  # noqa: F401
+
+    app = current_app._get_current_object()
+    concorrencia = concorrencia or app.config.get('FILA_CONCORRENCIA', 4)
+    em_execucao = set()
+    periodicas = {rotina: [segundos, duracao, None, None] for segundos, duracao, rotina in PERIODICAS}  # + próxima, future
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        ultima_recuperacao = 0
+        while True:
+            em_execucao = {f for f in em_execucao if not f.done()}
+
+            if time.monotonic() - ultima_recuperacao > 60:
+                recuperar_travadas()
+                ultima_recuperacao = time.monotonic()
+
+            agora = datetime.utcnow()
+            for rotina, estado in periodicas.items():
+                segundos, duracao, proxima, futuro = estado
+                livre = futuro is None or futuro.done()
+                if livre and (proxima is None or proxima <= agora) and len(em_execucao) < concorrencia:
+                    rodar, estado[2] = reivindicar_rotina(rotina.__name__, segundos, duracao)
+                    if rodar:
+                        estado[3] = pool.submit(executar_periodica, app, rotina)
+                        em_execucao.add(estado[3])
+
+            livres = concorrencia - len(em_execucao)
+            ids = reivindicar(livres) if livres > 0 else []
+            for tarefa_id in ids:
+                em_execucao.add(pool.submit(executar, app, tarefa_id))
+
+            if uma_vez and not ids and not em_execucao:
+                break
+            if not ids:
+                time.sleep(intervalo)
+
+
+_agendador_pid = None
+_agendador_lock = threading.Lock()
+
+
+def iniciar_agendador(app):
+    """
+    Agendador interno: roda as rotinas periódicas numa thread do próprio
+    processo web, para instalações sem worker (AGENDADOR_INTERNO=True).
+    Todo processo do gunicorn tem a sua thread, mas cada execução de uma
+    rotina fica com um só deles (reivindicar_rotina).
+    """
+    global _agendador_pid
+    with _agendador_lock:
+        if _agendador_pid == os.getpid():
+            return
+        _agendador_pid = os.getpid()
+
+    import app.services.tarefas  # noqa: F401
+
+    def loop():
+        proximas = {rotina: None for _, _, rotina in PERIODICAS}
+        while True:
+            for segundos, duracao, rotina in PERIODICAS:
+                if proximas[rotina] is not None and proximas[rotina] > datetime.utcnow():
+                    continue
+                try:
+                    with app.app_context():
+                        rodar, proximas[rotina] = reivindicar_rotina(rotina.__name__, segundos, duracao)
+                except Exception as e:
+                    app.logger.warning(f'Agendador: falha ao consultar a rotina {rotina.__name__}: {str(e)}')
+                    continue
+                if rodar:
+                    executar_periodica(app, rotina)
+            time.sleep(1)
+
+    threading.Thread(target=loop, name='agendador', daemon=True).start()
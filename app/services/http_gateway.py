@@ -0,0 +1,82 @@
+"""
+Cliente HTTP dos gateways de pagamento
+Uma requests.Session por gateway e por processo, com pool de conexões
+keep-alive (sem novo handshake TLS a cada chamada), timeouts separados
+de conexão e leitura e novas tentativas só onde é seguro repetir.
+Toda chamada passa pelo disjuntor do endpoint (app/services/disjuntor.py).
+"""
+import os
+import threading
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from app.services.disjuntor import chamar
+
+_sessoes = {}
+_pid = None
+_lock = threading.Lock()
+
+
+def _criar_sessao():
+    config = current_app.config
+    tentativas = config.get('HTTP_TENTATIVAS', 2)
+
+    # Erros de conexão acontecem antes do envio e são repetidos para qualquer
+    # método; erros de leitura e 502/503/504 só para métodos idempotentes
+    # (o padrão do urllib3 não inclui POST, que poderia criar pagamento em dobro)
+    retry = Retry(
+        total=tentativas,
+        connect=tentativas,
+        read=tentativas,
+        status=tentativas,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=config.get('HTTP_POOL_HOSTS', 4),
+        pool_maxsize=config.get('HTTP_POOL_MAXIMO', 10),
+        max_retries=retry,
+    )
+
+    sessao = requests.Session()
+    sessao.mount('https://', adapter)
+    sessao.mount('http://', adapter)
+    return sessao
+
+
+def get_sessao(gateway):
+    """
+    Retorna a sessão do gateway neste processo. Depois de um fork (workers
+    do gunicorn) as sessões herdadas são descartadas: os sockets do pool
+    não podem ser compartilhados entre processos.
+    """
+    global _pid
+    with _lock:
+        if _pid != os.getpid():
+            _sessoes.clear()
+            _pid = os.getpid()
+        sessao = _sessoes.get(gateway)
+        if sessao is None:
+            sessao = _sessoes[gateway] = _criar_sessao()
+    return sessao
+
+
+def timeout_padrao():
+    """(conexão, leitura) em segundos"""
+    return (
+        current_app.config.get('HTTP_TIMEOUT_CONEXAO', 3.05),
+        current_app.config.get('HTTP_TIMEOUT_LEITURA', 30),
+    )
+
+
+def requisitar(gateway, endpoint, metodo, url, **kwargs):
+    """
+    Faz a requisição pela sessão do gateway, com o timeout padrão se nenhum
+    for dado, protegida pelo disjuntor gateway:endpoint. Levanta
+    GatewayIndisponivel sem chamar o gateway se o disjuntor estiver aberto.
+    """
+    kwargs.setdefault('timeout', timeout_padrao())
+    sessao = get_sessao(gateway)
+    return chamar(gateway, endpoint, lambda: sessao.request(metodo, url, **kwargs))
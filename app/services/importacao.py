@@ -0,0 +1,246 @@
+"""
+Importação de produtos por CSV (admin e flask importar-produtos)
+Catálogos de fornecedor com dezenas de milhares de linhas: o arquivo é
+lido linha a linha (nunca inteiro na memória), cada linha é validada e
+as válidas são gravadas em lotes de IMPORTACAO_LOTE com upsert pelo slug
+(INSERT ... ON CONFLICT (slug) DO UPDATE, no Postgres e no SQLite).
+- Colunas: nome e preco obrigatórias; slug (gerado do nome se faltar),
+  descricao, preco_antigo, estoque, categoria (slug), imagem e ativo
+  opcionais. Separador ',' ou ';' e preços com vírgula ou ponto.
+- Coluna ausente no cabeçalho não é alterada nos produtos existentes
+  (novos recebem o padrão do modelo). Reservas, vendas e criado_em
+  nunca mudam na importação.
+- Linha inválida não para a importação: vai para o relatório com o
+  número da linha no arquivo. Arquivo ilegível no meio (codificação)
+  para a leitura, mas os lotes já gravados ficam.
+- Um commit por lote. O snapshot do catálogo, o cache de páginas e os
+  indicadores do painel são atualizados uma vez, no fim.
+O INSERT em massa não passa pelos eventos do ORM, então busca_texto,
+desconto_percentual e atualizado_em são calculados aqui.
+"""
+import csv
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from app.models import db, Produto, Categoria, calcular_desconto
+from app.services.cache_paginas import limpar_paginas
+from app.services.catalogo import atualizar_catalogo
+from app.services.metricas import invalidar_metricas
+from app.utils.texto import normalizar_texto
+
+COLUNAS = ('slug', 'nome', 'descricao', 'preco', 'preco_antigo', 'estoque', 'categoria', 'imagem', 'ativo')
+OBRIGATORIAS = ('nome', 'preco')
+TAMANHOS = {'nome': 100, 'slug': 120, 'imagem': 255}
+VERDADEIRO = {'1', 'sim', 's', 'true', 'verdadeiro', 'ativo', 'yes'}
+FALSO = {'0', 'nao', 'não', 'n', 'false', 'falso', 'inativo', 'no'}
+
+
+class ArquivoInvalido(ValueError):
+    """Cabeçalho ausente ou sem as colunas obrigatórias"""
+
+
+@dataclass
+class RelatorioImportacao:
+    """Resumo de uma importação"""
+    linhas: int = 0
+    novos: int = 0
+    atualizados: int = 0
+    com_erro: int = 0
+    colunas_ignoradas: list = field(default_factory=list)
+    erros: list = field(default_factory=list)  # (linha, mensagem), só os primeiros
+    interrompido: str = None  # Motivo, se a leitura parou antes do fim do arquivo
+    duracao_segundos: float = 0
+
+    def erro(self, linha, mensagem, maximo):
+        self.com_erro += 1
+        if len(self.erros) < maximo:
+            self.erros.append((linha, mensagem))
+
+
+def gerar_slug(nome):
+    """Mesmo slug do cadastro manual (admin_produtos.criar)"""
+    return nome.lower().replace(' ', '-').replace('/', '-')
+
+
+def _numero(valor):
+    """Aceita '1234.56', '1234,56' e '1.234,56'"""
+    valor = valor.strip()
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    return float(valor)
+
+
+def _validar(linha, colunas, categorias):
+    """Dicionário de colunas do produto a partir da linha do CSV (ValueError se inválida)"""
+    valores = {coluna: (linha.get(coluna) or '').strip() for coluna in colunas}
+    produto = {}
+
+    if not valores['nome']:
+        raise ValueError('nome vazio')
+    produto['nome'] = valores['nome']
+    produto['slug'] = valores.get('slug') or gerar_slug(valores['nome'])
+
+    try:
+        produto['preco'] = _numero(valores['preco'])
+    except ValueError:
+        raise ValueError(f"preço inválido: '{valores['preco']}'")
+    if produto['preco'] < 0:
+        raise ValueError('preço negativo')
+
+    if 'preco_antigo' in valores:
+        try:
+            produto['preco_antigo'] = _numero(valores['preco_antigo']) if valores['preco_antigo'] else None
+        except ValueError:
+            raise ValueError(f"preço antigo inválido: '{valores['preco_antigo']}'")
+
+    if 'estoque' in valores:
+        try:
+            produto['estoque'] = int(valores['estoque'] or 0)
+        except ValueError:
+            raise ValueError(f"estoque inválido: '{valores['estoque']}'")
+        if produto['estoque'] < 0:
+            raise ValueError('estoque negativo')
+
+    if 'categoria' in valores:
+        if valores['categoria'] and valores['categoria'] not in categorias:
+            raise ValueError(f"categoria inexistente: '{valores['categoria']}'")
+        produto['categoria_id'] = categorias.get(valores['categoria'])
+
+    if 'ativo' in valores:
+        ativo = valores['ativo'].lower()
+        if ativo and ativo not in VERDADEIRO | FALSO:
+            raise ValueError(f"ativo inválido: '{valores['ativo']}'")
+        produto['ativo'] = ativo not in FALSO
+
+    for coluna in ('descricao', 'imagem'):
+        if coluna in valores:
+            produto[coluna] = valores[coluna] or None
+
+    for coluna, tamanho in TAMANHOS.items():
+        if produto.get(coluna) and len(produto[coluna]) > tamanho:
+            raise ValueError(f'{coluna} com mais de {tamanho} caracteres')
+    return produto
+
+
+def _comando_upsert(colunas):
+    """INSERT ... ON CONFLICT (slug) DO UPDATE das colunas presentes no arquivo"""
+    dialeto = db.session.get_bind().dialect.name
+    insert = postgresql.insert if dialeto == 'postgresql' else sqlite.insert
+    comando = insert(Produto.__table__)
+    atualizar = [c for c in colunas if c != 'slug'] + ['busca_texto', 'desconto_percentual', 'atualizado_em']
+    return comando.on_conflict_do_update(
+        index_elements=['slug'],
+        set_={coluna: comando.excluded[coluna] for coluna in atualizar},
+    )
+
+
+def _gravar_lote(lote, comando, relatorio):
+    """Calcula as colunas derivadas e grava o lote [(numero_linha, produto)]"""
+    slugs = [produto['slug'] for _, produto in lote]
+    existentes = {
+        linha.slug: linha for linha in db.session.execute(
+            db.select(Produto.slug, Produto.descricao, Produto.preco_antigo).where(Produto.slug.in_(slugs))
+        )
+    }
+
+    agora = datetime.utcnow()
+    valores = []
+    for _, produto in lote:
+        # Coluna fora do arquivo: o texto de busca e o desconto usam o valor atual
+        atual = existentes.get(produto['slug'])
+        descricao = produto['descricao'] if 'descricao' in produto else (atual.descricao if atual else None)
+        preco_antigo = produto['preco_antigo'] if 'preco_antigo' in produto else (atual.preco_antigo if atual else None)
+        valores.append({
+            **produto,
+            'busca_texto': normalizar_texto(produto['nome'], descricao),
+            'desconto_percentual': calcular_desconto(produto['preco'], preco_antigo),
+            'criado_em': agora,
+            'atualizado_em': agora,
+        })
+
+    db.session.execute(comando, valores)
+    db.session.commit()
+    relatorio.atualizados += len(existentes)
+    relatorio.novos += len(valores) - len(existentes)
+
+
+def importar_produtos(arquivo, lote=None, max_erros=None):
+    """
+    Importa o CSV de um arquivo texto aberto (ou qualquer iterável de
+    linhas) e devolve o RelatorioImportacao. ArquivoInvalido se o
+    cabeçalho não tiver as colunas obrigatórias.
+    """
+    config = current_app.config
+    lote = lote or config.get('IMPORTACAO_LOTE', 1000)
+    max_erros = max_erros or config.get('IMPORTACAO_MAX_ERROS', 100)
+    inicio = time.monotonic()
+    relatorio = RelatorioImportacao()
+
+    linhas = iter(arquivo)
+    try:
+        cabecalho = next(linhas, '')
+    except UnicodeDecodeError:
+        raise ArquivoInvalido('O arquivo precisa estar em UTF-8')
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    nomes = [nome.strip().lower() for nome in next(csv.reader([cabecalho], delimiter=delimitador), [])]
+    faltando = [coluna for coluna in OBRIGATORIAS if coluna not in nomes]
+    if faltando:
+        raise ArquivoInvalido(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+    colunas = [coluna for coluna in COLUNAS if coluna in nomes]
+    relatorio.colunas_ignoradas = [nome for nome in nomes if nome not in COLUNAS]
+
+    categorias = dict(db.session.execute(db.select(Categoria.slug, Categoria.id)).all())
+    colunas_produto = [c for c in colunas if c != 'categoria'] + (['categoria_id'] if 'categoria' in colunas else [])
+    comando = _comando_upsert(colunas_produto)
+
+    slugs_vistos = {}
+    pendentes = []
+
+    def gravar():
+        try:
+            _gravar_lote(pendentes, comando, relatorio)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for numero, _ in pendentes:
+                relatorio.erro(numero, f'lote não gravado: {e.__class__.__name__}', max_erros)
+            current_app.logger.error(f'Importação: lote da linha {pendentes[0][0]} falhou: {str(e)}')
+        pendentes.clear()
+
+    leitor = csv.DictReader(linhas, fieldnames=nomes, delimiter=delimitador)
+    try:
+        for linha in leitor:
+            numero = leitor.line_num + 1  # +1 do cabeçalho, lido à parte
+            if not any((valor or '').strip() for valor in linha.values() if isinstance(valor, str)):
+                continue
+            relatorio.linhas += 1
+            try:
+                produto = _validar(linha, colunas, categorias)
+            except ValueError as e:
+                relatorio.erro(numero, str(e), max_erros)
+                continue
+
+            # Slug repetido no arquivo: vale a primeira linha (no mesmo lote quebraria o ON CONFLICT)
+            if produto['slug'] in slugs_vistos:
+                relatorio.erro(numero, f"slug '{produto['slug']}' repetido (linha {slugs_vistos[produto['slug']]})", max_erros)
+                continue
+            slugs_vistos[produto['slug']] = numero
+
+            pendentes.append((numero, produto))
+            if len(pendentes) >= lote:
+                gravar()
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Os lotes já gravados ficam; o resto do arquivo não é lido
+        relatorio.interrompido = f'arquivo ilegível depois da linha {leitor.line_num + 1}: {e}'
+    if pendentes:
+        gravar()
+
+    if relatorio.novos or relatorio.atualizados:
+        atualizar_catalogo()
+        limpar_paginas()
+        invalidar_metricas()
+
+    relatorio.duracao_segundos = round(time.monotonic() - inicio, 2)
+    return relatorio
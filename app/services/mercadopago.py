@@ -1,14 +1,45 @@
 import os
 import mercadopago
 from flask import current_app, request
+from mercadopago.http import HttpClient
+from urllib.parse import urlparse
+from app.services.http_gateway import requisitar
+from app.services.disjuntor import GatewayIndisponivel
+
+
+class HttpClientPool(HttpClient):
+    """
+    Transporte do SDK sobre a sessão compartilhada do gateway.
+    O HttpClient original abre uma Session (e uma conexão TLS) por chamada.
+    """
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        # Novas tentativas e timeouts ficam com a sessão; o disjuntor é por recurso (ex.: v1/payments)
+        kwargs.pop('timeout', None)
+        endpoint = '/'.join([parte for parte in urlparse(url).path.split('/') if parte][:2])
+        api_result = requisitar('mercadopago', endpoint, method, url, **kwargs)
+        response = {"status": api_result.status_code, "response": None}
+
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError as e:
+                # Como o HttpClient do SDK (2.3.0): resposta sem corpo utilizável
+                current_app.logger.warning(f'Mercado Pago respondeu JSON inválido ({api_result.status_code}): {str(e)}')
+        return response
 
 
 def get_sdk():
-    """Retorna a instância do SDK do Mercado Pago"""
+    """Retorna a instância do SDK do Mercado Pago (uma por token, reaproveitada)"""
     access_token = current_app.config.get('MP_ACCESS_TOKEN')
     if not access_token:
         raise Exception('MP_ACCESS_TOKEN não configurado')
-    return mercadopago.SDK(access_token)
+
+    sdks = current_app.extensions.setdefault('mercadopago_sdk', {})
+    sdk = sdks.get(access_token)
+    if sdk is None:
+        sdk = sdks[access_token] = mercadopago.SDK(access_token, http_client=HttpClientPool())
+    return sdk
 
 
 def criar_pagamento_pix(pedido):
@@ -49,6 +80,8 @@ def criar_pagamento_pix(pedido):
             pedido.pix_copy_paste = transaction_data.get('qr_code_base64', '')
 
         return payment
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         raise Exception(f'Erro ao criar pagamento Pix: {str(e)}')
 
@@ -92,6 +125,8 @@ def criar_preferencia_checkout_pro(pedido, itens):
 
         # Retorna URL de iniciação do checkout
         return preference.get('init_point', preference.get('sandbox_init_point', ''))
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         raise Exception(f'Erro ao criar preferência Checkout Pro: {str(e)}')
 
@@ -104,51 +139,22 @@ def consultar_pagamento(payment_id):
         payment_response = sdk.payment().get(payment_id)
         payment = payment_response['response'] if 'response' in payment_response else payment_response
         return payment
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         raise Exception(f'Erro ao consultar pagamento: {str(e)}')
 
 
 def webhook():
-    """Webhook para receber notificações do Mercado Pago"""
-    from app import db
-    from app.models import Pedido
-
-    data = request.get_json() or {}
-
-    # Verifica se é uma notificação de pagamento
-    if data.get('type') == 'payment':
-        payment_id = data.get('data', {}).get('id')
+    """Webhook para receber notificações do Mercado Pago (gravadas na caixa de entrada)"""
+    from app.services.webhooks import receber_mercadopago, processar_webhooks
 
-        if payment_id:
-            try:
-                payment = consultar_pagamento(payment_id)
-                external_reference = payment.get('external_reference')
-
-                if external_reference:
-                    pedido = Pedido.query.get(int(external_reference))
-
-                    if pedido:
-                        # Atualiza status do pedido
-                        pedido.mp_payment_id = str(payment_id)
-                        pedido.mp_payment_status = payment.get('status', 'unknown')
-
-                        status_map = {
-                            'approved': 'pago',
-                            'pending': 'pendente',
-                            'authorized': 'pago',
-                            'in_process': 'pendente',
-                            'rejected': 'cancelado',
-                            'cancelled': 'cancelado',
-                            'refunded': 'cancelado'
-                        }
-
-                        new_status = status_map.get(payment.get('status'), pedido.status)
-                        pedido.status = new_status
-
-                        db.session.commit()
-
-            except Exception as e:
-                current_app.logger.error(f'Erro no webhook: {str(e)}')
-                return {'error': str(e)}, 500
+    try:
+        receber_mercadopago(request.get_data(as_text=True))
+        if not current_app.config.get('PAGAMENTO_ASSINCRONO', True):
+            processar_webhooks()
+    except Exception as e:
+        current_app.logger.error(f'Erro no webhook: {str(e)}')
+        return {'error': str(e)}, 500
 
     return {'status': 'ok'}, 200
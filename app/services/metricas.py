@@ -0,0 +1,79 @@
+"""
+Indicadores do painel admin
+Calculados com agregações no banco (COUNT/SUM), sem carregar produtos ou
+pedidos na memória, e guardados por METRICAS_TTL_SEGUNDOS no processo.
+O admin e o checkout chamam invalidar_metricas() depois de gravar; o que
+muda em outro processo (worker, outro worker do gunicorn) aparece quando
+o TTL vence.
+"""
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from app.models import db, Produto, Pedido
+from app.services.vendas import STATUS_VENDIDOS
+
+_cache = {'metricas': None, 'expira_em': 0, 'geracao': 0}
+_lock = threading.Lock()
+
+
+def calcular_metricas():
+    """Indicadores direto do banco (três consultas agregadas)"""
+    limite = current_app.config.get('ESTOQUE_BAIXO_LIMITE', 5)
+    disponivel = Produto.estoque - Produto.estoque_reservado
+
+    produtos = db.session.execute(db.select(
+        db.func.count(),
+        db.func.count().filter(Produto.ativo == True),
+        db.func.count().filter(Produto.ativo == True, disponivel <= limite),
+    )).one()
+
+    pedidos_por_status = dict(db.session.execute(
+        db.select(Pedido.status, db.func.count()).group_by(Pedido.status)
+    ).all())
+
+    agora = datetime.utcnow()
+    inicio_dia = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio_mes = inicio_dia.replace(day=1)
+    receita = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(Pedido.total).filter(Pedido.criado_em >= inicio_dia), 0),
+            db.func.coalesce(db.func.sum(Pedido.total), 0),
+        )
+        .where(Pedido.status.in_(STATUS_VENDIDOS), Pedido.criado_em >= inicio_mes)
+    ).one()
+
+    return {
+        'produtos': produtos[0],
+        'produtos_ativos': produtos[1],
+        'estoque_baixo': produtos[2],
+        'estoque_baixo_limite': limite,
+        'pedidos_por_status': pedidos_por_status,
+        'pedidos': sum(pedidos_por_status.values()),
+        'receita_hoje': float(receita[0]),
+        'receita_mes': float(receita[1]),
+        'calculado_em': agora,
+    }
+
+
+def obter_metricas():
+    """Indicadores em cache (recalculados depois do TTL ou de invalidar_metricas)"""
+    with _lock:
+        if _cache['metricas'] is not None and _cache['expira_em'] > time.monotonic():
+            return _cache['metricas']
+        geracao = _cache['geracao']
+
+    metricas = calcular_metricas()
+    with _lock:
+        # Invalidado durante o cálculo: o resultado pode já estar velho, não guarda
+        if _cache['geracao'] == geracao:
+            _cache['metricas'] = metricas
+            _cache['expira_em'] = time.monotonic() + current_app.config.get('METRICAS_TTL_SEGUNDOS', 30)
+    return metricas
+
+
+def invalidar_metricas():
+    """Descarta os indicadores em cache deste processo (chame depois do commit)"""
+    with _lock:
+        _cache['metricas'] = None
+        _cache['geracao'] += 1
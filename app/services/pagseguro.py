@@ -2,10 +2,11 @@
 Integração com PagBank Checkout API
 Documentação: https://developer.pagbank.com.br/reference/criar-checkout
 """
-import requests
 import json
 from flask import current_app, request
 from datetime import datetime, timedelta
+from app.services.http_gateway import requisitar
+from app.services.disjuntor import GatewayIndisponivel
 
 
 def get_credentials():
@@ -101,8 +102,9 @@ def criar_checkout(pedido, itens):
             'address_modifiable': False  # Cliente não pode alterar o endereço
         }
 
-    # Data de expiração do checkout (2 horas a partir de agora)
-    expiration_date = (datetime.now() + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S-03:00')
+    # Data de expiração do checkout (mesmo prazo do pedido, PAGAMENTO_EXPIRACAO_HORAS)
+    horas = current_app.config.get('PAGAMENTO_EXPIRACAO_HORAS', 2)
+    expiration_date = (datetime.now() + timedelta(hours=horas)).strftime('%Y-%m-%dT%H:%M:%S-03:00')
 
     # Monta o payload principal
     payload = {
@@ -135,11 +137,11 @@ def criar_checkout(pedido, itens):
     try:
         current_app.logger.info(f'PagBank Checkout Request: {json.dumps(payload, indent=2)}')
 
-        response = requests.post(
+        response = requisitar(
+            'pagbank', 'checkouts', 'POST',
             f'{base_url}/checkouts',
             headers=headers,
-            json=payload,
-            timeout=30
+            json=payload
         )
 
         current_app.logger.info(f'PagBank Checkout Response Status: {response.status_code}')
@@ -184,6 +186,8 @@ def criar_checkout(pedido, itens):
             error_msg = response.text if response.text else f'HTTP {response.status_code}'
             raise Exception(f'Erro ao criar checkout: {error_msg}')
 
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         current_app.logger.error(f'Erro PagBank Checkout: {str(e)}')
         raise Exception(f'Erro na integração PagBank: {str(e)}')
@@ -248,8 +252,9 @@ def criar_pagamento_pix(pedido):
             'address_modifiable': False  # Cliente não pode alterar o endereço
         }
 
-    # Data de expiração do checkout (2 horas a partir de agora)
-    expiration_date = (datetime.now() + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M:%S-03:00')
+    # Data de expiração do checkout (mesmo prazo do pedido, PAGAMENTO_EXPIRACAO_HORAS)
+    horas = current_app.config.get('PAGAMENTO_EXPIRACAO_HORAS', 2)
+    expiration_date = (datetime.now() + timedelta(hours=horas)).strftime('%Y-%m-%dT%H:%M:%S-03:00')
 
     # Monta o payload com apenas PIX como opção de pagamento
     payload = {
@@ -280,11 +285,11 @@ def criar_pagamento_pix(pedido):
     try:
         current_app.logger.info(f'PagBank PIX Request: {json.dumps(payload, indent=2)}')
 
-        response = requests.post(
+        response = requisitar(
+            'pagbank', 'checkouts', 'POST',
             f'{base_url}/checkouts',
             headers=headers,
-            json=payload,
-            timeout=30
+            json=payload
         )
 
         current_app.logger.info(f'PagBank PIX Response Status: {response.status_code}')
@@ -329,6 +334,8 @@ def criar_pagamento_pix(pedido):
             error_msg = response.text if response.text else f'HTTP {response.status_code}'
             raise Exception(f'Erro ao criar pagamento PIX: {error_msg}')
 
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         current_app.logger.error(f'Erro PagBank PIX: {str(e)}')
         raise Exception(f'Erro na integração PagBank: {str(e)}')
@@ -350,7 +357,8 @@ def consultar_checkout(checkout_id):
     headers = get_headers()
 
     try:
-        response = requests.get(
+        response = requisitar(
+            'pagbank', 'consultar_checkout', 'GET',
             f'{base_url}/checkouts/{checkout_id}',
             headers=headers
         )
@@ -377,6 +385,8 @@ def consultar_checkout(checkout_id):
         else:
             raise Exception(f'Erro ao consultar checkout: {response.content}')
 
+    except GatewayIndisponivel:
+        raise
     except Exception as e:
         raise Exception(f'Erro ao consultar checkout PagBank: {str(e)}')
 
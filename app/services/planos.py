@@ -0,0 +1,97 @@
+"""
+Planos de execução das consultas mais frequentes (flask explicar-consultas)
+Roda EXPLAIN nas mesmas consultas das listagens e acusa as que leem a
+tabela inteira (seq scan) ou ordenam fora do índice.
+- Postgres: EXPLAIN (FORMAT JSON) com enable_seqscan desligado na
+  transação, então um Seq Scan só aparece se nenhum índice atende a
+  consulta. Assim o resultado não depende do volume de dados.
+- SQLite: EXPLAIN QUERY PLAN; 'SCAN tabela' sem índice e 'USE TEMP
+  B-TREE FOR ORDER BY' são problemas.
+"""
+import json
+from dataclasses import dataclass, field
+from app.models import db, Produto, Pedido, ItemPedido, Endereco
+
+
+@dataclass
+class PlanoConsulta:
+    """Plano de uma consulta e os problemas encontrados nele"""
+    nome: str
+    linhas: list = field(default_factory=list)
+    problemas: list = field(default_factory=list)
+
+
+def consultas_monitoradas():
+    """(nome, SELECT) no formato usado pelas rotas, com ids de exemplo do banco"""
+    usuario_id = db.session.scalar(db.select(Pedido.usuario_id).limit(1)) or 1
+    pedido_id = db.session.scalar(db.select(Pedido.id).limit(1)) or 1
+    categoria_id = db.session.scalar(db.select(Produto.categoria_id).where(Produto.categoria_id.isnot(None)).limit(1)) or 1
+    recentes = (Produto.criado_em.desc(), Produto.id.desc())
+    ativos = db.select(Produto).where(Produto.ativo == True)
+
+    return [
+        ('loja.produtos', ativos.order_by(*recentes).limit(13)),
+        ('loja.produtos?ordem=preco-asc', ativos.order_by(Produto.preco, Produto.id).limit(13)),
+        ('loja.produtos?ordem=preco-desc', ativos.order_by(Produto.preco.desc(), Produto.id.desc()).limit(13)),
+        ('loja.produtos?ordem=nome', ativos.order_by(Produto.nome, Produto.id).limit(13)),
+        ('loja.categoria', db.select(Produto)
+         .where(Produto.ativo == True, Produto.categoria_id == categoria_id).order_by(*recentes).limit(13)),
+        ('auth.pedidos', db.select(Pedido)
+         .where(Pedido.usuario_id == usuario_id).order_by(Pedido.criado_em.desc()).limit(10)),
+        ('admin_pedidos.listar', db.select(Pedido).order_by(Pedido.criado_em.desc()).limit(20)),
+        ('admin_pedidos.listar?status', db.select(Pedido)
+         .where(Pedido.status == 'pago').order_by(Pedido.criado_em.desc()).limit(20)),
+        ('itens do pedido', db.select(ItemPedido).where(ItemPedido.pedido_id == pedido_id)),
+        ('endereços do usuário', db.select(Endereco).where(Endereco.usuario_id == usuario_id)),
+    ]
+
+
+def _planos_postgres(sql):
+    db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    plano = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+
+    linhas, problemas = [], []
+
+    def percorrer(no, nivel):
+        tipo = no['Node Type']
+        relacao = no.get('Relation Name')
+        indice = no.get('Index Name')
+        linhas.append('  ' * nivel + tipo + (f' on {relacao}' if relacao else '') + (f' using {indice}' if indice else ''))
+        if tipo == 'Seq Scan':
+            problemas.append(f'Seq Scan em {relacao}')
+        elif tipo in ('Sort', 'Incremental Sort'):
+            problemas.append(f'Ordenação fora do índice ({", ".join(no.get("Sort Key", []))})')
+        for filho in no.get('Plans', []):
+            percorrer(filho, nivel + 1)
+
+    percorrer(plano[0]['Plan'], 0)
+    return linhas, problemas
+
+
+def _planos_sqlite(sql):
+    linhas, problemas = [], []
+    for *_, detalhe in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')):
+        linhas.append(detalhe)
+        if detalhe.startswith('SCAN') and 'USING' not in detalhe:
+            problemas.append(detalhe)
+        elif 'TEMP B-TREE' in detalhe:
+            problemas.append(detalhe)
+    return linhas, problemas
+
+
+def explicar_consultas():
+    """Lista de PlanoConsulta das consultas monitoradas (não altera o banco)"""
+    dialeto = db.session.get_bind().dialect
+    explicar = _planos_postgres if dialeto.name == 'postgresql' else _planos_sqlite
+
+    resultado = []
+    try:
+        for nome, consulta in consultas_monitoradas():
+            sql = consulta.compile(dialect=dialeto, compile_kwargs={'literal_binds': True})
+            linhas, problemas = explicar(str(sql))
+            resultado.append(PlanoConsulta(nome, linhas, problemas))
+    finally:
+        db.session.rollback()
+    return resultado
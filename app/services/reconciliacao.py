@@ -0,0 +1,167 @@
+"""
+Reconciliação de pedidos pendentes com o PagBank
+Se um webhook se perde, o pedido fica 'pendente' para sempre. A
+reconciliação consulta no gateway os pedidos pendentes que não mudam há
+algum tempo (índice em status, atualizado_em) e aplica o status real.
+- Lotes pequenos, percorridos por chave (atualizado_em, id)
+- Consultas em paralelo, com no máximo RECONCILIACAO_CONCORRENCIA
+  simultâneas e RECONCILIACAO_MAX_POR_SEGUNDO por segundo
+- Um commit por lote; pedidos sem mudança têm atualizado_em renovado e
+  só voltam a ser consultados depois de RECONCILIACAO_IDADE_MINUTOS
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Pedido
+from app.services.disjuntor import CircuitoAberto
+from app.services.estoque import cancelar_pedidos_pendentes
+from app.services.vendas import registrar_vendas
+
+
+@dataclass
+class RelatorioReconciliacao:
+    """Resumo de uma execução da reconciliação"""
+    verificados: int = 0
+    pagos: int = 0
+    cancelados: int = 0
+    sem_mudanca: int = 0
+    erros: int = 0
+    interrompido: str = None  # Motivo, se a execução parou antes do fim
+    iniciado_em: datetime = field(default_factory=datetime.utcnow)
+    duracao_segundos: float = 0
+    falhas: list = field(default_factory=list)  # (pedido_id, erro), só as primeiras
+
+    def como_dict(self):
+        dados = asdict(self)
+        dados['iniciado_em'] = self.iniciado_em.isoformat()
+        return dados
+
+
+class _Ritmo:
+    """Limita o número de chamadas por segundo entre as threads"""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0
+        self.proxima = time.monotonic()
+        self.lock = threading.Lock()
+
+    def aguardar(self):
+        with self.lock:
+            agora = time.monotonic()
+            espera = self.proxima - agora
+            self.proxima = max(agora, self.proxima) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+def _consultar(app, ritmo, codigo):
+    """Consulta um checkout no PagBank (executada no pool de threads)"""
+    from app.services.pagseguro import consultar_checkout
+
+    ritmo.aguardar()
+    with app.app_context():
+        return consultar_checkout(codigo)['status']
+
+
+def _aplicar_lote(resultados, consultado_em, relatorio):
+    """Aplica os status consultados: um UPDATE por status, só em pedidos ainda pendentes"""
+    pagos = [pedido_id for pedido_id, status in resultados.items() if status == 'pago']
+    cancelar = [pedido_id for pedido_id, status in resultados.items() if status == 'cancelado']
+    sem_mudanca = [pedido_id for pedido_id, status in resultados.items() if status == 'pendente']
+
+    if pagos:
+        relatorio.pagos += db.session.execute(
+            db.update(Pedido)
+            .where(Pedido.id.in_(pagos), Pedido.status == 'pendente')
+            .values(status='pago', mp_payment_status='approved',
+                    pagamento_atualizado_em=consultado_em, atualizado_em=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        registrar_vendas(pagos)
+    if cancelar:
+        relatorio.cancelados += len(cancelar_pedidos_pendentes(cancelar, pagamento_atualizado_em=consultado_em))
+    if sem_mudanca:
+        # Vai para o fim da fila: só é consultado de novo depois da idade mínima
+        db.session.execute(
+            db.update(Pedido)
+            .where(Pedido.id.in_(sem_mudanca), Pedido.status == 'pendente')
+            .values(atualizado_em=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        relatorio.sem_mudanca += len(sem_mudanca)
+    db.session.commit()
+
+
+def reconciliar_pendentes(idade_minutos=None, lote=None, concorrencia=None, limite=None):
+    """
+    Consulta no PagBank os pedidos pendentes com checkout criado e sem
+    atualização há `idade_minutos` e aplica o status real. Para ao atingir
+    `limite` pedidos ou se o gateway ficar indisponível (disjuntor aberto).
+    """
+    config = current_app.config
+    idade = idade_minutos if idade_minutos is not None else config.get('RECONCILIACAO_IDADE_MINUTOS', 30)
+    lote = lote or config.get('RECONCILIACAO_LOTE', 200)
+    concorrencia = concorrencia or config.get('RECONCILIACAO_CONCORRENCIA', 4)
+
+    app = current_app._get_current_object()
+    ritmo = _Ritmo(config.get('RECONCILIACAO_MAX_POR_SEGUNDO', 10))
+    relatorio = RelatorioReconciliacao()
+    corte = relatorio.iniciado_em - timedelta(minutes=idade)
+    ultimo = None  # (atualizado_em, id) do último pedido visto
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        while not relatorio.interrompido:
+            tamanho = min(lote, limite - relatorio.verificados) if limite else lote
+            if tamanho <= 0:
+                break
+
+            consulta = (
+                db.select(Pedido.id, Pedido.pg_payment_code, Pedido.atualizado_em)
+                .where(Pedido.status == 'pendente', Pedido.atualizado_em < corte,
+                       Pedido.pg_payment_code.isnot(None), Pedido.pg_payment_code != '')
+                .order_by(Pedido.atualizado_em, Pedido.id)
+                .limit(tamanho)
+            )
+            if ultimo:
+                consulta = consulta.where(db.or_(
+                    Pedido.atualizado_em > ultimo[0],
+                    db.and_(Pedido.atualizado_em == ultimo[0], Pedido.id > ultimo[1])
+                ))
+            pedidos = db.session.execute(consulta).all()
+            db.session.rollback()
+            if not pedidos:
+                break
+            ultimo = (pedidos[-1].atualizado_em, pedidos[-1].id)
+
+            consultado_em = datetime.utcnow()
+            futuros = {
+                pool.submit(_consultar, app, ritmo, p.pg_payment_code): p.id for p in pedidos
+            }
+            resultados = {}
+            for futuro, pedido_id in futuros.items():
+                try:
+                    resultados[pedido_id] = futuro.result()
+                except CircuitoAberto as e:
+                    # Disjuntor aberto: não adianta insistir, o resto fica para a próxima execução
+                    relatorio.interrompido = str(e)
+                    for restante in futuros:
+                        restante.cancel()
+                    break
+                except Exception as e:
+                    relatorio.verificados += 1
+                    relatorio.erros += 1
+                    if len(relatorio.falhas) < 20:
+                        relatorio.falhas.append((pedido_id, str(e)[:300]))
+
+            relatorio.verificados += len(resultados)
+            _aplicar_lote(resultados, consultado_em, relatorio)
+
+            if len(pedidos) < tamanho:
+                break
+
+    relatorio.duracao_segundos = round((datetime.utcnow() - relatorio.iniciado_em).total_seconds(), 2)
+    current_app.logger.info(f'Reconciliação: {relatorio.como_dict()}')
+    return relatorio
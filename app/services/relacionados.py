@@ -0,0 +1,122 @@
+"""
+Produtos relacionados por compras em comum ("quem comprou também comprou")
+Uma rotina offline (worker, uma vez por dia, ou flask calcular-relacionados)
+conta em quantos pedidos cada par de produtos aparece junto e grava os
+RELACIONADOS_K melhores vizinhos de cada produto em produtos_relacionados.
+A página do produto só lê as linhas do produto pela chave primária.
+- Pontuação: coocorrências / sqrt(pedidos de A * pedidos de B) (cosseno),
+  para que produtos muito vendidos não apareçam como vizinhos de todos
+- Só pedidos vendidos nos últimos RELACIONADOS_DIAS; pedidos com mais de
+  RELACIONADOS_MAX_ITENS produtos distintos (compras de atacado) ficam de
+  fora, pois gerariam muitos pares sem relação
+"""
+import heapq
+import itertools
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Pedido, ItemPedido, ProdutoRelacionado
+from app.services.vendas import STATUS_VENDIDOS
+
+
+def _itens_vendidos(dias):
+    """(pedido_id, produto_id) distintos dos pedidos vendidos na janela, em ordem de pedido"""
+    desde = datetime.utcnow() - timedelta(days=dias)
+    consulta = (
+        db.select(ItemPedido.pedido_id, ItemPedido.produto_id)
+        .join(Pedido, Pedido.id == ItemPedido.pedido_id)
+        .where(Pedido.status.in_(STATUS_VENDIDOS), Pedido.criado_em >= desde,
+               ItemPedido.produto_id.isnot(None))
+        .distinct()
+        .order_by(ItemPedido.pedido_id)
+        .execution_options(yield_per=50_000)
+    )
+    pedidos, produtos = array('q'), array('q')
+    for pedido_id, produto_id in db.session.execute(consulta):
+        pedidos.append(pedido_id)
+        produtos.append(produto_id)
+    db.session.rollback()
+    return pedidos, produtos
+
+
+# ==================== CONTAGEM ====================
+
+def _vizinhos(pedidos, produtos, k, maximo_itens, minimo):
+    """Top-k vizinhos de cada produto: [(produto_id, relacionado_id, pontuacao, coocorrencias)]"""
+    pedidos_por_produto = Counter(produtos)
+    pares = Counter()
+    linhas = zip(pedidos, produtos)
+    for _, itens in itertools.groupby(linhas, key=lambda linha: linha[0]):
+        itens = sorted(produto_id for _, produto_id in itens)
+        if 2 <= len(itens) <= maximo_itens:
+            pares.update(itertools.combinations(itens, 2))
+
+    candidatos = defaultdict(list)
+    for (a, b), contagem in pares.items():
+        if contagem < minimo:
+            continue
+        pontuacao = contagem / math.sqrt(pedidos_por_produto[a] * pedidos_por_produto[b])
+        candidatos[a].append((pontuacao, contagem, -b))
+        candidatos[b].append((pontuacao, contagem, -a))
+
+    return [
+        (produto_id, -negativo, pontuacao, contagem)
+        for produto_id in sorted(candidatos)
+        for pontuacao, contagem, negativo in heapq.nlargest(k, candidatos[produto_id])
+    ]
+
+
+# ==================== ROTINA ====================
+
+def calcular_relacionados(k=None, dias=None):
+    """
+    Recalcula produtos_relacionados a partir dos pedidos vendidos (com
+    commit). A tabela é trocada inteira numa transação: quem lê vê a
+    versão anterior até o commit. Retorna um resumo da execução.
+    """
+    config = current_app.config
+    k = k or config.get('RELACIONADOS_K', 10)
+    dias = dias or config.get('RELACIONADOS_DIAS', 365)
+    maximo_itens = config.get('RELACIONADOS_MAX_ITENS', 50)
+    minimo = config.get('RELACIONADOS_MIN_COOCORRENCIAS', 1)
+
+    inicio = time.monotonic()
+    pedidos, produtos = _itens_vendidos(dias)
+    leitura = time.monotonic() - inicio
+
+    vizinhos = _vizinhos(pedidos, produtos, k, maximo_itens, minimo)
+
+    db.session.execute(db.delete(ProdutoRelacionado))
+    linhas, posicoes = [], Counter()
+    for produto_id, relacionado_id, pontuacao, coocorrencias in vizinhos:
+        posicoes[produto_id] += 1
+        linhas.append({
+            'produto_id': produto_id, 'posicao': posicoes[produto_id], 'relacionado_id': relacionado_id,
+            'pontuacao': round(pontuacao, 6), 'coocorrencias': coocorrencias,
+        })
+    for i in range(0, len(linhas), 10_000):
+        db.session.execute(db.insert(ProdutoRelacionado), linhas[i:i + 10_000])
+    db.session.commit()
+
+    resumo = {
+        'itens': len(produtos),
+        'produtos': len(posicoes),
+        'vizinhos': len(linhas),
+        'leitura_segundos': round(leitura, 2),
+        'duracao_segundos': round(time.monotonic() - inicio, 2),
+    }
+    current_app.logger.info(f'Produtos relacionados: {resumo}')
+    return resumo
+
+
+def ids_relacionados(produto_id, limite):
+    """Ids dos vizinhos pré-calculados do produto, do mais forte para o mais fraco"""
+    return db.session.scalars(
+        db.select(ProdutoRelacionado.relacionado_id)
+        .where(ProdutoRelacionado.produto_id == produto_id)
+        .order_by(ProdutoRelacionado.posicao)
+        .limit(limite)
+    ).all()
@@ -0,0 +1,75 @@
+"""
+Tarefas executadas pelo worker da fila (ver app/services/fila.py)
+"""
+from app.models import db, Pedido, ItemPedido
+from app.services.fila import tarefa, periodica
+
+
+@tarefa('criar_pagamento')
+def criar_pagamento(payload):
+    """Cria o checkout PagBank do pedido (Pix ou cartão) e salva o link"""
+    from app.services.pagseguro import criar_pagamento_pix, criar_checkout_pro
+
+    pedido = db.session.get(Pedido, payload['pedido_id'])
+    if not pedido or pedido.status != 'pendente':
+        return
+    if pedido.pg_payment_code and pedido.pg_payment_link:
+        return
+
+    if pedido.forma_pagamento == 'pix':
+        criar_pagamento_pix(pedido)
+    else:
+        itens = ItemPedido.query.filter_by(pedido_id=pedido.id).all()
+        criar_checkout_pro(pedido, itens)
+
+    db.session.commit()
+
+
+@periodica(2)
+def drenar_webhooks():
+    """Processa as notificações de pagamento da caixa de entrada"""
+    from app.services.webhooks import processar_webhooks
+    processar_webhooks()
+
+
+@periodica(60)
+def recuperar_webhooks_travados():
+    from app.services.webhooks import recuperar_travados
+    recuperar_travados()
+
+
+@periodica(15 * 60, duracao_maxima=30 * 60)
+def reconciliar_pedidos():
+    """Consulta no PagBank os pedidos pendentes parados (webhook perdido)"""
+    from flask import current_app
+    from app.services.reconciliacao import reconciliar_pendentes
+    reconciliar_pendentes(limite=current_app.config.get('RECONCILIACAO_LIMITE_POR_EXECUCAO', 2000))
+
+
+@periodica(24 * 60 * 60, duracao_maxima=2 * 60 * 60)
+def recalcular_vendas_30d():
+    """Tira de produtos.vendas_30d as vendas que saíram da janela de 30 dias"""
+    from app.services.vendas import recalcular_vendas
+    recalcular_vendas()
+
+
+@periodica(24 * 60 * 60, duracao_maxima=2 * 60 * 60)
+def calcular_produtos_relacionados():
+    """Refaz os vizinhos "quem comprou também comprou" de cada produto"""
+    from app.services.relacionados import calcular_relacionados
+    calcular_relacionados()
+
+
+@periodica(60)
+def expirar_pendentes():
+    """Libera reservas de carrinho vencidas e cancela pedidos pendentes expirados"""
+    from app.services.estoque import liberar_reservas_expiradas, expirar_pedidos_pendentes
+    liberar_reservas_expiradas()
+    expirar_pedidos_pendentes()
+
+
+@periodica(60 * 60, duracao_maxima=30 * 60)
+def limpar_carrinhos_abandonados():
+    """Apaga os carrinhos do banco sem uso há CARRINHO_TTL_DIAS e libera suas reservas"""
+    from app.services.carrinho import limpar_carrinhos_abandonados as limpar
+    limpar()
@@ -0,0 +1,79 @@
+"""
+Vendas dos últimos 30 dias por produto (produtos.vendas_30d)
+Coluna indexada que alimenta a ordenação "mais vendidos" sem somar
+itens_pedido a cada listagem.
+- registrar_vendas(): quando um pedido é pago, soma seus itens à coluna
+  (uma vez por pedido: pedidos.vendas_registradas)
+- recalcular_vendas(): rotina diária que refaz a soma da janela de 30 dias,
+  tirando as vendas que saíram da janela e pedidos pagos depois cancelados.
+  Só grava os produtos cujo valor mudou.
+"""
+from datetime import datetime, timedelta
+from app.models import db, Pedido, ItemPedido, Produto
+from app.services.estoque import travar_produtos
+
+STATUS_VENDIDOS = ('pago', 'enviando', 'entregue')
+JANELA_DIAS = 30
+
+
+def registrar_vendas(pedido_ids):
+    """
+    Soma em vendas_30d os itens dos pedidos vendidos que ainda não foram
+    contados. O UPDATE condicional em pedidos garante que um pedido conte
+    uma vez só, mesmo com webhook e reconciliação ao mesmo tempo.
+    Retorna os ids contados agora. Não faz commit.
+    """
+    registrados = db.session.scalars(
+        db.update(Pedido)
+        .where(Pedido.id.in_(pedido_ids), Pedido.status.in_(STATUS_VENDIDOS),
+               Pedido.vendas_registradas == False)
+        .values(vendas_registradas=True)
+        .returning(Pedido.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not registrados:
+        return []
+
+    itens = (
+        db.select(ItemPedido.produto_id, db.func.sum(ItemPedido.quantidade).label('quantidade'))
+        .where(ItemPedido.pedido_id.in_(registrados), ItemPedido.produto_id.isnot(None))
+        .group_by(ItemPedido.produto_id)
+        .subquery()
+    )
+    travar_produtos(db.select(itens.c.produto_id))
+    db.session.execute(
+        db.update(Produto)
+        .where(Produto.id == itens.c.produto_id)
+        .values(vendas_30d=Produto.vendas_30d + itens.c.quantidade)
+        .execution_options(synchronize_session=False)
+    )
+    return registrados
+
+
+def recalcular_vendas(dias=JANELA_DIAS):
+    """Refaz vendas_30d a partir dos pedidos vendidos na janela (com commit). Retorna quantos produtos mudaram."""
+    desde = datetime.utcnow() - timedelta(days=dias)
+    vendas = (
+        db.select(ItemPedido.produto_id, db.func.sum(ItemPedido.quantidade).label('quantidade'))
+        .join(Pedido, Pedido.id == ItemPedido.pedido_id)
+        .where(Pedido.vendas_registradas == True, Pedido.status.in_(STATUS_VENDIDOS),
+               Pedido.criado_em >= desde, ItemPedido.produto_id.isnot(None))
+        .group_by(ItemPedido.produto_id)
+        .subquery()
+    )
+
+    travar_produtos(db.select(vendas.c.produto_id))
+    alterados = db.session.execute(
+        db.update(Produto)
+        .where(Produto.id == vendas.c.produto_id, Produto.vendas_30d != vendas.c.quantidade)
+        .values(vendas_30d=vendas.c.quantidade)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    alterados += db.session.execute(
+        db.update(Produto)
+        .where(Produto.vendas_30d != 0, Produto.id.notin_(db.select(vendas.c.produto_id)))
+        .values(vendas_30d=0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return alterados
@@ -0,0 +1,374 @@
+"""
+Caixa de entrada de webhooks
+Os endpoints só gravam a notificação como chegou (eventos_webhook) e
+respondem 200; o worker processa os eventos em lote depois.
+- Entregas repetidas do mesmo evento esbarram na chave única
+  (gateway, evento_id) e não são gravadas de novo.
+- Os eventos do lote são aplicados na ordem em que aconteceram no
+  gateway, e um evento mais antigo que o último já aplicado ao pedido
+  (pedidos.pagamento_atualizado_em) é ignorado.
+- Cada status novo só vale a partir de certos status (ORIGENS), e o
+  cancelamento devolve o estoque. Pagamento de um pedido já cancelado
+  baixa o estoque de novo; sem estoque, o evento fica em 'revisao'.
+- reprocessar() devolve à fila os eventos de um período, por exemplo
+  depois de corrigir um bug no processamento.
+"""
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app.models import db, EventoWebhook, Pedido, ItemPedido
+from app.services.estoque import baixar_estoque, cancelar_pedidos
+from app.services.vendas import registrar_vendas, STATUS_VENDIDOS
+
+
+# ==================== RECEBIMENTO ====================
+
+def _data_utc(valor):
+    """Converte uma data ISO 8601 do gateway (com fuso) para UTC sem fuso, como no banco"""
+    if not valor:
+        return None
+    try:
+        data = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if data.tzinfo:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+
+def _json(corpo):
+    try:
+        dados = json.loads(corpo or '{}')
+    except ValueError:
+        return {}
+    return dados if isinstance(dados, dict) else {}
+
+
+def registrar_evento(gateway, evento_id, payload, referencia=None, status_gateway=None, ocorrido_em=None):
+    """Grava o evento na caixa de entrada (com commit). Retorna False se ele já tinha sido recebido."""
+    db.session.add(EventoWebhook(
+        gateway=gateway,
+        evento_id=str(evento_id)[:100],
+        referencia=str(referencia)[:100] if referencia else None,
+        status_gateway=str(status_gateway)[:50] if status_gateway else None,
+        ocorrido_em=ocorrido_em or datetime.utcnow(),
+        payload=payload,
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def receber_pagbank(corpo):
+    """Notificação do PagBank (JSON com reference_id, status e charges)"""
+    dados = _json(corpo)
+    cobrancas = dados.get('charges') or []
+    cobranca = cobrancas[0] if cobrancas and isinstance(cobrancas[0], dict) else {}
+
+    ocorrido_em = _data_utc(
+        cobranca.get('paid_at') or cobranca.get('updated_at') or dados.get('updated_at')
+        or cobranca.get('created_at') or dados.get('created_at')
+    )
+    # O PagBank reenvia a mesma notificação com o mesmo corpo; notificações
+    # diferentes do mesmo pedido mudam status e datas
+    return registrar_evento(
+        'pagbank',
+        hashlib.sha256(corpo.encode()).hexdigest(),
+        corpo,
+        referencia=dados.get('reference_id') or cobranca.get('reference_id'),
+        status_gateway=dados.get('status') or cobranca.get('status'),
+        ocorrido_em=ocorrido_em,
+    )
+
+
+def receber_mercadopago(corpo):
+    """Notificação do Mercado Pago (só traz o id do pagamento; o status é consultado no processamento)"""
+    dados = _json(corpo)
+    evento_id = dados.get('id') or hashlib.sha256(corpo.encode()).hexdigest()
+    return registrar_evento(
+        'mercadopago', evento_id, corpo,
+        status_gateway=dados.get('action') or dados.get('type'),
+        ocorrido_em=_data_utc(dados.get('date_created')),
+    )
+
+
+def receber_pagseguro(formulario):
+    """Notificação legada do PagSeguro (notificationCode por formulário)"""
+    codigo = formulario.get('notificationCode')
+    if not codigo:
+        return False
+    return registrar_evento(
+        'pagseguro', codigo, json.dumps(formulario),
+        status_gateway=formulario.get('notificationType'),
+    )
+
+
+# ==================== PROCESSAMENTO ====================
+
+@dataclass
+class AtualizacaoPagamento:
+    """Mudança de pagamento que um evento pede para um pedido"""
+    pedido_id: int
+    status: str  # Novo status do pedido (None mantém o atual)
+    campos: dict = field(default_factory=dict)
+    ocorrido_em: datetime = None
+
+
+STATUS_PAGBANK = {
+    'paid': ('pago', 'approved'),
+    'canceled': ('cancelado', 'canceled'),
+    'payment_failed': ('cancelado', 'payment_failed'),
+    'created': ('pendente', 'pending'),
+}
+
+STATUS_MERCADOPAGO = {
+    'approved': 'pago',
+    'pending': 'pendente',
+    'authorized': 'pago',
+    'in_process': 'pendente',
+    'rejected': 'cancelado',
+    'cancelled': 'cancelado',
+    'refunded': 'cancelado'
+}
+
+
+def _interpretar_pagbank(evento):
+    status = (evento.status_gateway or '').lower()
+    if status not in STATUS_PAGBANK or not evento.referencia:
+        return None
+    novo_status, status_pagamento = STATUS_PAGBANK[status]
+    return AtualizacaoPagamento(
+        int(evento.referencia), novo_status, {'mp_payment_status': status_pagamento}, evento.ocorrido_em
+    )
+
+
+def _interpretar_mercadopago(evento):
+    from app.services.mercadopago import consultar_pagamento
+
+    dados = _json(evento.payload)
+    payment_id = (dados.get('data') or {}).get('id')
+    if dados.get('type') != 'payment' or not payment_id:
+        return None
+
+    payment = consultar_pagamento(payment_id)
+    referencia = payment.get('external_reference')
+    if not referencia:
+        return None
+    return AtualizacaoPagamento(
+        int(referencia),
+        STATUS_MERCADOPAGO.get(payment.get('status')),
+        {'mp_payment_id': str(payment_id), 'mp_payment_status': payment.get('status', 'unknown')},
+        _data_utc(payment.get('date_last_updated')) or evento.ocorrido_em,
+    )
+
+
+def _interpretar_pagseguro(evento):
+    # A API legada exige consultar a transação pelo notificationCode; o
+    # checkout atual é do PagBank, então o evento só fica registrado
+    return None
+
+
+INTERPRETADORES = {
+    'pagbank': _interpretar_pagbank,
+    'mercadopago': _interpretar_mercadopago,
+    'pagseguro': _interpretar_pagseguro,
+}
+
+
+# Status de onde cada status pedido por um evento pode vir: um evento
+# atrasado ou reprocessado não tira o pedido de 'enviando'/'entregue', e
+# 'pendente' não desfaz um pagamento nem um cancelamento
+ORIGENS = {
+    'pago': ('pendente', 'pago'),
+    'pendente': ('pendente',),
+    'cancelado': ('pendente', 'pago'),  # Estorno antes do envio
+}
+
+
+def _evento_recente(atualizacao):
+    """O evento não é mais antigo que o último já aplicado ao pedido"""
+    return db.or_(Pedido.pagamento_atualizado_em.is_(None),
+                  Pedido.pagamento_atualizado_em <= atualizacao.ocorrido_em)
+
+
+def _atualizar(atualizacao, valores, origens=None):
+    criterios = [Pedido.id == atualizacao.pedido_id, _evento_recente(atualizacao)]
+    if origens:
+        criterios.append(Pedido.status.in_(origens))
+    return db.session.execute(
+        db.update(Pedido)
+        .where(*criterios)
+        .values(**valores)
+        .execution_options(synchronize_session=False)
+    ).rowcount > 0
+
+
+def _reabrir_pago(atualizacao, valores):
+    """
+    Pagamento confirmado de um pedido que já foi cancelado (a expiração
+    chegou antes do webhook): o estoque foi devolvido, então o pedido só
+    volta a 'pago' se as unidades puderem ser baixadas de novo.
+    """
+    itens = db.session.execute(
+        db.select(ItemPedido.produto_id, ItemPedido.quantidade)
+        .where(ItemPedido.pedido_id == atualizacao.pedido_id, ItemPedido.produto_id.isnot(None))
+    ).all()
+
+    savepoint = db.session.begin_nested()
+    if _atualizar(atualizacao, dict(valores, status='pago'), ('cancelado',)) and baixar_estoque(itens).ok:
+        savepoint.commit()
+        return True
+    savepoint.rollback()
+    return False
+
+
+def _aplicar(atualizacao):
+    """
+    Aplica a atualização se o evento não for mais antigo que o último já
+    aplicado ao pedido e o status atual permitir a mudança (ORIGENS). Os
+    UPDATEs condicionais valem também com dois processadores ao mesmo
+    tempo. Cancelamentos devolvem o estoque (cancelar_pedidos).
+    Retorna a nova situação do evento e o motivo, quando não foi aplicado.
+    """
+    valores = dict(atualizacao.campos, pagamento_atualizado_em=atualizacao.ocorrido_em)
+    status = atualizacao.status
+
+    if status == 'cancelado':
+        aplicado = bool(cancelar_pedidos([atualizacao.pedido_id], ORIGENS['cancelado'],
+                                         criterios=[_evento_recente(atualizacao)], **valores))
+    elif status:
+        aplicado = _atualizar(atualizacao, dict(valores, status=status), ORIGENS[status])
+    else:
+        aplicado = _atualizar(atualizacao, valores)
+    if aplicado:
+        return 'processado', None
+
+    pedido = db.session.execute(
+        db.select(Pedido.status, Pedido.pagamento_atualizado_em).where(Pedido.id == atualizacao.pedido_id)
+    ).first()
+    if pedido is None:
+        return 'ignorado', 'Pedido não encontrado'
+    if pedido.pagamento_atualizado_em and pedido.pagamento_atualizado_em > atualizacao.ocorrido_em:
+        return 'ignorado', 'Evento mais antigo que o último aplicado ao pedido'
+    if status == 'pago' and pedido.status == 'cancelado':
+        if _reabrir_pago(atualizacao, valores):
+            return 'processado', None
+        return 'revisao', 'Pagamento de pedido cancelado sem estoque para reabrir: repor o estoque ou estornar'
+    return 'ignorado', f'Pedido {pedido.status} não passa para {status}'
+
+
+def _reivindicar(lote):
+    """Marca até `lote` eventos pendentes como 'processando' e retorna seus ids"""
+    consulta = (
+        db.select(EventoWebhook.id)
+        .where(EventoWebhook.situacao == 'pendente')
+        .order_by(EventoWebhook.id)
+        .limit(lote)
+    )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        consulta = consulta.with_for_update(skip_locked=True)
+    candidatos = db.session.scalars(consulta).all()
+    if not candidatos:
+        db.session.rollback()
+        return []
+
+    ids = db.session.scalars(
+        db.update(EventoWebhook)
+        .where(EventoWebhook.id.in_(candidatos), EventoWebhook.situacao == 'pendente')
+        .values(situacao='processando', tentativas=EventoWebhook.tentativas + 1, atualizado_em=datetime.utcnow())
+        .returning(EventoWebhook.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return ids
+
+
+def _processar(evento):
+    interpretar = INTERPRETADORES.get(evento.gateway)
+    try:
+        if not interpretar:
+            raise Exception(f'Gateway desconhecido: {evento.gateway}')
+        atualizacao = interpretar(evento)
+        if atualizacao is None:
+            evento.situacao = 'ignorado'
+        else:
+            evento.situacao, evento.erro = _aplicar(atualizacao)
+            if evento.situacao == 'processado' and atualizacao.status in STATUS_VENDIDOS:
+                registrar_vendas([atualizacao.pedido_id])
+        evento.atualizado_em = datetime.utcnow()
+        db.session.commit()
+        if evento.situacao == 'revisao':
+            current_app.logger.warning(f'Webhook #{evento.id} ({evento.gateway}) precisa de revisão: {evento.erro}')
+    except Exception as e:
+        db.session.rollback()
+        evento = db.session.get(EventoWebhook, evento.id)
+        evento.erro = str(e)[:2000]
+        evento.situacao = 'pendente' if evento.tentativas < current_app.config.get('WEBHOOK_MAX_TENTATIVAS', 5) else 'erro'
+        evento.atualizado_em = datetime.utcnow()
+        db.session.commit()
+        current_app.logger.warning(f'Webhook #{evento.id} ({evento.gateway}) falhou: {evento.erro}')
+
+
+def recuperar_travados():
+    """Devolve à fila eventos 'processando' cujo processador morreu no meio"""
+    limite = datetime.utcnow() - timedelta(seconds=current_app.config.get('FILA_TIMEOUT_SEGUNDOS', 300))
+    recuperados = db.session.execute(
+        db.update(EventoWebhook)
+        .where(EventoWebhook.situacao == 'processando', EventoWebhook.atualizado_em < limite)
+        .values(situacao='pendente')
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return recuperados
+
+
+def processar_webhooks(lote=None):
+    """
+    Drena a caixa de entrada em lotes, aplicando os eventos de cada lote na
+    ordem em que aconteceram. Retorna quantos eventos foram processados.
+    """
+    lote = lote or current_app.config.get('WEBHOOK_LOTE', 100)
+    total = 0
+    while True:
+        ids = _reivindicar(lote)
+        if not ids:
+            break
+
+        eventos = (
+            EventoWebhook.query.filter(EventoWebhook.id.in_(ids))
+            .order_by(EventoWebhook.ocorrido_em, EventoWebhook.id)
+            .all()
+        )
+        for evento in eventos:
+            _processar(evento)
+        total += len(ids)
+
+        if len(ids) < lote:
+            break
+    return total
+
+
+def reprocessar(de, ate, gateway=None):
+    """Devolve à fila os eventos recebidos entre `de` e `ate` (com commit). Retorna quantos."""
+    criterios = [
+        EventoWebhook.recebido_em >= de,
+        EventoWebhook.recebido_em <= ate,
+        EventoWebhook.situacao != 'processando',
+    ]
+    if gateway:
+        criterios.append(EventoWebhook.gateway == gateway)
+
+    total = db.session.execute(
+        db.update(EventoWebhook)
+        .where(*criterios)
+        .values(situacao='pendente', tentativas=0, erro=None, atualizado_em=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return total
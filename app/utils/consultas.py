@@ -0,0 +1,35 @@
+"""
+Contagem de consultas SQL por request
+Com CONSULTAS_LIMITE_POR_REQUEST > 0, cada request conta os SELECTs
+enviados ao banco e responde com o cabeçalho X-Consultas-SQL. Escritas
+não contam (a baixa de estoque, por exemplo, é um UPDATE por produto).
+Passou do limite: aviso no log com a rota (N+1 esquecido) ou, com
+CONSULTAS_LIMITE_ESTRITO, erro 500 para o problema aparecer no
+desenvolvimento. Consultas fora de request (worker, CLI) não contam.
+"""
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+
+def _contar(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and statement.lstrip()[:6].upper().startswith(('SELECT', 'WITH')):
+        g.consultas_sql = g.get('consultas_sql', 0) + 1
+
+
+def monitorar_consultas(app, engine):
+    """Liga a contagem no engine da app (chamado pelo create_app)"""
+    limite = app.config.get('CONSULTAS_LIMITE_POR_REQUEST', 0)
+    if not limite:
+        return
+    event.listen(engine, 'before_cursor_execute', _contar)
+
+    @app.after_request
+    def _verificar_consultas(resposta):
+        total = g.get('consultas_sql', 0)
+        resposta.headers['X-Consultas-SQL'] = str(total)
+        if total > limite:
+            mensagem = f'{request.endpoint} fez {total} consultas SQL (limite {limite})'
+            if app.config.get('CONSULTAS_LIMITE_ESTRITO'):
+                raise RuntimeError(mensagem)
+            app.logger.warning(mensagem)
+        return resposta
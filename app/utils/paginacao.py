@@ -0,0 +1,163 @@
+# Paginação por cursor (keyset / seek)
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class PaginaCursor:
+    """
+    Página de resultados paginada por cursor.
+    Em vez de OFFSET + COUNT(*), cada página continua a partir da chave de
+    ordenação do último (ou primeiro) item, então o custo é o mesmo em
+    qualquer profundidade.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    return valor
+
+
+def _desserializar(valor):
+    if isinstance(valor, dict):
+        return datetime.fromisoformat(valor['dt'])
+    return valor
+
+
+def codificar_cursor(valores, direcao):
+    """Gera o cursor opaco para os valores da chave de ordenação"""
+    dados = json.dumps({'v': [_serializar(v) for v in valores], 'd': direcao}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (valores, direcao) de um cursor ou levanta ValueError"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores = [_desserializar(v) for v in dados['v']]
+        direcao = dados['d']
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if direcao not in ('p', 'a'):
+        raise ValueError('Cursor inválido')
+    return valores, direcao
+
+
+def _tipo_python(expr):
+    try:
+        return expr.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def converter_valores(chaves, valores):
+    """
+    Confere os valores de um cursor contra o tipo de cada chave de
+    ordenação e retorna os valores convertidos (int -> float em colunas
+    Float). Um cursor forjado (texto onde a coluna é numérica, por
+    exemplo) levanta ValueError em vez de virar erro no banco.
+    """
+    if len(valores) != len(chaves):
+        raise ValueError('Cursor inválido')
+    convertidos = []
+    for chave, valor in zip(chaves, valores):
+        tipo = _tipo_python(chave)
+        if valor is None or isinstance(valor, bool):
+            raise ValueError('Cursor inválido')
+        if tipo is float:
+            if not isinstance(valor, (int, float)):
+                raise ValueError('Cursor inválido')
+            valor = float(valor)
+        elif tipo in (int, str, datetime):
+            if not isinstance(valor, tipo):
+                raise ValueError('Cursor inválido')
+        elif not isinstance(valor, (int, float, str, datetime)):
+            raise ValueError('Cursor inválido')
+        convertidos.append(valor)
+    return convertidos
+
+
+def _filtro_apos(chaves, valores, direcoes):
+    """
+    Monta o filtro "linha vem depois de valores" para uma ordenação com
+    várias chaves: (k1 > v1) OR (k1 = v1 AND k2 > v2) ...
+    O primeiro termo (k1 >= v1) permite ao banco usar o índice como range.
+    """
+    condicoes = []
+    for i, (chave, valor, direcao) in enumerate(zip(chaves, valores, direcoes)):
+        iguais = [c == v for c, v in zip(chaves[:i], valores[:i])]
+        passo = chave > valor if direcao == 'asc' else chave < valor
+        condicoes.append(and_(*iguais, passo))
+
+    primeira = chaves[0] >= valores[0] if direcoes[0] == 'asc' else chaves[0] <= valores[0]
+    return and_(primeira, or_(*condicoes))
+
+
+def paginar_por_cursor(query, ordenacao, cursor=None, per_page=12):
+    """
+    Pagina uma query por cursor.
+    ordenacao: lista de (expressao, 'asc'|'desc'); a última chave deve ser
+    única (normalmente o id) para a ordem ser total.
+    """
+    chaves = [expr for expr, _ in ordenacao]
+    direcoes = [direcao for _, direcao in ordenacao]
+
+    valores, sentido = None, 'p'
+    if cursor:
+        try:
+            valores, sentido = decodificar_cursor(cursor)
+            valores = converter_valores(chaves, valores)
+        except ValueError:
+            valores, sentido = None, 'p'
+
+    # Voltando uma página: percorre a ordem invertida e desfaz no final
+    if sentido == 'a':
+        direcoes_consulta = ['desc' if d == 'asc' else 'asc' for d in direcoes]
+    else:
+        direcoes_consulta = direcoes
+
+    consulta = query.add_columns(*[expr.label(f'_chave{i}') for i, expr in enumerate(chaves)])
+    if valores is not None:
+        consulta = consulta.filter(_filtro_apos(chaves, valores, direcoes_consulta))
+    consulta = consulta.order_by(None).order_by(*[
+        expr.asc() if d == 'asc' else expr.desc() for expr, d in zip(chaves, direcoes_consulta)
+    ])
+
+    linhas = consulta.limit(per_page + 1).all()
+    tem_mais = len(linhas) > per_page
+    linhas = linhas[:per_page]
+    if sentido == 'a':
+        linhas.reverse()
+
+    items = [linha[0] for linha in linhas]
+    if not linhas:
+        return PaginaCursor(items)
+
+    primeira = list(linhas[0][1:])
+    ultima = list(linhas[-1][1:])
+
+    if sentido == 'a':
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, valores is not None
+
+    return PaginaCursor(
+        items,
+        next_cursor=codificar_cursor(ultima, 'p') if tem_proxima else None,
+        prev_cursor=codificar_cursor(primeira, 'a') if tem_anterior else None
+    )
@@ -0,0 +1,23 @@
+# Utilitários de texto
+import re
+import unicodedata
+
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_texto(*partes):
+    """
+    Normaliza texto para busca: remove acentos, converte para minúsculas
+    e troca pontuação/hífens (inclusive os não separáveis, U+2011) por espaço.
+    Ex.: "Cabo USB‑C Turbo" -> "cabo usb c turbo"
+    """
+    texto = ' '.join(p for p in partes if p)
+    texto = unicodedata.normalize('NFKD', texto)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _NAO_ALFANUMERICO.sub(' ', texto.lower()).strip()
+
+
+def tokenizar(texto):
+    """Retorna os termos normalizados de um texto de busca"""
+    normalizado = normalizar_texto(texto)
+    return normalizado.split() if normalizado else []
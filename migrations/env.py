@@ -51,6 +51,26 @@ def get_metadata():
     return target_db.metadata
 
 
+# Objetos da busca textual criados por DDL fora do metadata (BUSCA_DDL em
+# app/models.py e migração 3f9c2a7d41e8). Sem este filtro o autogenerate
+# gera drops para eles.
+TABELAS_BUSCA = ('produtos_fts',)  # Inclui as tabelas internas do FTS5 (produtos_fts_data, _idx...)
+COLUNAS_BUSCA = {('produtos', 'busca_vetor')}
+INDICES_BUSCA = {'ix_produtos_busca_vetor'}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if not reflected or compare_to is not None:
+        return True
+    if type_ == 'table':
+        return not any(name == tabela or name.startswith(tabela + '_') for tabela in TABELAS_BUSCA)
+    if type_ == 'column':
+        return (object.table.name, name) not in COLUNAS_BUSCA
+    if type_ == 'index':
+        return name not in INDICES_BUSCA
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +85,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +114,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
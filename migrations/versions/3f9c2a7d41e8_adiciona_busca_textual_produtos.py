@@ -0,0 +1,78 @@
+"""Adiciona busca textual de produtos
+
+Revision ID: 3f9c2a7d41e8
+Revises: b972ca806c16
+Create Date: 2026-10-18 10:12:41.205113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.texto import normalizar_texto
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41e8'
+down_revision = 'b972ca806c16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('produtos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('busca_texto', sa.Text(), nullable=True))
+
+    # Preenche o texto normalizado dos produtos existentes
+    conn = op.get_bind()
+    produtos = conn.execute(sa.text('SELECT id, nome, descricao FROM produtos')).fetchall()
+    if produtos:
+        conn.execute(
+            sa.text('UPDATE produtos SET busca_texto = :busca_texto WHERE id = :id'),
+            [{'id': p.id, 'busca_texto': normalizar_texto(p.nome, p.descricao)} for p in produtos]
+        )
+
+    dialeto = conn.dialect.name
+    if dialeto == 'postgresql':
+        op.execute("""
+            ALTER TABLE produtos ADD COLUMN busca_vetor tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, coalesce(busca_texto, ''))) STORED
+        """)
+        op.execute('CREATE INDEX ix_produtos_busca_vetor ON produtos USING gin (busca_vetor)')
+    elif dialeto == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE produtos_fts USING fts5(
+                busca_texto, content='produtos', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2')
+        """)
+        op.execute("""
+            CREATE TRIGGER produtos_fts_ai AFTER INSERT ON produtos BEGIN
+                INSERT INTO produtos_fts(rowid, busca_texto) VALUES (new.id, new.busca_texto);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER produtos_fts_ad AFTER DELETE ON produtos BEGIN
+                INSERT INTO produtos_fts(produtos_fts, rowid, busca_texto) VALUES ('delete', old.id, old.busca_texto);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER produtos_fts_au AFTER UPDATE OF busca_texto ON produtos BEGIN
+                INSERT INTO produtos_fts(produtos_fts, rowid, busca_texto) VALUES ('delete', old.id, old.busca_texto);
+                INSERT INTO produtos_fts(rowid, busca_texto) VALUES (new.id, new.busca_texto);
+            END
+        """)
+        op.execute("INSERT INTO produtos_fts(produtos_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialeto = op.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_produtos_busca_vetor')
+        op.execute('ALTER TABLE produtos DROP COLUMN IF EXISTS busca_vetor')
+    elif dialeto == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS produtos_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS produtos_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS produtos_fts_ai')
+        op.execute('DROP TABLE IF EXISTS produtos_fts')
+
+    with op.batch_alter_table('produtos', schema=None) as batch_op:
+        batch_op.drop_column('busca_texto')
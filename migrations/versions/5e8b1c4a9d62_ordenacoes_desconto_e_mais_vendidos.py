@@ -0,0 +1,71 @@
+"""Colunas desconto_percentual e vendas_30d em produtos (ordenações da vitrine)
+
+Revision ID: 5e8b1c4a9d62
+Revises: 2c9d5a1e7f30
+Create Date: 2026-10-18 17:41:06.318254
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models import calcular_desconto
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b1c4a9d62'
+down_revision = '2c9d5a1e7f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('produtos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('desconto_percentual', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('vendas_30d', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_produtos_desconto_percentual_id', ['desconto_percentual', 'id'], unique=False)
+        batch_op.create_index('ix_produtos_vendas_30d_id', ['vendas_30d', 'id'], unique=False)
+
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('vendas_registradas', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    conn = op.get_bind()
+
+    # Desconto dos produtos em promoção (os demais ficam com o default 0)
+    produtos = conn.execute(sa.text(
+        'SELECT id, preco, preco_antigo FROM produtos WHERE preco_antigo > preco'
+    )).fetchall()
+    if produtos:
+        conn.execute(
+            sa.text('UPDATE produtos SET desconto_percentual = :desconto WHERE id = :id'),
+            [{'id': p.id, 'desconto': calcular_desconto(p.preco, p.preco_antigo)} for p in produtos]
+        )
+
+    # Pedidos já vendidos contam como registrados; vendas_30d sai da janela de 30 dias
+    conn.execute(sa.text(
+        "UPDATE pedidos SET vendas_registradas = :sim WHERE status IN ('pago', 'enviando', 'entregue')"
+    ), {'sim': True})
+    vendas = conn.execute(sa.text("""
+        SELECT i.produto_id, SUM(i.quantidade) AS quantidade
+        FROM itens_pedido i JOIN pedidos p ON p.id = i.pedido_id
+        WHERE p.status IN ('pago', 'enviando', 'entregue') AND p.criado_em >= :desde
+          AND i.produto_id IS NOT NULL
+        GROUP BY i.produto_id
+    """), {'desde': datetime.utcnow() - timedelta(days=30)}).fetchall()
+    if vendas:
+        conn.execute(
+            sa.text('UPDATE produtos SET vendas_30d = :quantidade WHERE id = :id'),
+            [{'id': v.produto_id, 'quantidade': v.quantidade} for v in vendas]
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.drop_column('vendas_registradas')
+
+    with op.batch_alter_table('produtos', schema=None) as batch_op:
+        batch_op.drop_index('ix_produtos_vendas_30d_id')
+        batch_op.drop_index('ix_produtos_desconto_percentual_id')
+        batch_op.drop_column('vendas_30d')
+        batch_op.drop_column('desconto_percentual')
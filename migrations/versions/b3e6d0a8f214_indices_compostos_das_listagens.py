@@ -0,0 +1,45 @@
+"""Índices compostos e parciais das listagens (loja, conta e admin)
+
+Revision ID: b3e6d0a8f214
+Revises: 9c4f2b7e1a05
+Create Date: 2026-10-18 18:57:31.442816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e6d0a8f214'
+down_revision = '9c4f2b7e1a05'
+branch_labels = None
+depends_on = None
+
+SO_ATIVOS = {'postgresql_where': sa.text('ativo'), 'sqlite_where': sa.text('ativo = 1')}
+
+# (nome, tabela, colunas, opções)
+INDICES = [
+    ('ix_produtos_ativos_criado_em_id', 'produtos', ['criado_em', 'id'], SO_ATIVOS),
+    ('ix_produtos_ativos_categoria_criado_em_id', 'produtos', ['categoria_id', 'criado_em', 'id'], SO_ATIVOS),
+    ('ix_pedidos_usuario_id_criado_em', 'pedidos', ['usuario_id', 'criado_em'], {}),
+    ('ix_pedidos_status_criado_em', 'pedidos', ['status', 'criado_em'], {}),
+    ('ix_pedidos_criado_em', 'pedidos', ['criado_em'], {}),
+    ('ix_itens_pedido_pedido_id', 'itens_pedido', ['pedido_id'], {}),
+    ('ix_enderecos_usuario_id', 'enderecos', ['usuario_id'], {}),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY não trava as escritas, mas não roda dentro de transação
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas, opcoes in INDICES:
+                op.create_index(nome, tabela, colunas, unique=False, postgresql_concurrently=True, **opcoes)
+    else:
+        for nome, tabela, colunas, opcoes in INDICES:
+            op.create_index(nome, tabela, colunas, unique=False, **opcoes)
+
+
+def downgrade():
+    for nome, tabela, _, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela)
@@ -0,0 +1,40 @@
+"""Índices das ordenações por preço e por nome das listagens
+
+Revision ID: c8f1a3d6e925
+Revises: a4c9e7b2d318
+Create Date: 2026-10-18 22:16:03.974152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1a3d6e925'
+down_revision = 'a4c9e7b2d318'
+branch_labels = None
+depends_on = None
+
+SO_ATIVOS = {'postgresql_where': sa.text('ativo'), 'sqlite_where': sa.text('ativo = 1')}
+
+# (nome, tabela, colunas, opções)
+INDICES = [
+    ('ix_produtos_ativos_preco_id', 'produtos', ['preco', 'id'], SO_ATIVOS),
+    ('ix_produtos_ativos_nome_id', 'produtos', ['nome', 'id'], SO_ATIVOS),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY não trava as escritas, mas não roda dentro de transação
+        with op.get_context().autocommit_block():
+            for nome, tabela, colunas, opcoes in INDICES:
+                op.create_index(nome, tabela, colunas, unique=False, postgresql_concurrently=True, **opcoes)
+    else:
+        for nome, tabela, colunas, opcoes in INDICES:
+            op.create_index(nome, tabela, colunas, unique=False, **opcoes)
+
+
+def downgrade():
+    for nome, tabela, _, _ in reversed(INDICES):
+        op.drop_index(nome, table_name=tabela)
@@ -0,0 +1,65 @@
+"""Resumo dos pedidos para as listagens (itens e cliente)
+
+Revision ID: d5a7c3f9e812
+Revises: b3e6d0a8f214
+Create Date: 2026-10-18 19:34:12.718460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a7c3f9e812'
+down_revision = 'b3e6d0a8f214'
+branch_labels = None
+depends_on = None
+
+LOTE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_itens', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('total_unidades', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('primeiro_item', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('cliente_nome', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('cliente_email', sa.String(length=120), nullable=True))
+
+    # Preenche o resumo dos pedidos existentes, em lotes por id
+    conn = op.get_bind()
+    ultimo = 0
+    while True:
+        pedidos = conn.execute(sa.text("""
+            SELECT p.id, u.nome, u.email,
+                   (SELECT COUNT(*) FROM itens_pedido i WHERE i.pedido_id = p.id) AS total_itens,
+                   (SELECT COALESCE(SUM(i.quantidade), 0) FROM itens_pedido i WHERE i.pedido_id = p.id) AS total_unidades,
+                   (SELECT i.nome_produto FROM itens_pedido i WHERE i.pedido_id = p.id
+                    ORDER BY i.id LIMIT 1) AS primeiro_item
+            FROM pedidos p LEFT JOIN users u ON u.id = p.usuario_id
+            WHERE p.id > :ultimo
+            ORDER BY p.id
+            LIMIT :lote
+        """), {'ultimo': ultimo, 'lote': LOTE}).fetchall()
+        if not pedidos:
+            break
+        conn.execute(
+            sa.text("""
+                UPDATE pedidos SET total_itens = :total_itens, total_unidades = :total_unidades,
+                       primeiro_item = :primeiro_item, cliente_nome = :cliente_nome, cliente_email = :cliente_email
+                WHERE id = :id
+            """),
+            [{'id': p.id, 'total_itens': p.total_itens, 'total_unidades': p.total_unidades,
+              'primeiro_item': p.primeiro_item, 'cliente_nome': p.nome, 'cliente_email': p.email}
+             for p in pedidos]
+        )
+        ultimo = pedidos[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.drop_column('cliente_email')
+        batch_op.drop_column('cliente_nome')
+        batch_op.drop_column('primeiro_item')
+        batch_op.drop_column('total_unidades')
+        batch_op.drop_column('total_itens')
@@ -0,0 +1,30 @@
+"""Índice em carrinho_itens.atualizado_em (limpeza dos carrinhos abandonados)
+
+Revision ID: e7a2c5d9b134
+Revises: c8f1a3d6e925
+Create Date: 2026-10-18 23:41:12.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c5d9b134'
+down_revision = 'c8f1a3d6e925'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY não trava as escritas, mas não roda dentro de transação
+        with op.get_context().autocommit_block():
+            op.create_index('ix_carrinho_itens_atualizado_em', 'carrinho_itens', ['atualizado_em'],
+                            unique=False, postgresql_concurrently=True)
+    else:
+        op.create_index('ix_carrinho_itens_atualizado_em', 'carrinho_itens', ['atualizado_em'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_carrinho_itens_atualizado_em', table_name='carrinho_itens')
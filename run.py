@@ -1,4 +1,5 @@
 import os
+import click
 from app import create_app, db
 
 app = create_app(os.getenv('FLASK_ENV', 'development'))
@@ -80,5 +81,188 @@ def init_data():
     print("\nDados iniciais criados com sucesso!")
 
 
+@app.cli.command('reindexar-busca')
+def reindexar_busca():
+    """Reconstrói o índice de busca textual de produtos"""
+    from app.services.busca import reindexar
+
+    total = reindexar()
+    print(f"✓ {total} produto(s) reindexado(s)")
+
+
+@app.cli.command('liberar-reservas')
+def liberar_reservas():
+    """Libera reservas de carrinho vencidas e cancela pedidos pendentes expirados"""
+    from app.services.estoque import liberar_reservas_expiradas, expirar_pedidos_pendentes
+
+    print(f"✓ {liberar_reservas_expiradas()} reserva(s) de carrinho liberada(s)")
+    print(f"✓ {expirar_pedidos_pendentes()} pedido(s) pendente(s) expirado(s)")
+
+
+@app.cli.command('expirar-pedidos')
+@click.option('--lote', type=int, default=None, help='Pedidos cancelados por commit')
+def expirar_pedidos(lote):
+    """Cancela pedidos pendentes com prazo de pagamento vencido e devolve o estoque"""
+    import time
+    from app.services.estoque import expirar_pedidos_pendentes
+
+    inicio = time.monotonic()
+    total = expirar_pedidos_pendentes(lote=lote)
+    print(f"✓ {total} pedido(s) pendente(s) expirado(s) em {time.monotonic() - inicio:.2f}s")
+
+
+@app.cli.command('atualizar-catalogo')
+@click.option('--completo', is_flag=True, help='Reconstrói do zero em vez de aplicar só as mudanças')
+def reconstruir_catalogo(completo):
+    """Reconstrói o snapshot do catálogo lido pela vitrine"""
+    import time
+    from app.services.catalogo import atualizar_catalogo, obter_catalogo
+
+    inicio = time.monotonic()
+    if not atualizar_catalogo(completo=completo):
+        print("✗ Snapshot desligado (CATALOGO_SNAPSHOT) ou falhou; veja o log")
+        return
+    catalogo = obter_catalogo()
+    print(f"✓ Catálogo com {catalogo.total} produto(s) e {catalogo.total_categorias} categoria(s) "
+          f"em {time.monotonic() - inicio:.2f}s")
+
+
+@app.cli.command('recalcular-vendas')
+def recalcular_vendas_cmd():
+    """Refaz produtos.vendas_30d a partir dos pedidos vendidos nos últimos 30 dias"""
+    from app.services.vendas import recalcular_vendas
+
+    print(f"✓ {recalcular_vendas()} produto(s) com vendas_30d atualizado")
+
+
+@app.cli.command('calcular-relacionados')
+@click.option('--k', type=int, default=None, help='Vizinhos guardados por produto')
+@click.option('--dias', type=int, default=None, help='Pedidos dos últimos N dias')
+def calcular_relacionados_cmd(k, dias):
+    """Recalcula os produtos relacionados por compras em comum"""
+    from app.services.relacionados import calcular_relacionados
+
+    resumo = calcular_relacionados(k=k, dias=dias)
+    print(f"✓ {resumo['vizinhos']} vizinho(s) para {resumo['produtos']} produto(s) a partir de "
+          f"{resumo['itens']} item(ns) em {resumo['duracao_segundos']:.2f}s "
+          f"(leitura {resumo['leitura_segundos']:.2f}s)")
+
+
+@app.cli.command('explicar-consultas')
+@click.option('--detalhes', is_flag=True, help='Mostra o plano completo de cada consulta')
+def explicar_consultas_cmd(detalhes):
+    """Confere com EXPLAIN se as listagens usam índice (sai com erro se alguma lê a tabela inteira)"""
+    from app.services.planos import explicar_consultas
+
+    planos = explicar_consultas()
+    for plano in planos:
+        print(f"{'✗' if plano.problemas else '✓'} {plano.nome}")
+        for problema in plano.problemas:
+            print(f"    {problema}")
+        if detalhes:
+            for linha in plano.linhas:
+                print(f"      {linha}")
+    if any(plano.problemas for plano in planos):
+        raise SystemExit(1)
+
+
+@app.cli.command('exportar-pedidos')
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--de', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data inicial (AAAA-MM-DD)')
+@click.option('--ate', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Data final, inclusive')
+@click.option('--status', multiple=True, help='Status a incluir (pode repetir)')
+@click.option('--saida', type=click.File('w', encoding='utf-8'), default='-', help='Arquivo de saída (padrão: stdout)')
+def exportar_pedidos_cmd(formato, de, ate, status, saida):
+    """Exporta pedidos e itens em CSV ou JSON Lines, em streaming"""
+    from app.services.exportacao import consulta_exportacao, exportar_pedidos
+
+    consulta = consulta_exportacao(de.date() if de else None, ate.date() if ate else None, list(status))
+    for bloco in exportar_pedidos(db.engine, consulta, formato):
+        saida.write(bloco)
+
+
+@app.cli.command('importar-produtos')
+@click.argument('arquivo', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--lote', type=int, default=None, help='Linhas por lote gravado')
+def importar_produtos_cmd(arquivo, lote):
+    """Importa produtos de um CSV, com upsert pelo slug"""
+    from app.services.importacao import ArquivoInvalido, importar_produtos
+
+    try:
+        resumo = importar_produtos(arquivo, lote=lote)
+    except ArquivoInvalido as e:
+        print(f"✗ {e}")
+        raise SystemExit(1)
+
+    print(f"✓ {resumo.linhas} linha(s) lida(s) em {resumo.duracao_segundos}s")
+    print(f"  Novos: {resumo.novos} | Atualizados: {resumo.atualizados} | Com erro: {resumo.com_erro}")
+    if resumo.colunas_ignoradas:
+        print(f"  Colunas ignoradas: {', '.join(resumo.colunas_ignoradas)}")
+    for linha, erro in resumo.erros:
+        print(f"  ✗ Linha {linha}: {erro}")
+    if resumo.com_erro > len(resumo.erros):
+        print(f"  ... e mais {resumo.com_erro - len(resumo.erros)} erro(s)")
+    if resumo.interrompido:
+        print(f"  Interrompido: {resumo.interrompido}")
+
+
+@app.cli.command('worker')
+@click.option('--concorrencia', type=int, default=None, help='Tarefas simultâneas neste worker')
+@click.option('--intervalo', type=float, default=1.0, help='Segundos entre consultas à fila vazia')
+@click.option('--uma-vez', is_flag=True, help='Esvazia a fila e termina')
+def worker(concorrencia, intervalo, uma_vez):
+    """Executa as tarefas da fila (ex.: criação de links de pagamento)"""
+    from app.services.fila import executar_worker
+
+    print("Worker iniciado. Ctrl+C para sair.")
+    executar_worker(concorrencia=concorrencia, intervalo=intervalo, uma_vez=uma_vez)
+
+
+@app.cli.command('processar-webhooks')
+def processar_webhooks_pendentes():
+    """Processa as notificações pendentes da caixa de entrada de webhooks"""
+    from app.services.webhooks import processar_webhooks
+
+    print(f"✓ {processar_webhooks()} evento(s) processado(s)")
+
+
+@app.cli.command('reprocessar-webhooks')
+@click.option('--de', 'de', type=click.DateTime(), required=True, help='Início do período (UTC)')
+@click.option('--ate', 'ate', type=click.DateTime(), required=True, help='Fim do período (UTC)')
+@click.option('--gateway', type=click.Choice(['pagbank', 'mercadopago', 'pagseguro']), default=None)
+def reprocessar_webhooks(de, ate, gateway):
+    """Devolve à fila os webhooks recebidos no período (ex.: após corrigir um bug)"""
+    from app.services.webhooks import reprocessar
+
+    print(f"✓ {reprocessar(de, ate, gateway)} evento(s) devolvido(s) à fila")
+    print("  Execute 'flask processar-webhooks' ou aguarde o worker.")
+
+
+@app.cli.command('reconciliar-pedidos')
+@click.option('--idade', type=int, default=None, help='Minutos sem atualização para consultar o pedido')
+@click.option('--limite', type=int, default=None, help='Máximo de pedidos nesta execução')
+@click.option('--concorrencia', type=int, default=None, help='Consultas simultâneas ao PagBank')
+@click.option('--relatorio', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Grava o resumo em JSON neste arquivo')
+def reconciliar_pedidos(idade, limite, concorrencia, relatorio):
+    """Consulta no PagBank os pedidos pendentes parados e aplica o status real"""
+    import json
+    from app.services.reconciliacao import reconciliar_pendentes
+
+    resumo = reconciliar_pendentes(idade_minutos=idade, limite=limite, concorrencia=concorrencia)
+    print(f"✓ {resumo.verificados} pedido(s) verificado(s) em {resumo.duracao_segundos}s")
+    print(f"  Pagos: {resumo.pagos} | Cancelados: {resumo.cancelados} | "
+          f"Sem mudança: {resumo.sem_mudanca} | Erros: {resumo.erros}")
+    for pedido_id, erro in resumo.falhas:
+        print(f"  ✗ Pedido #{pedido_id}: {erro}")
+    if resumo.interrompido:
+        print(f"  Interrompido: {resumo.interrompido}")
+
+    if relatorio:
+        with open(relatorio, 'w') as arquivo:
+            json.dump(resumo.como_dict(), arquivo, indent=2, ensure_ascii=False)
+        print(f"  Relatório gravado em {relatorio}")
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
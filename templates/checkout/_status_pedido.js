@@ -0,0 +1,42 @@
+(function() {
+    const sucesso = '{{ url_for("checkout.sucesso", pedido_id=pedido.id) }}';
+    const detalhes = '{{ url_for("checkout.detalhes_pedido", pedido_id=pedido.id) }}';
+
+    function tratar(status) {
+        if (status === 'pago') {
+            window.location.href = sucesso;
+            return true;
+        }
+        if (status !== 'pendente') {
+            window.location.href = detalhes;
+            return true;
+        }
+        return false;
+    }
+
+    function consultar(milissegundos) {
+        const intervalo = setInterval(function() {
+            fetch('{{ url_for("checkout.api_pedido_status", pedido_id=pedido.id) }}')
+                .then(response => response.json())
+                .then(data => { if (tratar(data.status)) clearInterval(intervalo); });
+        }, milissegundos);
+    }
+
+    if (window.EventSource) {
+        const fonte = new EventSource('{{ url_for("checkout.eventos_pedido", pedido_id=pedido.id) }}');
+        fonte.addEventListener('status', function(e) {
+            if (tratar(JSON.parse(e.data).status)) {
+                fonte.close();
+            }
+        });
+        // Servidor lotado (204) ou recusa: o navegador não reconecta, então consulta
+        fonte.addEventListener('error', function() {
+            if (fonte.readyState === EventSource.CLOSED) {
+                consultar(5000);
+            }
+        });
+    } else {
+        // Navegadores sem EventSource continuam consultando
+        consultar(30000);
+    }
+})();
@@ -0,0 +1,91 @@
+"""
+Fixtures dos testes
+Cada teste recebe uma app com banco próprio: um SQLite em arquivo no
+tmp_path (arquivo, e não :memory:, para os testes com várias threads)
+ou, com TEST_DATABASE_URL, o Postgres informado, com as tabelas
+recriadas a cada teste.
+Os requests do cliente de teste não podem rodar dentro de um contexto
+da app aberto pelo teste: o Flask reaproveitaria o contexto, e o `g`
+(usuário logado, contagem de consultas) passaria de um request para
+o outro. Por isso as fábricas gravam cada objeto num contexto próprio.
+"""
+import os
+import pytest
+from app import create_app
+from app.config import TestingConfig
+from app.models import db, Produto, User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    if not os.getenv('TEST_DATABASE_URL'):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'loja.db'}")
+    monkeypatch.setattr(TestingConfig, 'CATALOGO_DIR', str(tmp_path / 'catalogo'))
+    app = create_app('testing')
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        if db.engine.dialect.name == 'postgresql':
+            db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ctx(app):
+    """Contexto da app para testes de serviço (sem requests no meio)"""
+    with app.app_context():
+        yield
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
+
+
+def _gravar(app, objeto):
+    """Grava num contexto próprio e devolve o objeto desligado da sessão, com os campos carregados"""
+    with app.app_context():
+        db.session.add(objeto)
+        db.session.commit()
+        db.session.refresh(objeto)
+        db.session.expunge(objeto)
+    return objeto
+
+
+@pytest.fixture
+def criar_produto(app):
+    """Cria produtos ativos na primeira categoria"""
+    contador = iter(range(1, 1_000_000))
+
+    def criar(**campos):
+        n = next(contador)
+        dados = {'nome': f'Produto {n}', 'slug': f'produto-{n}', 'preco': 10.0 + n, 'estoque': 10,
+                 'categoria_id': 1, 'ativo': True}
+        dados.update(campos)
+        return _gravar(app, Produto(**dados))
+
+    return criar
+
+
+@pytest.fixture
+def criar_usuario(app):
+    """Cria clientes com a senha 'senha123'"""
+    contador = iter(range(1, 1_000_000))
+
+    def criar(**campos):
+        n = next(contador)
+        usuario = User(email=f'cliente{n}@teste.com', nome=f'Cliente {n}', **campos)
+        usuario.set_senha('senha123')
+        return _gravar(app, usuario)
+
+    return criar
+
+
+@pytest.fixture
+def entrar(cliente):
+    """Login no cliente de teste (admin por padrão)"""
+    def entrar(email='admin@techzone.com', senha='admin123'):
+        return cliente.post('/conta/login', data={'email': email, 'senha': senha})
+    return entrar
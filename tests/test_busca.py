@@ -0,0 +1,21 @@
+"""Busca textual: índice de busca criado e removido junto com a tabela produtos"""
+from app.models import db, Produto
+from app.services.busca import aplicar_busca
+
+
+def _buscar(termo):
+    query, _ = aplicar_busca(Produto.query, termo)
+    return [produto.nome for produto in query.all()]
+
+
+def test_drop_all_remove_o_indice_e_o_create_all_recria(ctx, criar_produto):
+    criar_produto(nome='Cabo Trançado')
+    assert _buscar('trancado') == ['Cabo Trançado']
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()  # Falhava no SQLite: produtos_fts sobrava do drop_all
+
+    assert _buscar('trancado') == []
+    criar_produto(nome='Fone Sem Fio', categoria_id=None)  # Categorias também foram apagadas
+    assert _buscar('fone') == ['Fone Sem Fio']
@@ -0,0 +1,120 @@
+"""Carrinho: quantidades inválidas, disponibilidade com reservas e validade dos carrinhos"""
+from datetime import datetime, timedelta
+import pytest
+from app.models import db, CarrinhoItem, Produto
+from app.services import carrinho as servico
+from app.services.carrinho import CarrinhoStoreDB, RedisLocal, limpar_carrinhos_abandonados, resolver_carrinho
+from app.services.estoque import baixar_estoque, reajustar_reserva, reservar
+
+
+def _contadores(app, produto_id):
+    with app.app_context():
+        produto = db.session.get(Produto, produto_id)
+        return produto.estoque, produto.estoque_reservado
+
+
+@pytest.mark.parametrize('quantidade', [-100, 0, 'abc', None, [2]])
+def test_adicionar_recusa_quantidade_invalida(app, cliente, criar_produto, quantidade):
+    produto = criar_produto(estoque=5)
+
+    resposta = cliente.post(f'/carrinho/adicionar/{produto.id}', json={'quantity': quantidade})
+
+    assert resposta.status_code == 400
+    assert _contadores(app, produto.id) == (5, 0)
+
+
+def test_adicionar_reserva_a_quantidade_pedida(app, cliente, criar_produto):
+    produto = criar_produto(estoque=5)
+
+    resposta = cliente.post(f'/carrinho/adicionar/{produto.id}', json={'quantity': 2})
+
+    assert resposta.get_json()['success']
+    assert _contadores(app, produto.id) == (5, 2)
+
+
+def test_servicos_de_estoque_recusam_quantidade_nao_positiva(app, ctx, criar_produto):
+    produto = criar_produto(estoque=5)
+
+    assert not reservar('a:teste', produto.id, -100)
+    assert not reservar('a:teste', produto.id, 0)
+    assert not reajustar_reserva('a:teste', produto.id, -1)
+    baixa = baixar_estoque([(produto.id, 2), (produto.id, -100)])
+    assert not baixa.ok
+    assert baixa.produtos_com_falha == {produto.id}
+    db.session.commit()
+
+    assert _contadores(app, produto.id) == (5, 0)
+
+
+def test_disponibilidade_do_carrinho_desconta_reservas_dos_outros(app, criar_produto):
+    produto = criar_produto(estoque=3)
+    comprador, outro = app.test_client(), app.test_client()
+
+    assert comprador.post(f'/carrinho/adicionar/{produto.id}', json={'quantity': 2}).get_json()['success']
+    assert outro.post(f'/carrinho/adicionar/{produto.id}', json={'quantity': 1}).get_json()['success']
+
+    with app.app_context():
+        # As 2 unidades reservadas pelo comprador continuam dele
+        carrinho = {str(produto.id): {'quantidade': 2}}
+        item = resolver_carrinho(carrinho, do_banco=True, carrinho_id=_carrinho_id(comprador)).itens[0]
+        assert item.disponivel and item.unidades_livres == 2
+
+        # O outro só tem a própria unidade: 2 não cabem, mesmo com estoque 3
+        carrinho = {str(produto.id): {'quantidade': 2}}
+        item = resolver_carrinho(carrinho, do_banco=True, carrinho_id=_carrinho_id(outro)).itens[0]
+        assert not item.disponivel and item.unidades_livres == 1
+        assert not reservar(_carrinho_id(outro), produto.id, 1)
+
+
+def _carrinho_id(cliente):
+    return f"a:{cliente.get_cookie('carrinho_id').value}"
+
+
+def test_limpeza_apaga_carrinhos_abandonados_e_libera_reservas(app, ctx, criar_produto):
+    produto, outro = criar_produto(estoque=5), criar_produto(estoque=5)
+    store = CarrinhoStoreDB()
+    for carrinho_id in ('a:abandonado', 'u:em-uso', 'a:recente'):
+        store.adicionar(carrinho_id, produto.id, 1)
+    store.adicionar('u:em-uso', outro.id, 1)
+    assert reservar('a:abandonado', produto.id, 2)
+    db.session.commit()
+
+    # Sem alteração há mais de CARRINHO_TTL_DIAS; o 'u:em-uso' tem uma linha recente
+    antigo = datetime.utcnow() - timedelta(days=app.config['CARRINHO_TTL_DIAS'] + 1)
+    db.session.execute(
+        db.update(CarrinhoItem)
+        .where(CarrinhoItem.carrinho_id.in_(['a:abandonado', 'u:em-uso']), CarrinhoItem.produto_id == produto.id)
+        .values(atualizado_em=antigo)
+    )
+    db.session.commit()
+
+    assert limpar_carrinhos_abandonados(lote=1) == 1
+
+    assert store.obter('a:abandonado') == {}
+    assert len(store.obter('u:em-uso')) == 2 and len(store.obter('a:recente')) == 1
+    assert _contadores(app, produto.id) == (5, 0)
+
+
+def test_carrinho_em_memoria_vence_com_o_ttl(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(servico.time, 'monotonic', lambda: agora[0])
+    store = servico.CarrinhoStoreRedis(RedisLocal(), ttl_segundos=60)
+
+    store.adicionar('a:um', 7, 2)
+    agora[0] += 59
+    assert store.obter('a:um') == {'7': {'quantidade': 2}}
+
+    # Alterar o carrinho renova o prazo
+    store.atualizar('a:um', 7, 3)
+    agora[0] += 59
+    assert store.contar('a:um') == 3
+
+    agora[0] += 2
+    assert store.obter('a:um') == {}
+    assert not store.atualizar('a:um', 7, 1)
+
+    # As chaves vencidas que ninguém lê somem na varredura
+    store.adicionar('a:dois', 7, 1)
+    agora[0] += RedisLocal.INTERVALO_VARREDURA + 1
+    store.adicionar('a:tres', 7, 1)
+    assert list(store.cliente._dados) == ['carrinho:a:tres']
@@ -0,0 +1,95 @@
+"""Snapshot do catálogo: renovação fora dos requests e estoque ao vivo na página do produto"""
+import os
+from datetime import datetime, timedelta
+import pytest
+from app.models import db, Produto
+from app.services import catalogo as servico
+from app.services.carrinho import get_carrinho_store
+
+
+@pytest.fixture
+def snapshot(app, monkeypatch):
+    """Snapshot ligado, sem a thread de renovação (os testes chamam renovar_catalogo)"""
+    app.config['CATALOGO_SNAPSHOT'] = True
+    monkeypatch.setattr(servico, '_garantir_renovacao', lambda: None)
+    monkeypatch.setitem(servico._estado, 'catalogo', None)
+    return app
+
+
+def _envelhecer(segundos):
+    """Recua a última reconstrução do zero"""
+    caminho = servico._caminho() + '.completo'
+    antes = os.stat(caminho).st_mtime - segundos
+    os.utime(caminho, (antes, antes))
+
+
+def test_vitrine_nao_reconstroi_o_snapshot(snapshot, ctx, criar_produto):
+    criar_produto()
+    # Sem arquivo: o request consulta o banco em vez de montar o snapshot
+    assert servico.obter_catalogo() is None
+    assert not os.path.exists(servico._caminho())
+
+    assert servico.renovar_catalogo()
+    catalogo = servico.obter_catalogo()
+    assert catalogo.total == 1
+
+    _envelhecer(3600)
+    assert servico.obter_catalogo().gerado_em == catalogo.gerado_em
+
+
+def test_renovacao_completa_pega_commit_atrasado(snapshot, ctx, criar_produto):
+    produto = criar_produto(preco=10.0)
+    assert servico.renovar_catalogo()
+    # Não vencido: nada a fazer
+    assert not servico.renovar_catalogo()
+
+    # Transação longa: atualizado_em anterior à janela incremental
+    db.session.execute(db.update(Produto).where(Produto.id == produto.id).values(
+        preco=99.0, atualizado_em=datetime.utcnow() - timedelta(minutes=10)))
+    db.session.commit()
+    assert servico.atualizar_catalogo()
+    assert servico.buscar_produto(produto.slug).preco == 10.0
+
+    _envelhecer(3600)
+    assert servico.renovar_catalogo()
+    assert servico.buscar_produto(produto.slug).preco == 99.0
+
+
+def test_pagina_do_produto_mostra_o_estoque_do_banco(snapshot, cliente, criar_produto):
+    produto = criar_produto(estoque=3)
+    with snapshot.app_context():
+        assert servico.renovar_catalogo()
+        db.session.execute(db.update(Produto).where(Produto.id == produto.id).values(estoque_reservado=3))
+        db.session.commit()
+
+    html = cliente.get(f'/produto/{produto.slug}').get_data(as_text=True)
+
+    assert 'Fora de estoque' in html
+    assert 'Adicionar ao Carrinho' not in html
+
+
+def test_checkout_so_marca_o_snapshot_e_a_renovacao_aplica(snapshot, criar_produto, criar_usuario, monkeypatch):
+    produto = criar_produto(estoque=5)
+    usuario = criar_usuario()
+    with snapshot.app_context():
+        assert servico.renovar_catalogo()
+        get_carrinho_store().adicionar(f'u:{usuario.id}', produto.id, 2)
+        db.session.commit()
+
+    reconstrucoes = []
+    cliente = snapshot.test_client()
+    cliente.post('/conta/login', data={'email': usuario.email, 'senha': 'senha123'})
+    with monkeypatch.context() as m:
+        m.setattr(servico, '_reconstruir', lambda *args: reconstrucoes.append(args))
+        resposta = cliente.post('/checkout/pagar', data={
+            'cep': '01001-000', 'rua': 'Praça da Sé', 'numero': '1', 'bairro': 'Sé',
+            'cidade': 'São Paulo', 'estado': 'SP', 'forma_pagamento': 'pix'})
+    assert '/checkout/preparando/' in resposta.headers['Location']
+    assert not reconstrucoes
+
+    with snapshot.app_context():
+        assert servico.buscar_produto(produto.slug).estoque == 5
+        # Marca posterior ao snapshot: a renovação refaz só com as mudanças
+        assert servico.renovar_catalogo()
+        assert servico.buscar_produto(produto.slug).estoque == 3
+        assert not servico.renovar_catalogo()
@@ -0,0 +1,82 @@
+"""
+Páginas de pedidos com número fixo de consultas SQL (X-Consultas-SQL):
+a contagem com poucos pedidos (ou um item) tem de ser a mesma com
+vários. Uma consulta a mais por pedido ou por item é um N+1. Nas
+listagens a comparação é entre a segunda página, com um pedido, e a
+primeira, cheia (as duas fazem o COUNT do paginate).
+"""
+import pytest
+from app.models import db, Endereco, ItemPedido, Pedido, User
+
+
+@pytest.fixture
+def pedidos(app, criar_produto):
+    """Cria `quantidade` pedidos do usuário com `itens` itens cada; retorna os ids"""
+    produtos = [criar_produto() for _ in range(8)]
+
+    def criar(usuario_id, quantidade=1, itens=1):
+        with app.app_context():
+            cliente = db.session.get(User, usuario_id)
+            endereco = Endereco(usuario_id=usuario_id, cep='01001-000', rua='Praça da Sé', numero='1',
+                                bairro='Sé', cidade='São Paulo', estado='SP')
+            ids = []
+            for _ in range(quantidade):
+                pedido = Pedido(usuario_id=usuario_id, status='pago', forma_pagamento='pix',
+                                total=sum(p.preco for p in produtos[:itens]), endereco_entrega=endereco)
+                for produto in produtos[:itens]:
+                    pedido.itens.append(ItemPedido(produto_id=produto.id, nome_produto=produto.nome,
+                                                   preco=produto.preco, quantidade=1))
+                pedido.definir_resumo([(p.nome, 1) for p in produtos[:itens]], cliente)
+                db.session.add(pedido)
+                db.session.flush()
+                ids.append(pedido.id)
+            db.session.commit()
+            return ids
+
+    return criar
+
+
+def _consultas(cliente, url):
+    """Consultas do request, já com os caches do processo (categorias do menu) preenchidos"""
+    cliente.get(url)
+    resposta = cliente.get(url)
+    assert resposta.status_code == 200, url
+    return int(resposta.headers['X-Consultas-SQL'])
+
+
+def test_listagem_da_conta(cliente, entrar, criar_usuario, pedidos):
+    usuario = criar_usuario()
+    entrar(usuario.email, 'senha123')
+
+    pedidos(usuario.id, quantidade=11, itens=3)  # 10 por página
+
+    assert _consultas(cliente, '/conta/pedidos') == _consultas(cliente, '/conta/pedidos?page=2')
+
+
+def test_detalhe_do_pedido_do_cliente(cliente, entrar, criar_usuario, pedidos):
+    usuario = criar_usuario()
+    entrar(usuario.email, 'senha123')
+    [um_item] = pedidos(usuario.id, itens=1)
+    [varios_itens] = pedidos(usuario.id, itens=8)
+
+    assert _consultas(cliente, f'/checkout/pedido/{varios_itens}') == _consultas(cliente, f'/checkout/pedido/{um_item}')
+
+
+def test_listagem_do_admin(cliente, entrar, criar_usuario, pedidos):
+    entrar()
+    # Vários clientes, para pegar carga do cliente por pedido; 20 por página
+    for quantidade in (6, 5, 5, 5):
+        pedidos(criar_usuario().id, quantidade=quantidade, itens=3)
+
+    assert _consultas(cliente, '/admin/pedidos') == _consultas(cliente, '/admin/pedidos?page=2')
+    assert (_consultas(cliente, '/admin/pedidos?status=pago')
+            == _consultas(cliente, '/admin/pedidos?status=pago&page=2'))
+
+
+def test_detalhe_do_pedido_no_admin(cliente, entrar, criar_usuario, pedidos):
+    entrar()
+    usuario_id = criar_usuario().id
+    [um_item] = pedidos(usuario_id, itens=1)
+    [varios_itens] = pedidos(usuario_id, itens=8)
+
+    assert _consultas(cliente, f'/admin/pedidos/{varios_itens}') == _consultas(cliente, f'/admin/pedidos/{um_item}')
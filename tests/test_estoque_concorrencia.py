@@ -0,0 +1,97 @@
+"""
+Compras simultâneas do mesmo produto não vendem além do estoque
+(UPDATE condicional em baixar_estoque). Cada thread tem sua própria
+sessão e conexão, e todas começam juntas numa barreira.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.models import db, Produto, Pedido
+from app.services.carrinho import get_carrinho_store
+from app.services.estoque import baixar_estoque
+
+COMPRADORES = 24
+
+
+def _em_paralelo(funcao, argumentos):
+    barreira = threading.Barrier(len(argumentos))
+
+    def executar(argumento):
+        barreira.wait()
+        return funcao(argumento)
+
+    with ThreadPoolExecutor(max_workers=len(argumentos)) as executor:
+        return list(executor.map(executar, argumentos))
+
+
+def _estoque(app, produto_id):
+    with app.app_context():
+        return db.session.get(Produto, produto_id).estoque
+
+
+def test_baixa_simultanea_vende_exatamente_o_estoque(app, criar_produto):
+    produto_id = criar_produto(estoque=5).id
+
+    def comprar(_):
+        with app.app_context():
+            if baixar_estoque([(produto_id, 1)]).ok:
+                db.session.commit()
+                return True
+            db.session.rollback()
+            return False
+
+    resultados = _em_paralelo(comprar, range(COMPRADORES))
+
+    assert sum(resultados) == 5
+    assert _estoque(app, produto_id) == 0
+
+
+def test_baixa_simultanea_com_quantidades_variadas(app, criar_produto):
+    produto_id = criar_produto(estoque=10).id
+    quantidades = [1 + i % 3 for i in range(COMPRADORES)]
+
+    def comprar(quantidade):
+        with app.app_context():
+            if baixar_estoque([(produto_id, quantidade)]).ok:
+                db.session.commit()
+                return quantidade
+            db.session.rollback()
+            return 0
+
+    vendidas = sum(_em_paralelo(comprar, quantidades))
+
+    estoque = _estoque(app, produto_id)
+    assert estoque >= 0
+    assert vendidas == 10 - estoque
+
+
+def test_checkout_simultaneo_nao_cria_pedidos_alem_do_estoque(app, criar_produto, criar_usuario):
+    produto_id = criar_produto(estoque=3).id
+    emails = []
+    with app.app_context():
+        for _ in range(12):
+            usuario = criar_usuario()
+            # Carrinho já montado (reservas vencidas): a disputa fica toda na baixa do checkout
+            get_carrinho_store().adicionar(f'u:{usuario.id}', produto_id, 1)
+            emails.append(usuario.email)
+        db.session.commit()
+
+    endereco = {'cep': '01001-000', 'rua': 'Praça da Sé', 'numero': '1', 'bairro': 'Sé',
+                'cidade': 'São Paulo', 'estado': 'SP', 'forma_pagamento': 'pix'}
+
+    barreira = threading.Barrier(len(emails))
+
+    def pagar(email):
+        # Cada comprador com o próprio cliente (cookie de sessão)
+        cliente = app.test_client()
+        cliente.post('/conta/login', data={'email': email, 'senha': 'senha123'})
+        barreira.wait()
+        resposta = cliente.post('/checkout/pagar', data=endereco)
+        return '/checkout/preparando/' in resposta.headers.get('Location', '')
+
+    with ThreadPoolExecutor(max_workers=len(emails)) as executor:
+        resultados = list(executor.map(pagar, emails))
+
+    assert sum(resultados) == 3
+    assert _estoque(app, produto_id) == 0
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(Pedido)) == 3
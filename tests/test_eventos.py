@@ -0,0 +1,62 @@
+"""Status do pedido em tempo real: limite de streams por processo"""
+from app.models import db, Pedido
+
+
+def _pedido(app, usuario_id):
+    with app.app_context():
+        pedido = Pedido(usuario_id=usuario_id, status='pendente', total=10.0, forma_pagamento='pix')
+        db.session.add(pedido)
+        db.session.commit()
+        return pedido.id
+
+
+def test_streams_acima_do_limite_recebem_204(app, cliente, entrar):
+    app.config['EVENTOS_MAX_CONEXOES'] = 2
+    entrar()
+    url = f'/checkout/api/pedido/{_pedido(app, 1)}/eventos'
+
+    abertos = [cliente.get(url, buffered=False) for _ in range(2)]
+    assert [r.status_code for r in abertos] == [200, 200]
+    assert 'pendente' in next(abertos[0].response).decode()
+
+    lotado = cliente.get(url)
+    assert lotado.status_code == 204
+    # O navegador cai para a consulta periódica
+    assert cliente.get(url.replace('/eventos', '/status')).get_json()['status'] == 'pendente'
+
+    # Fechar um stream (mesmo sem ter lido nada) libera a vaga
+    abertos[1].close()
+    novo = cliente.get(url, buffered=False)
+    assert novo.status_code == 200
+
+    for resposta in (abertos[0], novo):
+        resposta.close()
+
+
+def test_stream_negado_nao_ocupa_vaga(app, cliente, entrar, criar_usuario):
+    app.config['EVENTOS_MAX_CONEXOES'] = 1
+    usuario = criar_usuario()
+    entrar(usuario.email, 'senha123')
+    url = f'/checkout/api/pedido/{_pedido(app, 1)}/eventos'  # Pedido do admin
+
+    assert cliente.get(url).status_code == 403
+    assert cliente.get(url).status_code == 403
+    proprio = cliente.get(f'/checkout/api/pedido/{_pedido(app, usuario.id)}/eventos', buffered=False)
+    assert proprio.status_code == 200
+    proprio.close()
+
+
+def test_paginas_de_pagamento_abrem_um_stream(app, cliente, entrar):
+    entrar()
+    pedido_id = _pedido(app, 1)
+
+    for url in (f'/checkout/pendente/{pedido_id}', f'/checkout/pix-direto/{pedido_id}'):
+        pagina = cliente.get(url).get_data(as_text=True)
+        assert pagina.count('new EventSource(') == 1, url
+
+
+def test_pagina_preparando_consulta_o_link_uma_vez(app, cliente, entrar):
+    entrar()
+    pagina = cliente.get(f'/checkout/preparando/{_pedido(app, 1)}').get_data(as_text=True)
+
+    assert pagina.count('/pagamento\')') == 1
@@ -0,0 +1,116 @@
+"""Worker: limite global de tarefas e rotinas periódicas (horário no banco, uma execução por vez)"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app.models import db, RotinaPeriodica, Tarefa
+from app.services.fila import enfileirar, executar_periodica, reivindicar, reivindicar_rotina
+
+
+def _atrasar(nome, segundos):
+    rotina = db.session.get(RotinaPeriodica, nome)
+    rotina.ultima_execucao -= timedelta(seconds=segundos)
+    db.session.commit()
+
+
+def test_rotina_sem_registro_comeca_a_contar_agora(ctx):
+    rodar, proxima = reivindicar_rotina('diaria', 24 * 60 * 60)
+
+    assert not rodar
+    assert proxima > datetime.utcnow() + timedelta(hours=23)
+    # Um worker reiniciado logo depois também não roda
+    assert not reivindicar_rotina('diaria', 24 * 60 * 60)[0]
+
+
+def test_rotina_roda_quando_vence_o_intervalo(ctx):
+    reivindicar_rotina('minuto', 60)
+    _atrasar('minuto', 61)
+
+    rodar, proxima = reivindicar_rotina('minuto', 60)
+
+    assert rodar
+    assert proxima > datetime.utcnow() + timedelta(seconds=50)
+    assert not reivindicar_rotina('minuto', 60)[0]
+
+
+def test_so_um_processo_ganha_cada_execucao(app):
+    with app.app_context():
+        reivindicar_rotina('disputada', 60)
+        _atrasar('disputada', 61)
+
+    barreira = threading.Barrier(8)
+
+    def reivindicar(_):
+        barreira.wait()
+        with app.app_context():
+            return reivindicar_rotina('disputada', 60)[0]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert sum(executor.map(reivindicar, range(8))) == 1
+
+
+def test_rotina_em_execucao_nao_roda_em_outro_processo(app):
+    with app.app_context():
+        reivindicar_rotina('lenta', 2)
+        _atrasar('lenta', 3)
+        assert reivindicar_rotina('lenta', 2)[0]
+
+        # Ainda rodando depois do intervalo: os outros processos esperam
+        _atrasar('lenta', 3)
+        assert not reivindicar_rotina('lenta', 2)[0]
+
+    def lenta():
+        pass
+
+    executar_periodica(app, lenta)
+
+    with app.app_context():
+        assert reivindicar_rotina('lenta', 2)[0]
+
+
+def test_rotina_longa_usa_a_propria_duracao_maxima(app):
+    app.config['FILA_TIMEOUT_SEGUNDOS'] = 2
+    with app.app_context():
+        reivindicar_rotina('diaria-longa', 1, duracao_maxima=60)
+        _atrasar('diaria-longa', 2)
+        assert reivindicar_rotina('diaria-longa', 1, duracao_maxima=60)[0]
+
+        # Passou do FILA_TIMEOUT_SEGUNDOS, mas não da duração da rotina: ainda é dela
+        _atrasar('diaria-longa', 30)
+        assert not reivindicar_rotina('diaria-longa', 1, duracao_maxima=60)[0]
+
+        # Processo morto no meio: depois da duração máxima outro assume
+        rotina = db.session.get(RotinaPeriodica, 'diaria-longa')
+        rotina.executando_ate -= timedelta(seconds=60)
+        db.session.commit()
+        assert reivindicar_rotina('diaria-longa', 1, duracao_maxima=60)[0]
+
+
+def test_rotinas_diarias_tem_duracao_maxima_propria(app):
+    from app.services import tarefas  # noqa: F401 (registra as rotinas)
+    from app.services.fila import PERIODICAS
+
+    duracoes = {rotina.__name__: duracao for _, duracao, rotina in PERIODICAS}
+    assert duracoes['recalcular_vendas_30d'] > app.config['FILA_TIMEOUT_SEGUNDOS']
+    assert duracoes['calcular_produtos_relacionados'] > app.config['FILA_TIMEOUT_SEGUNDOS']
+
+
+def test_limite_global_de_tarefas_executando(app):
+    app.config['FILA_MAX_EXECUTANDO'] = 3
+    with app.app_context():
+        for n in range(10):
+            enfileirar('teste', {'n': n})
+        db.session.commit()
+
+    barreira = threading.Barrier(8)
+
+    def pegar(_):
+        barreira.wait()
+        with app.app_context():
+            return len(reivindicar(2))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert sum(executor.map(pegar, range(8))) == 3
+
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).where(Tarefa.status == 'executando')) == 3
+        assert reivindicar(2) == []
@@ -0,0 +1,129 @@
+"""
+Pool de conexões do cliente HTTP dos gateways (app/services/http_gateway.py)
+Benchmark contra um servidor local (http.server numa thread, HTTP/1.1
+com keep-alive) que conta as conexões TCP abertas: a sessão do gateway
+reaproveita a mesma conexão, enquanto requests.get abre uma por chamada.
+Os tempos aparecem com `pytest -s` (em loopback, sem TLS, o pool fica
+~1,5x mais rápido; com o handshake TLS até o gateway a diferença é bem
+maior). Só a contagem de conexões é conferida, porque tempo em máquina
+de CI varia demais.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import pytest
+import requests
+from app.services import mercadopago
+from app.services.http_gateway import get_sessao, requisitar
+
+CHAMADAS = 200
+
+
+class _Gateway(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    # Cabeçalho e corpo saem em dois writes: com Nagle ligado cada resposta
+    # na conexão reaproveitada esperaria o ACK atrasado do cliente (~40 ms)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conexoes += 1
+
+    def do_GET(self):
+        corpo = json.dumps({'status': 'PAID'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Gateway)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.conexoes = 0
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _url(servidor):
+    return f'http://127.0.0.1:{servidor.server_address[1]}/orders/1'
+
+
+def _medir(chamada, vezes=CHAMADAS):
+    inicio = time.perf_counter()
+    for _ in range(vezes):
+        assert chamada().status_code == 200
+    return time.perf_counter() - inicio
+
+
+def test_sessao_do_gateway_reaproveita_a_conexao(ctx, servidor):
+    url = _url(servidor)
+    sessao = get_sessao('teste')
+
+    tempo_pool = _medir(lambda: sessao.get(url, timeout=5))
+    conexoes_pool = servidor.conexoes
+
+    servidor.conexoes = 0
+    tempo_avulso = _medir(lambda: requests.get(url, timeout=5))
+    conexoes_avulsas = servidor.conexoes
+
+    print(f'\n{CHAMADAS} chamadas: sessão com pool {tempo_pool * 1000:.0f} ms em {conexoes_pool} conexão(ões); '
+          f'uma conexão por chamada {tempo_avulso * 1000:.0f} ms em {conexoes_avulsas} conexões '
+          f'({tempo_avulso / tempo_pool:.1f}x)')
+    assert conexoes_pool == 1
+    assert conexoes_avulsas == CHAMADAS
+
+
+def test_pool_limita_as_conexoes_com_chamadas_simultaneas(app, ctx, servidor):
+    url = _url(servidor)
+    sessao = get_sessao('teste-simultaneo')
+    threads = app.config['HTTP_POOL_MAXIMO']
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        respostas = list(executor.map(lambda _: sessao.get(url, timeout=5), range(CHAMADAS)))
+
+    assert all(r.status_code == 200 for r in respostas)
+    assert servidor.conexoes <= threads
+
+
+def test_requisitar_usa_a_sessao_do_gateway(ctx, servidor):
+    url = _url(servidor)
+
+    for _ in range(20):
+        assert requisitar('teste-requisitar', 'orders', 'GET', url).json() == {'status': 'PAID'}
+
+    assert servidor.conexoes == 1
+
+
+def test_sdk_do_mercadopago_usa_a_sessao_do_gateway(app, ctx, servidor, monkeypatch):
+    app.config['MP_ACCESS_TOKEN'] = 'teste'
+    url = _url(servidor)
+    sdk = mercadopago.get_sdk()
+    # Só o transporte: a URL da API vira a do servidor local
+    monkeypatch.setattr(mercadopago, 'requisitar',
+                        lambda gateway, endpoint, metodo, _, **kwargs: requisitar(gateway, endpoint, metodo, url))
+
+    for _ in range(5):
+        assert sdk.payment().get(1) == {'status': 200, 'response': {'status': 'PAID'}}
+    assert servidor.conexoes == 1
+
+
+def test_sdk_do_mercadopago_aceita_resposta_sem_json(app, ctx, monkeypatch):
+    app.config['MP_ACCESS_TOKEN'] = 'teste'
+    resposta = mock.Mock(status_code=502, content=b'<html>', json=mock.Mock(side_effect=ValueError('html')))
+    monkeypatch.setattr(mercadopago, 'requisitar', lambda *args, **kwargs: resposta)
+
+    assert mercadopago.get_sdk().payment().get(1) == {'status': 502, 'response': None}
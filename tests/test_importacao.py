@@ -0,0 +1,77 @@
+"""Importação de produtos por CSV: upsert pelo slug, colunas parciais e linhas inválidas"""
+import io
+from app.models import db, Produto
+from app.services.estoque import reservar
+from app.services.importacao import importar_produtos
+from app.utils.texto import normalizar_texto
+
+
+def _importar(texto, **opcoes):
+    return importar_produtos(io.StringIO(texto), **opcoes)
+
+
+def _produto(slug):
+    db.session.expire_all()
+    return db.session.scalar(db.select(Produto).filter_by(slug=slug))
+
+
+def test_colunas_ausentes_nao_mudam_o_produto_existente(ctx, criar_produto):
+    produto = criar_produto(slug='cabo-usb', nome='Cabo USB', descricao='Malha de nylon trançada',
+                            preco=50.0, preco_antigo=100.0, estoque=8)
+    assert reservar('a:importacao', produto.id, 3)
+    db.session.commit()
+
+    relatorio = _importar('slug;nome;preco\ncabo-usb;Cabo USB-C;80,00\nfone-novo;Fone Novo;120\n')
+
+    assert (relatorio.linhas, relatorio.novos, relatorio.atualizados, relatorio.com_erro) == (2, 1, 1, 0)
+    atualizado = _produto('cabo-usb')
+    assert (atualizado.nome, atualizado.preco) == ('Cabo USB-C', 80.0)
+    assert atualizado.descricao == 'Malha de nylon trançada'
+    assert atualizado.busca_texto == normalizar_texto('Cabo USB-C', 'Malha de nylon trançada')
+    assert (atualizado.preco_antigo, atualizado.desconto_percentual) == (100.0, 20)
+    assert (atualizado.estoque, atualizado.estoque_reservado, atualizado.categoria_id) == (8, 3, 1)
+
+    novo = _produto('fone-novo')
+    assert (novo.descricao, novo.preco_antigo, novo.desconto_percentual) == (None, None, 0)
+    assert novo.busca_texto == normalizar_texto('Fone Novo', None)
+
+
+def test_desconto_recalculado_com_o_preco_antigo_do_arquivo(ctx, criar_produto):
+    criar_produto(slug='capa', preco=90.0, preco_antigo=100.0)
+    criar_produto(slug='bateria', preco=30.0, preco_antigo=60.0)
+
+    _importar('slug,nome,preco,preco_antigo\ncapa,Capa,60,120\nbateria,Bateria,30,\nfonte,Fonte,"1.000,00",1250\n')
+
+    assert _produto('capa').desconto_percentual == 50
+    bateria = _produto('bateria')
+    assert (bateria.preco_antigo, bateria.desconto_percentual) == (None, 0)
+    assert (_produto('fonte').preco, _produto('fonte').desconto_percentual) == (1000.0, 20)
+
+
+def test_slug_repetido_no_arquivo_vale_a_primeira_linha(ctx):
+    relatorio = _importar('nome,preco\nCarregador Turbo,99\nCabo,10\nCarregador Turbo,89\n')
+
+    assert (relatorio.linhas, relatorio.novos, relatorio.com_erro) == (3, 2, 1)
+    assert relatorio.erros == [(4, "slug 'carregador-turbo' repetido (linha 2)")]
+    assert _produto('carregador-turbo').preco == 99.0
+
+
+def test_linha_invalida_nao_interrompe_a_importacao(ctx):
+    relatorio = _importar(
+        'nome;preco;estoque;categoria\n'
+        'Fone A;10;5;fones-de-ouvido\n'
+        'Fone B;dez;5;fones-de-ouvido\n'
+        ';10;5;fones-de-ouvido\n'
+        'Fone C;10;-1;\n'
+        'Fone D;10;5;inexistente\n'
+        'Fone E;15;2;\n',
+        lote=1,
+    )
+
+    assert (relatorio.linhas, relatorio.novos, relatorio.com_erro) == (6, 2, 4)
+    assert [linha for linha, _ in relatorio.erros] == [3, 4, 5, 6]
+    assert relatorio.erros[0][1] == "preço inválido: 'dez'"
+    assert relatorio.interrompido is None
+    assert _produto('fone-a').estoque == 5
+    assert (_produto('fone-e').estoque, _produto('fone-e').categoria_id) == (2, None)
+    assert _produto('fone-b') is None and _produto('fone-d') is None
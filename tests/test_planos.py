@@ -0,0 +1,18 @@
+"""Planos das consultas das listagens: nenhuma lê a tabela inteira nem ordena fora do índice"""
+from app.models import db, Pedido, ItemPedido
+from app.services.planos import explicar_consultas
+
+
+def test_consultas_monitoradas_usam_indices(app, ctx, criar_produto):
+    produto = criar_produto()
+    pedido = Pedido(usuario_id=1, total=produto.preco, status='pago')
+    pedido.itens.append(ItemPedido(produto_id=produto.id, nome_produto=produto.nome, preco=produto.preco))
+    db.session.add(pedido)
+    db.session.commit()
+
+    planos = explicar_consultas()
+
+    assert {p.nome for p in planos} >= {
+        'loja.produtos?ordem=preco-asc', 'loja.produtos?ordem=preco-desc', 'loja.produtos?ordem=nome'}
+    problemas = {p.nome: p.problemas for p in planos if p.problemas}
+    assert not problemas, '\n'.join(f'{nome}: {"; ".join(itens)}' for nome, itens in problemas.items())
@@ -0,0 +1,44 @@
+"""Produtos relacionados: contagem de compras em comum feita pela rotina diária"""
+from datetime import datetime, timedelta
+from app.models import db, ItemPedido, Pedido, ProdutoRelacionado
+from app.services.relacionados import ids_relacionados
+from app.services.tarefas import calcular_produtos_relacionados
+
+
+def _pedido(produtos, status='pago', dias_atras=0):
+    pedido = Pedido(usuario_id=1, status=status, total=sum(p.preco for p in produtos), forma_pagamento='pix',
+                    criado_em=datetime.utcnow() - timedelta(days=dias_atras))
+    for produto in produtos:
+        pedido.itens.append(ItemPedido(produto_id=produto.id, nome_produto=produto.nome,
+                                       preco=produto.preco, quantidade=1))
+    db.session.add(pedido)
+    db.session.commit()
+
+
+def test_rotina_grava_os_vizinhos_por_compras_em_comum(app, ctx, criar_produto):
+    app.config['RELACIONADOS_MAX_ITENS'] = 3
+    a, b, c, d = (criar_produto() for _ in range(4))
+    _pedido([a, b])
+    _pedido([a, b])
+    _pedido([a, c])
+    _pedido([b, d])
+    _pedido([a, b, c, d])  # Atacado: conta nas vendas de cada produto, mas não gera pares
+    _pedido([c, d], status='cancelado')
+    _pedido([c, d], dias_atras=app.config['RELACIONADOS_DIAS'] + 1)
+
+    calcular_produtos_relacionados()
+
+    assert ids_relacionados(a.id, 10) == [b.id, c.id]
+    assert ids_relacionados(b.id, 10) == [a.id, d.id]
+    assert ids_relacionados(c.id, 10) == [a.id]
+    assert ids_relacionados(d.id, 10) == [b.id]
+    # Cosseno: 2 pedidos juntos / sqrt(4 pedidos de A * 4 pedidos de B)
+    par = db.session.get(ProdutoRelacionado, (a.id, 1))
+    assert (par.relacionado_id, par.coocorrencias, par.pontuacao) == (b.id, 2, 0.5)
+
+    # Refazer com menos vizinhos troca a tabela inteira
+    app.config['RELACIONADOS_K'] = 1
+    calcular_produtos_relacionados()
+
+    assert ids_relacionados(a.id, 10) == [b.id]
+    assert db.session.scalar(db.select(db.func.count()).select_from(ProdutoRelacionado)) == 4
@@ -0,0 +1,81 @@
+"""Webhooks de pagamento: transições de status permitidas e estoque dos pedidos"""
+from datetime import datetime, timedelta
+from app.models import db, EventoWebhook, ItemPedido, Pedido, Produto
+from app.services.webhooks import processar_webhooks, registrar_evento, reprocessar
+
+
+def _pedido(produto, quantidade=2, status='pendente'):
+    pedido = Pedido(usuario_id=1, status=status, total=produto.preco * quantidade, forma_pagamento='pix')
+    pedido.itens.append(ItemPedido(produto_id=produto.id, nome_produto=produto.nome,
+                                   preco=produto.preco, quantidade=quantidade))
+    db.session.add(pedido)
+    db.session.commit()
+    return pedido.id
+
+
+def _notificar(pedido_id, status, minutos=0):
+    """Notificação do PagBank processada na hora; retorna o evento"""
+    evento_id = f'{pedido_id}-{status}-{minutos}'
+    registrar_evento('pagbank', evento_id, '{}', referencia=pedido_id, status_gateway=status,
+                     ocorrido_em=datetime.utcnow() + timedelta(minutes=minutos))
+    processar_webhooks()
+    return _evento(evento_id)
+
+
+def _evento(evento_id):
+    db.session.expire_all()
+    return db.session.scalar(db.select(EventoWebhook).filter_by(evento_id=evento_id))
+
+
+def _situacao(pedido_id, produto_id):
+    db.session.expire_all()
+    return db.session.get(Pedido, pedido_id).status, db.session.get(Produto, produto_id).estoque
+
+
+def test_cancelamento_pelo_gateway_devolve_o_estoque(ctx, criar_produto):
+    produto = criar_produto(estoque=3)
+    pedido_id = _pedido(produto)
+
+    assert _notificar(pedido_id, 'payment_failed').situacao == 'processado'
+    assert _situacao(pedido_id, produto.id) == ('cancelado', 5)
+
+    # Outro cancelamento do mesmo pedido não devolve de novo
+    assert _notificar(pedido_id, 'canceled', minutos=1).situacao == 'ignorado'
+    assert _situacao(pedido_id, produto.id) == ('cancelado', 5)
+
+
+def test_pagamento_de_pedido_cancelado_baixa_o_estoque_de_novo(ctx, criar_produto):
+    produto = criar_produto(estoque=5)  # Estoque já devolvido pela expiração
+    pedido_id = _pedido(produto, status='cancelado')
+
+    assert _notificar(pedido_id, 'paid').situacao == 'processado'
+    assert _situacao(pedido_id, produto.id) == ('pago', 3)
+
+
+def test_pagamento_de_pedido_cancelado_sem_estoque_fica_para_revisao(ctx, criar_produto):
+    produto = criar_produto(estoque=1)  # As unidades devolvidas já foram vendidas
+    pedido_id = _pedido(produto, status='cancelado')
+
+    evento = _notificar(pedido_id, 'paid')
+
+    assert evento.situacao == 'revisao' and evento.erro
+    assert _situacao(pedido_id, produto.id) == ('cancelado', 1)
+
+
+def test_eventos_nao_voltam_o_status_do_pedido(ctx, criar_produto):
+    produto = criar_produto(estoque=3)
+    pedido_id = _pedido(produto)
+    assert _notificar(pedido_id, 'paid').situacao == 'processado'
+
+    # 'created' depois de pago não desfaz o pagamento
+    assert _notificar(pedido_id, 'created', minutos=1).situacao == 'ignorado'
+    assert _situacao(pedido_id, produto.id) == ('pago', 3)
+
+    # Pedido enviado: reprocessar o evento de pagamento não o volta para 'pago'
+    db.session.get(Pedido, pedido_id).status = 'enviando'
+    db.session.commit()
+    reprocessar(datetime.utcnow() - timedelta(hours=1), datetime.utcnow())
+    processar_webhooks()
+
+    assert _evento(f'{pedido_id}-paid-0').situacao == 'ignorado'
+    assert _situacao(pedido_id, produto.id) == ('enviando', 3)